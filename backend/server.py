@@ -1,21 +1,38 @@
 from fastapi import FastAPI, APIRouter, HTTPException, Request, Response, Depends, File, UploadFile
-from fastapi.responses import StreamingResponse
+from fastapi.responses import StreamingResponse, FileResponse
+from starlette.background import BackgroundTask
+from starlette.concurrency import run_in_threadpool
 from dotenv import load_dotenv
 from starlette.middleware.cors import CORSMiddleware
-from motor.motor_asyncio import AsyncIOMotorClient
+from motor.motor_asyncio import AsyncIOMotorClient, AsyncIOMotorGridFSBucket
+from gridfs.errors import NoFile
+import python_multipart
+from python_multipart.multipart import parse_options_header
+from pymongo import ReturnDocument, UpdateOne
+from pymongo.errors import BulkWriteError, DuplicateKeyError
+from bson import ObjectId
+from bson.errors import InvalidId
 import os
 import logging
 from pathlib import Path
+from collections import OrderedDict
 from pydantic import BaseModel, Field, ConfigDict
 from typing import List, Optional, Any
 import uuid
 from datetime import datetime, timezone, timedelta
 import io
 import csv
+import json
+import re
 import hashlib
 import secrets
 import asyncio
+import socket
+import time
 import base64
+import binascii
+import tempfile
+import pandas as pd
 
 ROOT_DIR = Path(__file__).parent
 load_dotenv(ROOT_DIR / '.env')
@@ -38,6 +55,9 @@ logging.basicConfig(
 )
 logger = logging.getLogger(__name__)
 
+# India Standard Time (no DST); business dates and cron schedules use IST
+IST = timezone(timedelta(hours=5, minutes=30))
+
 # ============== PASSWORD HELPERS ==============
 
 def hash_password(password: str) -> str:
@@ -54,6 +74,89 @@ def verify_password(password: str, stored_hash: str) -> bool:
     except:
         return False
 
+# ============== PAGINATION HELPERS ==============
+
+def encode_cursor(values: list) -> str:
+    """Opaque keyset cursor from the sort-key values of the last returned row"""
+    return base64.urlsafe_b64encode(json.dumps(values, default=str).encode()).decode()
+
+def decode_cursor(cursor: str) -> list:
+    try:
+        values = json.loads(base64.urlsafe_b64decode(cursor.encode()))
+    except (ValueError, TypeError):
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+    if not isinstance(values, list):
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+    return values
+
+def keyset_filter(fields: List[str], values: list, direction: int = 1) -> dict:
+    """Match rows strictly after `values` in a sort on `fields` (all in one direction)"""
+    if len(fields) != len(values):
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+    op = "$gt" if direction == 1 else "$lt"
+    clauses = []
+    for i, field in enumerate(fields):
+        clause = {f: v for f, v in zip(fields[:i], values[:i])}
+        clause[field] = {op: values[i]}
+        clauses.append(clause)
+    return {"$or": clauses}
+
+# ============== SEARCH KEYS ==============
+
+# Normalized, index-friendly copies of the fields people search by. Queries
+# match them with anchored prefixes, which can use an index.
+
+def normalize_reg(value: Optional[str]) -> str:
+    """Registration / VIN key: uppercase letters and digits only"""
+    return re.sub(r"[^A-Z0-9]", "", (value or "").upper())
+
+def normalize_phone(value: Optional[str]) -> str:
+    """Phone key: last 10 digits (drops country code and formatting)"""
+    return re.sub(r"\D", "", value or "")[-10:]
+
+def search_keys(reg: Optional[str], phone: Optional[str], vin: Optional[str]) -> dict:
+    """reg_key, phone_key and reversed VIN (for suffix search) for a document"""
+    return {
+        "reg_key": normalize_reg(reg),
+        "phone_key": normalize_phone(phone),
+        "vin_rev": normalize_reg(vin)[::-1],
+    }
+
+def appointment_search_keys(doc: dict) -> dict:
+    return search_keys(doc.get("vehicle_reg_no") or doc.get("vehicle_reg"), doc.get("customer_phone"), doc.get("vin"))
+
+def reception_search_keys(doc: dict) -> dict:
+    return search_keys(doc.get("vehicle_reg_no"), doc.get("contact_no"), doc.get("vin"))
+
+def vehicle_search_keys(doc: dict) -> dict:
+    keys = search_keys(doc.get("vehicle_reg_no"), doc.get("customer_phone") or doc.get("contact_no"), doc.get("vin"))
+    keys["search_tokens"] = vehicle_search_tokens(doc, keys)
+    return keys
+
+def vehicle_search_tokens(doc: dict, keys: dict) -> List[str]:
+    """Normalized words a vehicle can be found by in the vehicles list (prefix-matched)"""
+    words = [keys["reg_key"], keys["vin_rev"][::-1], normalize_reg(doc.get("engine_no")), keys["phone_key"]]
+    for field in ("customer_name", "first_name", "last_name", "company_name", "make"):
+        words += [normalize_reg(w) for w in (doc.get(field) or "").split()]
+    return sorted({w for w in words if w})
+
+def search_key_query(q: str) -> List[dict]:
+    """Anchored prefix clauses over the search keys for free-text input"""
+    clauses = []
+    reg = normalize_reg(q)
+    if reg:
+        clauses.append({"reg_key": {"$regex": f"^{re.escape(reg)}"}})
+        clauses.append({"vin_rev": {"$regex": f"^{re.escape(reg[::-1])}"}})
+    if reg.isdigit():
+        clauses.append({"phone_key": {"$regex": f"^{re.escape(reg[-10:])}"}})
+    return clauses
+
+def search_key_prefix_match(doc: dict, reg: str) -> bool:
+    """Python twin of the prefix clauses of search_key_query (reg / phone, not VIN suffix)"""
+    if (doc.get("reg_key") or "").startswith(reg):
+        return True
+    return reg.isdigit() and (doc.get("phone_key") or "").startswith(reg[-10:])
+
 # ============== MODELS ==============
 
 class LoginRequest(BaseModel):
@@ -338,14 +441,70 @@ async def logout(request: Request, response: Response):
     response.delete_cookie(key="session_token", path="/")
     return {"message": "Logged out"}
 
+# ============== REFERENCE DATA CACHE ==============
+
+# Settings, branches and the user directory change rarely but are read on
+# almost every request. Each worker keeps one in-process copy and reloads it
+# when the shared version stamp moves; writers bump the stamp, so other
+# workers pick the change up within REFERENCE_DATA_CHECK_SECONDS.
+
+REFERENCE_DATA_CHECK_SECONDS = 5
+
+class ReferenceDataCache:
+    def __init__(self):
+        self.version = None
+        self.checked_at = 0.0
+        self.settings: Optional[dict] = None
+        self.branches: List[dict] = []
+        self.users: List[dict] = []
+        self.user_names: dict = {}
+        self.lock = asyncio.Lock()
+
+    async def get(self) -> "ReferenceDataCache":
+        if time.monotonic() - self.checked_at < REFERENCE_DATA_CHECK_SECONDS:
+            return self
+        async with self.lock:
+            if time.monotonic() - self.checked_at < REFERENCE_DATA_CHECK_SECONDS:
+                return self
+            stamp = await db.cache_versions.find_one({"_id": "reference_data"})
+            version = stamp["version"] if stamp else 0
+            if version != self.version:
+                self.settings, self.branches, self.users = await asyncio.gather(
+                    db.settings.find_one({"settings_id": "main"}, {"_id": 0}),
+                    db.branches.find({}, {"_id": 0}).to_list(None),
+                    db.users.find({}, {"_id": 0, "password_hash": 0}).to_list(None),
+                )
+                self.user_names = {u["user_id"]: u.get("name") for u in self.users}
+                self.version = version
+            self.checked_at = time.monotonic()
+        return self
+
+    def invalidate(self):
+        self.checked_at = 0.0
+
+    def vehicle_models(self) -> List[str]:
+        return (self.settings or {}).get("vehicle_models", [])
+
+    def active_cres(self) -> List[dict]:
+        return [u for u in self.users if u.get("role") == "CRE" and u.get("is_active")]
+
+reference_data = ReferenceDataCache()
+
+async def get_reference_data() -> ReferenceDataCache:
+    return await reference_data.get()
+
+async def bump_reference_data():
+    """Call after writing settings, branches or users"""
+    await db.cache_versions.update_one({"_id": "reference_data"}, {"$inc": {"version": 1}}, upsert=True)
+    reference_data.invalidate()
+
 # ============== USERS ROUTES ==============
 
 @api_router.get("/users")
 async def get_users(request: Request):
     """Get all users (CRM only)"""
     await require_role(request, ["CRM"])
-    users = await db.users.find({}, {"_id": 0, "password_hash": 0}).to_list(100)
-    return users
+    return (await get_reference_data()).users
 
 @api_router.post("/users")
 async def create_user(request: Request, user_data: UserCreate):
@@ -375,6 +534,7 @@ async def create_user(request: Request, user_data: UserCreate):
         "created_at": datetime.now(timezone.utc).isoformat()
     }
     await db.users.insert_one(new_user)
+    await bump_reference_data()
     
     # Return without password_hash and _id
     user_response = {k: v for k, v in new_user.items() if k not in ["password_hash", "_id"]}
@@ -429,6 +589,7 @@ async def update_user(request: Request, user_id: str, user_data: UserUpdate):
         
         if result.matched_count == 0:
             raise HTTPException(status_code=404, detail="User not found")
+        await bump_reference_data()
     
     return {"message": "User updated"}
 
@@ -470,6 +631,7 @@ async def toggle_lock(request: Request, user_id: str):
         {"user_id": user_id},
         {"$set": {"is_locked": new_lock_status}}
     )
+    await bump_reference_data()
     
     return {"message": "User lock status updated", "is_locked": new_lock_status}
 
@@ -496,6 +658,7 @@ async def delete_user(request: Request, user_id: str):
     
     if result.deleted_count == 0:
         raise HTTPException(status_code=404, detail="User not found")
+    await bump_reference_data()
     
     return {"message": "User permanently deleted"}
 
@@ -503,11 +666,7 @@ async def delete_user(request: Request, user_id: str):
 async def get_cres(request: Request):
     """Get all CRE users"""
     await get_current_user(request)
-    cres = await db.users.find(
-        {"role": "CRE", "is_active": True},
-        {"_id": 0, "password_hash": 0}
-    ).to_list(50)
-    return cres
+    return (await get_reference_data()).active_cres()
 
 # ============== SETTINGS ROUTES ==============
 
@@ -529,9 +688,10 @@ async def get_settings(request: Request):
     """Get all settings"""
     await get_current_user(request)
     
-    settings = await db.settings.find_one({"settings_id": "main"}, {"_id": 0})
+    settings = (await get_reference_data()).settings
     if not settings:
         await db.settings.insert_one(DEFAULT_SETTINGS.copy())
+        await bump_reference_data()
         settings = DEFAULT_SETTINGS.copy()
     
     return settings
@@ -549,9 +709,12 @@ async def update_settings(request: Request, settings_data: SettingsUpdate):
             {"$set": update_dict},
             upsert=True
         )
+        await bump_reference_data()
+        if "vehicle_models" in update_dict:
+            await recompute_model_validity(update_dict["vehicle_models"])
+            vehicle_count_cache.clear()
     
-    settings = await db.settings.find_one({"settings_id": "main"}, {"_id": 0})
-    return settings
+    return (await get_reference_data()).settings
 
 # ============== BRANCHES ROUTES ==============
 
@@ -571,8 +734,7 @@ class BranchUpdate(BaseModel):
 async def get_branches(request: Request):
     """Get all branches"""
     await get_current_user(request)
-    branches = await db.branches.find({}, {"_id": 0}).to_list(100)
-    return branches
+    return (await get_reference_data()).branches
 
 @api_router.post("/branches", status_code=201)
 async def create_branch(request: Request, branch_data: BranchCreate):
@@ -589,6 +751,7 @@ async def create_branch(request: Request, branch_data: BranchCreate):
         "created_at": datetime.now(timezone.utc).isoformat()
     }
     await db.branches.insert_one(new_branch)
+    await bump_reference_data()
     
     # Return without _id
     branch_response = {k: v for k, v in new_branch.items() if k != "_id"}
@@ -617,6 +780,7 @@ async def update_branch(request: Request, branch_id: str, branch_data: BranchUpd
         
         if result.matched_count == 0:
             raise HTTPException(status_code=404, detail="Branch not found")
+        await bump_reference_data()
     
     return {"message": "Branch updated"}
 
@@ -637,6 +801,7 @@ async def delete_branch(request: Request, branch_id: str):
     
     if result.deleted_count == 0:
         raise HTTPException(status_code=404, detail="Branch not found")
+    await bump_reference_data()
     
     return {"message": "Branch deleted"}
 
@@ -665,10 +830,10 @@ async def check_duplicates(phone: str, vehicle_reg: Optional[str]) -> tuple:
     
     return dup_phone, dup_vehicle
 
-async def log_activity(appointment_id: str, user_id: str, user_name: str, 
-                       action: str, field: str = None, old_val: str = None, new_val: str = None):
-    """Log an activity"""
-    log = {
+def build_activity_log(appointment_id: str, user_id: str, user_name: str,
+                       action: str, field: str = None, old_val: str = None, new_val: str = None) -> dict:
+    """Build an activity log document"""
+    return {
         "log_id": f"log_{uuid.uuid4().hex[:12]}",
         "appointment_id": appointment_id,
         "user_id": user_id,
@@ -679,8 +844,29 @@ async def log_activity(appointment_id: str, user_id: str, user_name: str,
         "new_value": str(new_val) if new_val is not None else None,
         "timestamp": datetime.now(timezone.utc).isoformat()
     }
+
+async def log_activity(appointment_id: str, user_id: str, user_name: str, 
+                       action: str, field: str = None, old_val: str = None, new_val: str = None):
+    """Log an activity"""
+    log = build_activity_log(appointment_id, user_id, user_name, action, field, old_val, new_val)
     await db.activity_logs.insert_one(log)
 
+def n_minus_1_task_upsert(appointment: dict) -> UpdateOne:
+    """Idempotent upsert of the N-1 reminder task for an appointment"""
+    return UpdateOne(
+        {"appointment_id": appointment["appointment_id"], "task_type": "n_minus_1_reminder"},
+        {"$setOnInsert": {
+            "task_id": f"task_{uuid.uuid4().hex[:12]}",
+            "task_type": "n_minus_1_reminder",
+            "appointment_id": appointment["appointment_id"],
+            "assigned_to": appointment.get("assigned_cre_user"),
+            "status": "pending",
+            "created_at": datetime.now(timezone.utc).isoformat(),
+            "completed_at": None
+        }},
+        upsert=True
+    )
+
 @api_router.post("/appointments", status_code=201)
 async def create_appointment(request: Request, appt_data: AppointmentCreate):
     """Create new appointment"""
@@ -745,8 +931,12 @@ async def create_appointment(request: Request, appt_data: AppointmentCreate):
         "duplicate_phone_last_30_days": dup_phone,
         "duplicate_vehicle_last_30_days": dup_vehicle
     }
+    appointment.update(appointment_search_keys(appointment))
     
     await db.appointments.insert_one(appointment)
+    index_appointment(appointment)
+    vehicle_search_cache.clear()
+    await sync_customer(appointment)
     
     # Log activity
     await log_activity(
@@ -756,19 +946,10 @@ async def create_appointment(request: Request, appt_data: AppointmentCreate):
         "Created appointment"
     )
     
-    # Create N-1 task if appointment is tomorrow
-    tomorrow = (datetime.now(timezone.utc) + timedelta(days=1)).strftime("%Y-%m-%d")
+    # Create N-1 task if appointment is tomorrow (the nightly job covers the rest)
+    tomorrow = (datetime.now(IST) + timedelta(days=1)).strftime("%Y-%m-%d")
     if appointment["appointment_date"] == tomorrow:
-        task = {
-            "task_id": f"task_{uuid.uuid4().hex[:12]}",
-            "task_type": "n_minus_1_reminder",
-            "appointment_id": appointment["appointment_id"],
-            "assigned_to": appointment["assigned_cre_user"],
-            "status": "pending",
-            "created_at": now,
-            "completed_at": None
-        }
-        await db.tasks.insert_one(task)
+        await db.tasks.bulk_write([n_minus_1_task_upsert(appointment)])
     
     return {k: v for k, v in appointment.items() if k != "_id"}
 
@@ -927,6 +1108,8 @@ async def update_appointment(request: Request, appointment_id: str, update_data:
             )
     
     update_dict["updated_at"] = datetime.now(timezone.utc).isoformat()
+    if "vehicle_reg_no" in update_dict or "customer_phone" in update_dict:
+        update_dict.update(appointment_search_keys({**appointment, **update_dict}))
     
     await db.appointments.update_one(
         {"appointment_id": appointment_id},
@@ -990,12 +1173,18 @@ async def update_appointment(request: Request, appointment_id: str, update_data:
                 "created_at": now_iso,
                 "updated_at": now_iso,
             }
+            new_appt.update(appointment_search_keys(new_appt))
             await db.appointments.insert_one(new_appt)
+            index_appointment(new_appt)
+            vehicle_search_cache.clear()
+            await sync_customer(new_appt)
+            if reschedule_date == (datetime.now(IST) + timedelta(days=1)).strftime("%Y-%m-%d"):
+                await db.tasks.bulk_write([n_minus_1_task_upsert(new_appt)])
             
             # Also store the history on the original appointment
             await db.appointments.update_one(
                 {"appointment_id": appointment_id},
-                {"$set": {"reschedule_history": existing_history}}
+                {"$set": {"reschedule_history": existing_history, "updated_at": now_iso}}
             )
             
             await log_activity(
@@ -1013,6 +1202,12 @@ async def update_appointment(request: Request, appointment_id: str, update_data:
         )
     
     updated = await db.appointments.find_one({"appointment_id": appointment_id}, {"_id": 0})
+    index_appointment(updated)
+    if "vehicle_reg_no" in update_dict or "customer_phone" in update_dict:
+        vehicle_search_cache.clear()
+    if normalize_phone(appointment.get("customer_phone")) != normalize_phone(updated.get("customer_phone")):
+        await unlink_customer_appointment(appointment.get("customer_phone"), appointment_id)
+    await sync_customer(updated)
     return updated
 
 @api_router.get("/appointments/{appointment_id}/activity")
@@ -1064,10 +1259,17 @@ async def check_duplicate_records(request: Request, phone: str = None, vehicle:
 
 # ============== TASKS ROUTES ==============
 
+TASK_PAGE_SIZE = 100
+
 @api_router.get("/tasks")
-async def get_tasks(request: Request, status: str = "pending"):
-    """Get tasks for current user"""
+async def get_tasks(request: Request, response: Response, status: str = "pending", cursor: str = None, limit: int = TASK_PAGE_SIZE):
+    """Get tasks for current user, ordered by appointment date/time.
+    
+    Pages by keyset; when more remain, the X-Next-Cursor header carries the
+    cursor for the next page.
+    """
     user = await get_current_user(request)
+    limit = max(1, min(limit, 500))
     
     query = {"status": status}
     
@@ -1075,16 +1277,41 @@ async def get_tasks(request: Request, status: str = "pending"):
     if user["role"] == "CRE":
         query["assigned_to"] = user["user_id"]
     
-    tasks = await db.tasks.find(query, {"_id": 0}).to_list(100)
+    sort_fields = ["sort_date", "sort_time", "task_id"]
+    pipeline = [
+        {"$match": query},
+        {"$lookup": {
+            "from": "appointments",
+            "let": {"appointment_id": "$appointment_id"},
+            "pipeline": [
+                {"$match": {"$expr": {"$eq": ["$appointment_id", "$$appointment_id"]}}},
+                {"$limit": 1},
+                {"$project": {"_id": 0, "customer_name": 1, "customer_phone": 1, "appointment_date": 1, "appointment_time": 1}},
+            ],
+            "as": "appointment_info",
+        }},
+        {"$unwind": {"path": "$appointment_info", "preserveNullAndEmptyArrays": True}},
+        {"$addFields": {
+            "sort_date": {"$ifNull": ["$appointment_info.appointment_date", "9999-12-31"]},
+            "sort_time": {"$ifNull": ["$appointment_info.appointment_time", ""]},
+        }},
+    ]
+    if cursor:
+        pipeline.append({"$match": keyset_filter(sort_fields, decode_cursor(cursor))})
+    pipeline += [
+        {"$sort": {f: 1 for f in sort_fields}},
+        {"$limit": limit + 1},
+        {"$project": {"_id": 0}},
+    ]
+    
+    tasks = await db.tasks.aggregate(pipeline).to_list(limit + 1)
+    if len(tasks) > limit:
+        tasks = tasks[:limit]
+        response.headers["X-Next-Cursor"] = encode_cursor([tasks[-1][f] for f in sort_fields])
     
-    # Enrich with appointment info
     for task in tasks:
-        appt = await db.appointments.find_one(
-            {"appointment_id": task["appointment_id"]},
-            {"_id": 0, "customer_name": 1, "customer_phone": 1, "appointment_date": 1, "appointment_time": 1}
-        )
-        if appt:
-            task["appointment_info"] = appt
+        task.pop("sort_date", None)
+        task.pop("sort_time", None)
     
     return tasks
 
@@ -1138,12 +1365,11 @@ async def get_dashboard_stats(request: Request):
     
     # By CRE
     by_cre = {}
+    user_names = (await get_reference_data()).user_names
     cres = await db.appointments.distinct("assigned_cre_user", today_query)
     for cre in cres:
         count = await db.appointments.count_documents({**today_query, "assigned_cre_user": cre})
-        # Get CRE name
-        cre_user = await db.users.find_one({"user_id": cre}, {"_id": 0, "name": 1})
-        cre_name = cre_user["name"] if cre_user else cre
+        cre_name = user_names.get(cre) or cre
         by_cre[cre_name] = count
     
     # Tomorrow pending confirmations
@@ -1203,6 +1429,61 @@ async def get_dashboard_stats(request: Request):
 
 # ============== EXPORT ROUTES ==============
 
+# Declared column schema for appointment exports. Appointment documents differ
+# in shape (seeded, created via the API, rescheduled copies), so the header is
+# fixed here rather than taken from whichever document happens to come first.
+APPOINTMENT_EXPORT_COLUMNS = [
+    "appointment_id", "booking_id", "sl_no", "branch", "appointment_date", "appointment_time",
+    "source", "customer_name", "customer_phone", "customer_email", "vehicle_reg_no", "model",
+    "current_km", "ots", "service_type", "allocated_sa", "specific_repair_request",
+    "priority_customer", "docket_readiness", "n_minus_1_confirmation_status",
+    "n_minus_1_confirmation_notes", "appointment_status", "appointment_day_outcome",
+    "appointment_day_outcome_notes", "reschedule_date", "reschedule_remarks", "cancel_reason",
+    "lost_customer", "recovered_lost_customer", "is_rescheduled", "reschedule_history",
+    "assigned_cre_user", "cre_name", "created_by_user", "created_at", "updated_at",
+    "duplicate_phone_last_30_days", "duplicate_vehicle_last_30_days",
+]
+
+# Legacy field names used by seeded / rescheduled appointments
+APPOINTMENT_EXPORT_ALIASES = {
+    "vehicle_reg_no": "vehicle_reg",
+    "model": "vehicle_model",
+    "specific_repair_request": "specific_repair",
+    "created_by_user": "created_by",
+    "ots": "ots_recall",
+}
+
+EXPORT_BATCH_SIZE = 1000
+
+def export_row(doc: dict, columns: List[str], aliases: dict = None, na_value: Any = "") -> dict:
+    """Project a document onto a fixed column list, flattening nested values"""
+    aliases = aliases or {}
+    row = {}
+    for col in columns:
+        value = doc.get(col)
+        if value is None and col in aliases:
+            value = doc.get(aliases[col])
+        if isinstance(value, (list, dict)):
+            value = json.dumps(value, default=str)
+        row[col] = na_value if value is None else value
+    return row
+
+async def stream_csv(cursor, columns: List[str], aliases: dict = None):
+    """Yield CSV chunks from a Motor cursor, one chunk per EXPORT_BATCH_SIZE rows"""
+    buffer = io.StringIO()
+    writer = csv.DictWriter(buffer, fieldnames=columns, extrasaction="ignore")
+    writer.writeheader()
+    rows = 0
+    async for doc in cursor.batch_size(EXPORT_BATCH_SIZE):
+        writer.writerow(export_row(doc, columns, aliases))
+        rows += 1
+        if rows % EXPORT_BATCH_SIZE == 0:
+            yield buffer.getvalue()
+            buffer.seek(0)
+            buffer.truncate(0)
+    if buffer.tell():
+        yield buffer.getvalue()
+
 @api_router.get("/export/csv")
 async def export_csv(
     request: Request,
@@ -1210,7 +1491,7 @@ async def export_csv(
     month: int = None,
     year: int = None
 ):
-    """Export appointments to CSV"""
+    """Export appointments to CSV (streamed from the cursor)"""
     await require_role(request, ["CRM", "DP"])
     
     query = {}
@@ -1227,139 +1508,1291 @@ async def export_csv(
         end = f"{year + 1}-01-01"
         query["appointment_date"] = {"$gte": start, "$lt": end}
     
-    appointments = await db.appointments.find(query, {"_id": 0}).to_list(10000)
-    
-    if not appointments:
+    if await db.appointments.find_one(query, {"_id": 1}) is None:
         raise HTTPException(status_code=404, detail="No data to export")
     
-    # Create CSV
-    output = io.StringIO()
-    if appointments:
-        writer = csv.DictWriter(output, fieldnames=appointments[0].keys())
-        writer.writeheader()
-        writer.writerows(appointments)
-    
-    output.seek(0)
+    cursor = db.appointments.find(query, {"_id": 0}).sort([("appointment_date", 1), ("appointment_time", 1)])
     
     return StreamingResponse(
-        iter([output.getvalue()]),
+        stream_csv(cursor, APPOINTMENT_EXPORT_COLUMNS, APPOINTMENT_EXPORT_ALIASES),
         media_type="text/csv",
-        headers={"Content-Disposition": f"attachment; filename=appointments_export.csv"}
+        headers={"Content-Disposition": "attachment; filename=appointments_export.csv"}
     )
 
-# ============== SEED DATA ==============
+APPOINTMENT_EXPORT_TYPES = {
+    "sl_no": "int",
+    "current_km": "int",
+    "ots": "bool",
+    "priority_customer": "bool",
+    "docket_readiness": "bool",
+    "lost_customer": "bool",
+    "recovered_lost_customer": "bool",
+    "is_rescheduled": "bool",
+    "reschedule_history": "json",
+    "duplicate_phone_last_30_days": "bool",
+    "duplicate_vehicle_last_30_days": "bool",
+    "created_at": "datetime",
+    "updated_at": "datetime",
+}
 
-@api_router.post("/seed")
-async def seed_data():
-    """Seed initial data for testing"""
-    # Check if admin already exists
-    existing_admin = await db.users.find_one({"username": "admin"}, {"_id": 0})
-    if existing_admin:
-        return {"message": "Data already seeded"}
+RECEPTION_EXPORT_COLUMNS = [
+    "entry_id", "vehicle_reception_time", "entry_time", "source", "vehicle_reg_no", "vin",
+    "engine_no", "customer_name", "customer_type", "first_name", "last_name", "company_name",
+    "contact_no", "alternate_no", "email", "address", "city", "state", "pin", "date_of_birth",
+    "anniversary", "driven_by", "preferred_contact_mode", "preferred_contact_time",
+    "insurance_attached", "insurance_not_collected", "insurance_not_collected_reason",
+    "rc_attached", "rc_not_collected", "rc_not_collected_reason", "contact_validation", "status",
+    "branch", "linked_appointment_id", "created_by", "created_by_name", "created_at", "updated_at",
+]
+
+RECEPTION_EXPORT_TYPES = {
+    "vehicle_reception_time": "datetime",
+    "entry_time": "datetime",
+    "preferred_contact_mode": "json",
+    "preferred_contact_time": "json",
+    "insurance_attached": "bool",
+    "insurance_not_collected": "bool",
+    "rc_attached": "bool",
+    "rc_not_collected": "bool",
+    "contact_validation": "bool",
+    "created_at": "datetime",
+    "updated_at": "datetime",
+}
+
+VEHICLE_EXPORT_COLUMNS = [
+    "vehicle_id", "vehicle_reg_no", "vin", "engine_no", "brand", "make", "model",
+    "customer_name", "customer_phone", "customer_type", "first_name", "last_name", "company_name",
+    "contact_no", "alternate_no", "email", "address", "city", "state", "pin", "date_of_birth",
+    "anniversary", "driven_by", "preferred_contact_mode", "preferred_contact_time",
+    "created_at", "updated_at",
+]
+
+VEHICLE_EXPORT_TYPES = {
+    "preferred_contact_mode": "json",
+    "preferred_contact_time": "json",
+    "created_at": "datetime",
+    "updated_at": "datetime",
+}
+
+ACTIVITY_LOG_EXPORT_COLUMNS = [
+    "log_id", "appointment_id", "user_id", "user_name", "action",
+    "field_changed", "old_value", "new_value", "timestamp",
+]
+
+ACTIVITY_LOG_EXPORT_TYPES = {
+    "timestamp": "datetime",
+}
+
+# Exportable collections: column schema, column types, legacy aliases, the
+# natural key (used by imports), the field date filters apply to, and the
+# export sort order
+EXPORT_SOURCES = {
+    "appointments": {
+        "columns": APPOINTMENT_EXPORT_COLUMNS,
+        "types": APPOINTMENT_EXPORT_TYPES,
+        "aliases": APPOINTMENT_EXPORT_ALIASES,
+        "key": "appointment_id",
+        "date_field": "appointment_date",
+        "sort": [("appointment_date", 1), ("appointment_time", 1)],
+    },
+    "reception_entries": {
+        "columns": RECEPTION_EXPORT_COLUMNS,
+        "types": RECEPTION_EXPORT_TYPES,
+        "aliases": {},
+        "key": "entry_id",
+        "date_field": "entry_time",
+        "sort": [("entry_time", 1)],
+    },
+    "vehicles": {
+        "columns": VEHICLE_EXPORT_COLUMNS,
+        "types": VEHICLE_EXPORT_TYPES,
+        "aliases": {"contact_no": "customer_phone", "customer_phone": "contact_no"},
+        "key": "vehicle_reg_no",
+        "date_field": "created_at",
+        "sort": [("created_at", 1)],
+    },
+    "activity_logs": {
+        "columns": ACTIVITY_LOG_EXPORT_COLUMNS,
+        "types": ACTIVITY_LOG_EXPORT_TYPES,
+        "aliases": {},
+        "key": "log_id",
+        "date_field": "timestamp",
+        "sort": [("timestamp", 1)],
+    },
+}
+
+EXPORT_MEDIA_TYPES = {
+    "csv": "text/csv",
+    "parquet": "application/vnd.apache.parquet",
+    "xlsx": "application/vnd.openxmlformats-officedocument.spreadsheetml.sheet",
+}
+
+# Excel caps a sheet at 1,048,576 rows; roll over to a new sheet before that
+XLSX_MAX_SHEET_ROWS = 1_000_000
+
+async def iter_export_batches(cursor):
+    """Yield lists of up to EXPORT_BATCH_SIZE documents from a Motor cursor"""
+    batch = []
+    async for doc in cursor.batch_size(EXPORT_BATCH_SIZE):
+        batch.append(doc)
+        if len(batch) >= EXPORT_BATCH_SIZE:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
+
+def export_frame(docs: List[dict], spec: dict) -> pd.DataFrame:
+    """Build a typed DataFrame for one batch of documents"""
+    columns = spec["columns"]
+    frame = pd.DataFrame(
+        [export_row(doc, columns, spec["aliases"], na_value=None) for doc in docs],
+        columns=columns,
+    )
+    for col in columns:
+        kind = spec["types"].get(col, "string")
+        if kind == "int":
+            frame[col] = pd.to_numeric(frame[col], errors="coerce").astype("Int64")
+        elif kind == "bool":
+            frame[col] = frame[col].map(lambda v: v if isinstance(v, bool) else None).astype("boolean")
+        elif kind == "datetime":
+            frame[col] = pd.to_datetime(frame[col], utc=True, errors="coerce", format="ISO8601")
+        else:
+            # "string" and "json" (already serialized by export_row)
+            frame[col] = frame[col].astype("string")
+    return frame
+
+def export_query(source: str, date_from: str = None, date_to: str = None) -> dict:
+    """Date-range query on the source's date field (inclusive, YYYY-MM-DD)"""
+    date_field = EXPORT_SOURCES[source]["date_field"]
+    bounds = {}
+    for name, value in (("date_from", date_from), ("date_to", date_to)):
+        if value:
+            try:
+                bounds[name] = datetime.strptime(value, "%Y-%m-%d")
+            except ValueError:
+                raise HTTPException(status_code=400, detail=f"{name} must be a YYYY-MM-DD date")
+    query = {}
+    if date_from:
+        query.setdefault(date_field, {})["$gte"] = date_from
+    if date_to:
+        # ISO timestamps sort after the bare date, so bound by the following day
+        query.setdefault(date_field, {})["$lt"] = (bounds["date_to"] + timedelta(days=1)).strftime("%Y-%m-%d")
+    return query
+
+async def write_export_file(source: str, fmt: str, query: dict, path: Path, on_batch=None) -> int:
+    """Write a collection export to path in csv/parquet/xlsx, batch by batch.
+
+    on_batch(rows_written) is awaited after every batch when given.
+    Returns the number of rows written.
+    """
+    spec = EXPORT_SOURCES[source]
+    cursor = db[source].find(query, {"_id": 0}).sort(spec["sort"])
+    rows = 0
+
+    if fmt == "csv":
+        with open(path, "w", newline="", encoding="utf-8") as fh:
+            writer = csv.DictWriter(fh, fieldnames=spec["columns"], extrasaction="ignore")
+            writer.writeheader()
+            async for batch in iter_export_batches(cursor):
+                writer.writerows(export_row(doc, spec["columns"], spec["aliases"]) for doc in batch)
+                rows += len(batch)
+                if on_batch:
+                    await on_batch(rows)
+        return rows
+
+    # pandas / pyarrow / openpyxl work is CPU-bound: keep it off the event loop
+    if fmt == "parquet":
+        import pyarrow as pa
+        import pyarrow.parquet as pq
+
+        def to_table(docs: List[dict]):
+            return pa.Table.from_pandas(export_frame(docs, spec), preserve_index=False)
+
+        writer = None
+        try:
+            async for batch in iter_export_batches(cursor):
+                table = await run_in_threadpool(to_table, batch)
+                if writer is None:
+                    writer = pq.ParquetWriter(str(path), table.schema, compression="snappy")
+                await run_in_threadpool(writer.write_table, table.cast(writer.schema))
+                rows += len(batch)
+                if on_batch:
+                    await on_batch(rows)
+            if writer is None:
+                # Empty export: still produce a file with the declared schema
+                table = await run_in_threadpool(to_table, [])
+                writer = pq.ParquetWriter(str(path), table.schema, compression="snappy")
+        finally:
+            if writer is not None:
+                await run_in_threadpool(writer.close)
+        return rows
+
+    if fmt == "xlsx":
+        from openpyxl import Workbook
+
+        workbook = Workbook(write_only=True)
+        sheet = None
+        sheet_rows = 0
+
+        def append_batch(docs: List[dict]):
+            nonlocal sheet, sheet_rows
+            frame = export_frame(docs, spec)
+            for col in frame.columns:
+                if isinstance(frame[col].dtype, pd.DatetimeTZDtype):
+                    frame[col] = frame[col].dt.tz_localize(None)
+            frame = frame.astype(object).where(frame.notna(), None)
+            for values in frame.itertuples(index=False, name=None):
+                if sheet is None or sheet_rows >= XLSX_MAX_SHEET_ROWS:
+                    sheet = workbook.create_sheet(f"{source}_{len(workbook.worksheets) + 1}")
+                    sheet.append(spec["columns"])
+                    sheet_rows = 0
+                sheet.append(list(values))
+                sheet_rows += 1
+
+        async for batch in iter_export_batches(cursor):
+            await run_in_threadpool(append_batch, batch)
+            rows += len(batch)
+            if on_batch:
+                await on_batch(rows)
+        if sheet is None:
+            workbook.create_sheet(f"{source}_1").append(spec["columns"])
+        await run_in_threadpool(workbook.save, str(path))
+        return rows
+
+    raise ValueError(f"Unsupported export format: {fmt}")
+
+@api_router.get("/export")
+async def export_collection(
+    request: Request,
+    source: str = "appointments",
+    format: str = "csv",
+    date_from: str = None,
+    date_to: str = None
+):
+    """Export appointments, reception entries, vehicles or activity logs as CSV, Parquet or XLSX"""
+    await require_role(request, ["CRM", "DP"])
     
-    # Create default settings
-    await db.settings.delete_many({})
-    await db.settings.insert_one(DEFAULT_SETTINGS.copy())
+    if source not in EXPORT_SOURCES:
+        raise HTTPException(status_code=400, detail=f"Unknown source. Allowed: {', '.join(EXPORT_SOURCES)}")
+    if format not in EXPORT_MEDIA_TYPES:
+        raise HTTPException(status_code=400, detail=f"Unknown format. Allowed: {', '.join(EXPORT_MEDIA_TYPES)}")
+    
+    query = export_query(source, date_from, date_to)
+    filename = f"{source}_export.{format}"
+    headers = {"Content-Disposition": f"attachment; filename={filename}"}
+    
+    if format == "csv":
+        spec = EXPORT_SOURCES[source]
+        cursor = db[source].find(query, {"_id": 0}).sort(spec["sort"])
+        return StreamingResponse(
+            stream_csv(cursor, spec["columns"], spec["aliases"]),
+            media_type=EXPORT_MEDIA_TYPES[format],
+            headers=headers
+        )
     
-    # Create users with username/password
-    users = [
-        {
-            "user_id": "user_admin_001",
-            "username": "admin",
-            "password_hash": hash_password("admin"),
-            "name": "Tanshu Agarwal",
-            "role": "DP",
-            "email": "tanshu@bohania.com",
-            "mobile": "9876543210",
-            "department": "Admin",
-            "designation": "Dealer Principal",
-            "branch": "Main Branch",
-            "is_active": True,
-            "is_locked": False,
-            "module_access": ["Dashboard", "Customer Relations", "Parts", "Bodyshop", "Mechanical", "Insurance", "HR", "Customers", "Settings", "Users"],
-            "created_at": datetime.now(timezone.utc).isoformat()
-        },
-        {
-            "user_id": "user_receptionist_001",
-            "username": "reception",
-            "password_hash": hash_password("reception123"),
-            "name": "Front Desk",
-            "role": "Receptionist",
-            "email": "reception@bohania.com",
-            "mobile": "9876543211",
-            "department": "Customer Relations",
-            "designation": "Receptionist",
-            "branch": "Main Branch",
-            "is_active": True,
-            "is_locked": False,
-            "module_access": ["Dashboard", "Customer Relations"],
-            "created_at": datetime.now(timezone.utc).isoformat()
-        },
-        {
-            "user_id": "user_cre_001",
-            "username": "cre1",
-            "password_hash": hash_password("cre123"),
-            "name": "CRE Alex",
-            "role": "CRE",
-            "email": "cre1@bohania.com",
-            "mobile": "9876543212",
-            "department": "Customer Relations",
-            "designation": "Customer Relationship Executive",
-            "branch": "Main Branch",
-            "is_active": True,
-            "is_locked": False,
-            "module_access": ["Dashboard", "Customer Relations"],
-            "created_at": datetime.now(timezone.utc).isoformat()
-        },
+    # Parquet and XLSX are written to a temp file batch by batch, then sent from disk
+    fd, tmp_name = tempfile.mkstemp(suffix=f".{format}")
+    os.close(fd)
+    tmp_path = Path(tmp_name)
+    try:
+        await write_export_file(source, format, query, tmp_path)
+    except Exception:
+        tmp_path.unlink(missing_ok=True)
+        raise
+    
+    return FileResponse(
+        tmp_path,
+        media_type=EXPORT_MEDIA_TYPES[format],
+        headers=headers,
+        background=BackgroundTask(tmp_path.unlink, missing_ok=True)
+    )
+
+# Collections served by /export/changes, with the keys a tombstone carries
+CHANGE_FEED_SOURCES = {
+    "appointments": ["appointment_id", "booking_id"],
+    "reception_entries": ["entry_id"],
+    "vehicles": ["vehicle_id", "vehicle_reg_no"],
+}
+CHANGE_FEED_LIMIT = 1000
+# Writes from other workers may land slightly out of timestamp order, so the
+# feed never reads closer to "now" than this
+CHANGE_FEED_SAFETY_LAG_SECONDS = 5
+
+async def record_tombstones(collection: str, docs: List[dict]):
+    """Record deletes so /export/changes can tell downstream systems about them"""
+    if not docs:
+        return
+    key_fields = CHANGE_FEED_SOURCES[collection]
+    now = datetime.now(timezone.utc).isoformat()
+    await db.deleted_records.insert_many([
         {
-            "user_id": "user_cre_002",
-            "username": "cre2",
-            "password_hash": hash_password("cre123"),
-            "name": "CRE Jordan",
-            "role": "CRE",
-            "email": "cre2@bohania.com",
-            "mobile": "9876543213",
-            "department": "Customer Relations",
-            "designation": "Customer Relationship Executive",
-            "branch": "North Branch",
-            "is_active": True,
-            "is_locked": False,
-            "module_access": ["Dashboard", "Customer Relations"],
-            "created_at": datetime.now(timezone.utc).isoformat()
+            "collection": collection,
+            "keys": {k: doc.get(k) for k in key_fields if doc.get(k) is not None},
+            "deleted_at": now,
         }
-    ]
-    
-    await db.users.delete_many({})
-    await db.users.insert_many(users)
-    
-    # Create sample appointments
-    today = datetime.now(timezone.utc).strftime("%Y-%m-%d")
-    tomorrow = (datetime.now(timezone.utc) + timedelta(days=1)).strftime("%Y-%m-%d")
+        for doc in docs
+    ])
+
+def parse_change_watermark(since: Optional[str]) -> tuple:
+    """(timestamp, _id or None) position from an ISO timestamp or a next_watermark"""
+    if not since:
+        return "", None
+    try:
+        since_dt = datetime.fromisoformat(since.replace(" ", "+").replace("Z", "+00:00"))
+    except ValueError:
+        pass
+    else:
+        if since_dt.tzinfo is None:
+            since_dt = since_dt.replace(tzinfo=timezone.utc)
+        return since_dt.astimezone(timezone.utc).isoformat(), None
+    try:
+        ts, doc_id = json.loads(base64.urlsafe_b64decode(since.encode()))
+        return str(ts), ObjectId(doc_id) if doc_id else None
+    except (ValueError, TypeError, InvalidId):
+        raise HTTPException(status_code=400, detail="since must be an ISO timestamp or a next_watermark")
+
+def after_change_position(field: str, ts: str, doc_id: Optional[ObjectId]) -> dict:
+    """Match rows strictly after (ts, doc_id) in (field, _id) order"""
+    if doc_id is None:
+        return {field: {"$gt": ts}}
+    return {"$or": [{field: {"$gt": ts}}, {field: ts, "_id": {"$gt": doc_id}}]}
+
+@api_router.get("/export/changes")
+async def export_changes(request: Request, since: str = None, limit: int = CHANGE_FEED_LIMIT):
+    """Documents modified after the `since` watermark, plus delete tombstones.
+    
+    `since` is an ISO timestamp on the first call; after that pass the
+    returned next_watermark, an (updated_at, _id) position that can stop
+    inside a run of rows sharing one timestamp. Keep calling while has_more
+    is true.
+    """
+    await require_role(request, ["CRM", "DP"])
     
-    await db.appointments.delete_many({})
+    since_ts, since_id = parse_change_watermark(since)
+    limit = max(1, min(limit, CHANGE_FEED_LIMIT))
+    upper = (datetime.now(timezone.utc) - timedelta(seconds=CHANGE_FEED_SAFETY_LAG_SECONDS)).isoformat()
+    
+    # One page per stream in (timestamp, _id) order; (stream name, timestamp field, documents)
+    streams = []
+    sources = [(c, db[c], "updated_at") for c in CHANGE_FEED_SOURCES] + [("tombstones", db.deleted_records, "deleted_at")]
+    for name, collection, field in sources:
+        docs = await collection.find(
+            {"$and": [after_change_position(field, since_ts, since_id), {field: {"$lte": upper}}]}
+        ).sort([(field, 1), ("_id", 1)]).limit(limit + 1).to_list(limit + 1)
+        streams.append((name, field, docs))
+    
+    # If any stream overflowed, end every stream at the earliest last-in-page
+    # position, so the next watermark is consistent across all of them
+    def position(doc: dict, field: str) -> tuple:
+        return (doc[field], str(doc["_id"]))
+    cutoffs = [position(docs[limit - 1], field) for _, field, docs in streams if len(docs) > limit]
+    cutoff = min(cutoffs) if cutoffs else None
+    
+    result = {}
+    for name, field, docs in streams:
+        if cutoff:
+            docs = [d for d in docs if position(d, field) <= cutoff]
+        for doc in docs:
+            doc.pop("_id")
+        result[name] = docs
+    next_watermark = encode_cursor(list(cutoff) if cutoff else [upper, None])
     
-    appointments = [
+    return {
+        "since": since or None,
+        "next_watermark": next_watermark,
+        "has_more": cutoff is not None,
+        "changes": {c: result[c] for c in CHANGE_FEED_SOURCES},
+        "tombstones": result["tombstones"],
+    }
+
+# ============== SCHEDULER ==============
+
+SCHEDULER_TICK_SECONDS = 30
+SCHEDULER_LEASE_SECONDS = 300
+# How far back a newly registered job looks for a run it may have just missed
+SCHEDULER_FIRST_RUN_LOOKBACK = timedelta(days=1)
+# How far back a manual trigger looks for the slot to re-run
+SCHEDULER_MANUAL_LOOKBACK = timedelta(days=7)
+
+# name -> {"cron", "handler", "catch_up"}; filled by @scheduled_job
+SCHEDULED_JOBS = {}
+
+def scheduled_job(name: str, cron: str, catch_up: int = 1):
+    """Register a coroutine handler(scheduled_for: datetime) on the scheduler.
+    
+    catch_up is how many missed runs (e.g. while all workers were down) are
+    replayed, oldest first; older ones are skipped.
+    """
+    parse_cron(cron)
+    def decorator(func):
+        SCHEDULED_JOBS[name] = {"cron": cron, "handler": func, "catch_up": catch_up}
+        return func
+    return decorator
+
+def parse_cron_field(field: str, lo: int, hi: int) -> set:
+    """Parse one cron field (*, lists, ranges, steps) into the set of allowed values"""
+    values = set()
+    for part in field.split(","):
+        step = 1
+        if "/" in part:
+            part, step_str = part.split("/", 1)
+            step = int(step_str)
+            if step < 1:
+                raise ValueError(f"Invalid cron step: {field}")
+        if part == "*":
+            start, end = lo, hi
+        elif "-" in part:
+            start, end = (int(x) for x in part.split("-", 1))
+        else:
+            start = int(part)
+            end = hi if step > 1 else start
+        if start < lo or end > hi or start > end:
+            raise ValueError(f"Cron field out of range: {field}")
+        values.update(range(start, end + 1, step))
+    return values
+
+def parse_cron(expr: str) -> dict:
+    """Parse a 5-field cron expression: minute hour day-of-month month day-of-week"""
+    fields = expr.split()
+    if len(fields) != 5:
+        raise ValueError(f"Cron expression needs 5 fields: {expr}")
+    minute, hour, dom, month, dow = fields
+    dows = parse_cron_field(dow, 0, 7)
+    if 7 in dows:
+        dows = (dows - {7}) | {0}
+    return {
+        "minutes": parse_cron_field(minute, 0, 59),
+        "hours": parse_cron_field(hour, 0, 23),
+        "doms": parse_cron_field(dom, 1, 31),
+        "months": parse_cron_field(month, 1, 12),
+        "dows": dows,
+        "dom_any": dom == "*",
+        "dow_any": dow == "*",
+    }
+
+def cron_next(expr: str, after: datetime) -> datetime:
+    """Next time strictly after `after` matching the cron expression (in IST), as UTC"""
+    spec = parse_cron(expr)
+    t = after.astimezone(IST).replace(second=0, microsecond=0) + timedelta(minutes=1)
+    limit = t + timedelta(days=366 * 5)
+    while t < limit:
+        if t.month not in spec["months"]:
+            year, month = (t.year + 1, 1) if t.month == 12 else (t.year, t.month + 1)
+            t = t.replace(year=year, month=month, day=1, hour=0, minute=0)
+            continue
+        dom_ok = t.day in spec["doms"]
+        dow_ok = (t.weekday() + 1) % 7 in spec["dows"]
+        if spec["dom_any"] or spec["dow_any"]:
+            day_ok = dom_ok and dow_ok
+        else:
+            # Standard cron: when both are restricted, either may match
+            day_ok = dom_ok or dow_ok
+        if not day_ok:
+            t = (t + timedelta(days=1)).replace(hour=0, minute=0)
+            continue
+        if t.hour not in spec["hours"]:
+            t = (t + timedelta(hours=1)).replace(minute=0)
+            continue
+        if t.minute not in spec["minutes"]:
+            t += timedelta(minutes=1)
+            continue
+        return t.astimezone(timezone.utc)
+    raise ValueError(f"Cron expression never matches: {expr}")
+
+def cron_last(expr: str, before: datetime, lookback: timedelta) -> Optional[datetime]:
+    """Latest occurrence at or before `before`, searching back at most `lookback`"""
+    last = None
+    t = cron_next(expr, before - lookback)
+    while t <= before:
+        last = t
+        t = cron_next(expr, t)
+    return last
+
+async def register_scheduled_jobs():
+    """Persist the schedule state for every registered job (idempotent)"""
+    now = datetime.now(timezone.utc)
+    for name, job in SCHEDULED_JOBS.items():
+        await db.scheduled_jobs.update_one(
+            {"name": name},
+            {"$setOnInsert": {
+                "name": name,
+                "cron": job["cron"],
+                "next_run_at": cron_next(job["cron"], now - SCHEDULER_FIRST_RUN_LOOKBACK).isoformat(),
+                "last_run_at": None,
+                "last_status": None,
+                "last_error": None,
+                "last_result": None,
+                "last_duration_ms": None,
+                "lease_owner": None,
+                "lease_expires_at": None,
+            }},
+            upsert=True
+        )
+        # Schedule changed in code: recompute the next run from now
+        await db.scheduled_jobs.update_one(
+            {"name": name, "cron": {"$ne": job["cron"]}},
+            {"$set": {"cron": job["cron"], "next_run_at": cron_next(job["cron"], now).isoformat()}}
+        )
+
+async def acquire_schedule_lease(name: str, owner: str) -> Optional[dict]:
+    """Take the lease on a due job; only one worker across all processes gets it"""
+    now = datetime.now(timezone.utc)
+    now_iso = now.isoformat()
+    return await db.scheduled_jobs.find_one_and_update(
         {
-            "appointment_id": f"appt_{uuid.uuid4().hex[:12]}",
-            "sl_no": 1,
-            "branch": "Main Branch",
-            "appointment_date": today,
-            "appointment_time": "09:00",
-            "source": "SDR",
-            "customer_name": "John Smith",
-            "customer_phone": "9876543210",
-            "customer_email": "john@example.com",
-            "vehicle_reg_no": "KA01AB1234",
-            "model": "Kwid",
-            "current_km": 25000,
-            "ots_recall": False,
-            "service_type": "PMS",
-            "allocated_sa": "SA - John",
-            "specific_repair_request": "AC not cooling properly",
-            "priority_customer": True,
-            "docket_readiness": True,
-            "n_minus_1_confirmation_status": "Confirmed",
-            "n_minus_1_confirmation_notes": "Customer confirmed via call",
+            "name": name,
+            "next_run_at": {"$lte": now_iso},
+            "$or": [{"lease_expires_at": None}, {"lease_expires_at": {"$lt": now_iso}}],
+        },
+        {"$set": {
+            "lease_owner": owner,
+            "lease_expires_at": (now + timedelta(seconds=SCHEDULER_LEASE_SECONDS)).isoformat(),
+        }},
+        projection={"_id": 0},
+        return_document=ReturnDocument.AFTER,
+    )
+
+async def schedule_heartbeat(name: str, owner: str):
+    """Keep renewing a scheduler lease while its job runs"""
+    while True:
+        await asyncio.sleep(SCHEDULER_LEASE_SECONDS / 3)
+        renewed = await db.scheduled_jobs.update_one(
+            {"name": name, "lease_owner": owner},
+            {"$set": {"lease_expires_at": (datetime.now(timezone.utc) + timedelta(seconds=SCHEDULER_LEASE_SECONDS)).isoformat()}}
+        )
+        if renewed.matched_count == 0:
+            logger.warning(f"Scheduler: lost lease on {name} while running")
+            return
+
+async def run_scheduled_job(state: dict, owner: str):
+    """Run every due occurrence of a leased job (bounded by catch_up), persisting state after each"""
+    heartbeat = asyncio.create_task(schedule_heartbeat(state["name"], owner))
+    try:
+        await run_due_occurrences(state, owner)
+    finally:
+        heartbeat.cancel()
+
+async def run_due_occurrences(state: dict, owner: str):
+    name = state["name"]
+    job = SCHEDULED_JOBS[name]
+    now = datetime.now(timezone.utc)
+    
+    due = []
+    t = datetime.fromisoformat(state["next_run_at"])
+    while t <= now:
+        due.append(t)
+        t = cron_next(job["cron"], t)
+    skipped = len(due) - job["catch_up"]
+    if skipped > 0:
+        logger.warning(f"Scheduler: {name} skipping {skipped} missed runs")
+        due = due[-job["catch_up"]:]
+    
+    for scheduled_for in due:
+        started = time.perf_counter()
+        try:
+            result = await job["handler"](scheduled_for)
+            status, error = "succeeded", None
+        except Exception as e:
+            logger.error(f"Scheduler: {name} run for {scheduled_for.isoformat()} failed: {e}")
+            result, status, error = None, "failed", str(e)
+        elapsed_ms = round((time.perf_counter() - started) * 1000)
+        next_run = cron_next(job["cron"], scheduled_for)
+        renewed = await db.scheduled_jobs.update_one(
+            {"name": name, "lease_owner": owner},
+            {"$set": {
+                "last_run_at": scheduled_for.isoformat(),
+                "last_status": status,
+                "last_error": error,
+                "last_result": result,
+                "last_duration_ms": elapsed_ms,
+                "next_run_at": next_run.isoformat(),
+                "lease_expires_at": (datetime.now(timezone.utc) + timedelta(seconds=SCHEDULER_LEASE_SECONDS)).isoformat(),
+            }}
+        )
+        if renewed.matched_count == 0:
+            logger.warning(f"Scheduler: lost lease on {name}")
+            return
+        logger.info(f"Scheduler: {name} for {scheduled_for.isoformat()} {status} in {elapsed_ms} ms")
+    
+    await db.scheduled_jobs.update_one(
+        {"name": name, "lease_owner": owner},
+        {"$set": {"lease_owner": None, "lease_expires_at": None}}
+    )
+
+async def scheduler_loop(owner: str):
+    """Background task: run whichever registered jobs are due and not leased elsewhere"""
+    try:
+        await register_scheduled_jobs()
+    except Exception as e:
+        logger.error(f"Scheduler registration error: {e}")
+    while True:
+        for name in SCHEDULED_JOBS:
+            try:
+                state = await acquire_schedule_lease(name, owner)
+                if state:
+                    await run_scheduled_job(state, owner)
+            except Exception as e:
+                logger.error(f"Scheduler error in {name}: {e}")
+        await asyncio.sleep(SCHEDULER_TICK_SECONDS)
+
+@app.on_event("startup")
+async def start_scheduler():
+    asyncio.create_task(scheduler_loop(f"{socket.gethostname()}:{os.getpid()}"))
+
+@api_router.get("/scheduler/jobs")
+async def get_scheduled_jobs(request: Request):
+    """Schedule state of all registered jobs (CRM/DP only)"""
+    await require_role(request, ["CRM", "DP"])
+    return await db.scheduled_jobs.find({}, {"_id": 0}).sort("name", 1).to_list(100)
+
+@api_router.post("/scheduler/jobs/{name}/run")
+async def trigger_scheduled_job(request: Request, name: str):
+    """Re-run a registered job for its latest due slot; a scheduler worker picks it up on its next tick (CRM/DP only).
+
+    Runs as of the last slot rather than "now", so e.g. the no-show sweep
+    triggered at noon re-checks yesterday's 7 PM slot, not today's.
+    """
+    await require_role(request, ["CRM", "DP"])
+    if name not in SCHEDULED_JOBS:
+        raise HTTPException(status_code=404, detail="Scheduled job not found")
+    slot = cron_last(SCHEDULED_JOBS[name]["cron"], datetime.now(timezone.utc), SCHEDULER_MANUAL_LOOKBACK)
+    if slot is None:
+        raise HTTPException(status_code=409, detail=f"{name} has no due slot to run")
+    await db.scheduled_jobs.update_one(
+        {"name": name},
+        {"$set": {"next_run_at": slot.isoformat()}}
+    )
+    return {"message": f"{name} queued to run", "scheduled_for": slot.isoformat()}
+
+@scheduled_job("expired_sessions_cleanup", "30 3 * * *")
+async def cleanup_expired_sessions(scheduled_for: datetime):
+    """Nightly: drop login sessions past their expiry"""
+    result = await db.user_sessions.delete_many(
+        {"expires_at": {"$lt": datetime.now(timezone.utc).isoformat()}}
+    )
+    return {"deleted": result.deleted_count}
+
+# ============== BACKGROUND JOBS ==============
+
+JOB_ARTIFACT_DIR = Path(os.environ.get("JOB_ARTIFACT_DIR", str(ROOT_DIR / "job_artifacts")))
+JOB_WORKER_CONCURRENCY = int(os.environ.get("JOB_WORKER_CONCURRENCY", "2"))
+JOB_LEASE_SECONDS = 60
+JOB_POLL_SECONDS = 2
+JOB_MAX_ATTEMPTS = 3
+JOB_RETRY_BACKOFF_SECONDS = 30
+JOB_ARTIFACT_TTL_HOURS = 24
+JOB_TYPES = ["export", "import", "rebuild", "vehicle_import"]
+
+class JobCreate(BaseModel):
+    type: str  # export, rebuild (imports go through /jobs/import)
+    params: dict = Field(default_factory=dict)
+
+class JobLeaseLost(Exception):
+    """Raised inside a job when another worker has taken over its lease"""
+
+# Rebuild jobs: name -> coroutine that recomputes derived data
+REBUILD_TASKS = {}
+
+def rebuild_task(name: str):
+    """Register a coroutine as a named rebuild job target"""
+    def decorator(func):
+        REBUILD_TASKS[name] = func
+        return func
+    return decorator
+
+def job_public(job: dict) -> dict:
+    """Job document as returned by the API (no lease bookkeeping or disk paths)"""
+    hidden = {"_id", "lease_owner", "lease_expires_at", "input_path"}
+    public = {k: v for k, v in job.items() if k not in hidden}
+    if public.get("result"):
+        public["result"] = {k: v for k, v in public["result"].items() if k != "artifact_path"}
+    if public.get("status") == "succeeded" and job.get("result", {}).get("artifact_path"):
+        public["download_url"] = f"/api/jobs/{job['job_id']}/download"
+    return public
+
+async def enqueue_job(job_type: str, params: dict, user: dict, input_path: str = None) -> dict:
+    """Insert a queued job"""
+    now = datetime.now(timezone.utc).isoformat()
+    job = {
+        "job_id": f"job_{uuid.uuid4().hex[:12]}",
+        "type": job_type,
+        "params": params,
+        "status": "queued",
+        "progress": 0,
+        "attempts": 0,
+        "max_attempts": JOB_MAX_ATTEMPTS,
+        "run_after": now,
+        "lease_owner": None,
+        "lease_expires_at": None,
+        "input_path": input_path,
+        "result": None,
+        "error": None,
+        "created_by": user["user_id"],
+        "created_by_name": user["name"],
+        "created_at": now,
+        "updated_at": now,
+        "started_at": None,
+        "finished_at": None,
+    }
+    await db.jobs.insert_one(job)
+    job.pop("_id", None)
+    return job
+
+async def claim_job(worker_id: str) -> Optional[dict]:
+    """Atomically lease the oldest runnable job, including ones whose lease expired"""
+    now = datetime.now(timezone.utc)
+    now_iso = now.isoformat()
+    return await db.jobs.find_one_and_update(
+        {"$or": [
+            {"status": "queued", "run_after": {"$lte": now_iso}},
+            {"status": "running", "lease_expires_at": {"$lt": now_iso}},
+        ]},
+        {
+            "$set": {
+                "status": "running",
+                "lease_owner": worker_id,
+                "lease_expires_at": (now + timedelta(seconds=JOB_LEASE_SECONDS)).isoformat(),
+                "started_at": now_iso,
+                "updated_at": now_iso,
+            },
+            "$inc": {"attempts": 1},
+        },
+        sort=[("created_at", 1)],
+        projection={"_id": 0},
+        return_document=ReturnDocument.AFTER,
+    )
+
+async def update_leased_job(job_id: str, worker_id: str, fields: dict):
+    """Update a job only while this worker still holds its lease"""
+    fields = {**fields, "updated_at": datetime.now(timezone.utc).isoformat()}
+    result = await db.jobs.update_one(
+        {"job_id": job_id, "lease_owner": worker_id, "status": "running"},
+        {"$set": fields}
+    )
+    if result.matched_count == 0:
+        raise JobLeaseLost(job_id)
+
+async def job_heartbeat(job_id: str, worker_id: str):
+    """Keep renewing the lease while a job runs"""
+    while True:
+        await asyncio.sleep(JOB_LEASE_SECONDS / 3)
+        lease = (datetime.now(timezone.utc) + timedelta(seconds=JOB_LEASE_SECONDS)).isoformat()
+        await update_leased_job(job_id, worker_id, {"lease_expires_at": lease})
+
+def job_artifact_path(job_id: str, suffix: str) -> Path:
+    JOB_ARTIFACT_DIR.mkdir(parents=True, exist_ok=True)
+    return JOB_ARTIFACT_DIR / f"{job_id}{suffix}"
+
+async def save_upload(file: UploadFile, path: Path):
+    """Stream an uploaded file to disk in 1 MB chunks"""
+    with open(path, "wb") as fh:
+        while chunk := await file.read(1024 * 1024):
+            fh.write(chunk)
+
+async def run_export_job(job: dict, report) -> dict:
+    """Export job: write /api/export output to an artifact on disk"""
+    params = job["params"]
+    source = params.get("source", "appointments")
+    fmt = params.get("format", "csv")
+    if source not in EXPORT_SOURCES or fmt not in EXPORT_MEDIA_TYPES:
+        raise ValueError(f"Invalid export source/format: {source}/{fmt}")
+    
+    query = export_query(source, params.get("date_from"), params.get("date_to"))
+    total = await db[source].count_documents(query)
+    path = job_artifact_path(job["job_id"], f".{fmt}")
+    
+    async def on_batch(rows):
+        await report(rows * 100 // total if total else 100)
+    
+    rows = await write_export_file(source, fmt, query, path, on_batch=on_batch)
+    return {
+        "rows": rows,
+        "artifact_path": str(path),
+        "file_name": f"{source}_export.{fmt}",
+        "media_type": EXPORT_MEDIA_TYPES[fmt],
+    }
+
+def import_value(value: Any, kind: str) -> Any:
+    """Convert a cell from an exported file back to its stored representation"""
+    if value is None or (isinstance(value, float) and pd.isna(value)) or value == "":
+        return None
+    if kind == "int":
+        try:
+            return int(float(value))
+        except (TypeError, ValueError):
+            return None
+    if kind == "bool":
+        if isinstance(value, bool):
+            return value
+        return str(value).strip().lower() in ("true", "1", "yes")
+    if kind == "json":
+        try:
+            return json.loads(value)
+        except (TypeError, ValueError):
+            return value
+    if kind == "datetime" and isinstance(value, datetime):
+        if value.tzinfo is None:
+            value = value.replace(tzinfo=timezone.utc)
+        return value.isoformat()
+    return str(value)
+
+def iter_import_rows(path: Path):
+    """Yield (total_rows, batch_of_row_dicts, (sheet, first_row)) from a CSV, XLSX or Parquet file.
+
+    A batch never spans two sheets; sheet is the XLSX sheet name (None for
+    other formats) and first_row the batch's first row number within it,
+    counting the header as row 1.
+    """
+    suffix = path.suffix.lower()
+    if suffix == ".csv":
+        with open(path, encoding="utf-8") as fh:
+            total = max(sum(1 for _ in fh) - 1, 0)
+        first_row = 2
+        for chunk in pd.read_csv(path, dtype=str, keep_default_na=False, chunksize=EXPORT_BATCH_SIZE):
+            yield total, chunk.to_dict("records"), (None, first_row)
+            first_row += len(chunk)
+    elif suffix == ".xlsx":
+        from openpyxl import load_workbook
+
+        workbook = load_workbook(str(path), read_only=True)
+        total = sum(max(ws.max_row - 1, 0) for ws in workbook.worksheets)
+        for ws in workbook.worksheets:
+            rows = ws.iter_rows(values_only=True)
+            header = next(rows, None)
+            if not header:
+                continue
+            batch = []
+            first_row = 2
+            for values in rows:
+                batch.append(dict(zip(header, values)))
+                if len(batch) >= EXPORT_BATCH_SIZE:
+                    yield total, batch, (ws.title, first_row)
+                    first_row += len(batch)
+                    batch = []
+            if batch:
+                yield total, batch, (ws.title, first_row)
+        workbook.close()
+    elif suffix == ".parquet":
+        import pyarrow.parquet as pq
+
+        parquet = pq.ParquetFile(str(path))
+        total = parquet.metadata.num_rows
+        first_row = 2
+        for record_batch in parquet.iter_batches(batch_size=EXPORT_BATCH_SIZE):
+            yield total, record_batch.to_pylist(), (None, first_row)
+            first_row += record_batch.num_rows
+    else:
+        raise ValueError(f"Unsupported import file type: {suffix}")
+
+# Derived fields an imported row needs to be found and checked like one
+# written through the API
+IMPORT_SEARCH_KEYS = {
+    "appointments": appointment_search_keys,
+    "reception_entries": reception_search_keys,
+    "vehicles": vehicle_search_keys,
+}
+
+def import_upsert(source: str, key: str, doc: dict, master_models: List[str], now: str) -> Optional[UpdateOne]:
+    """Upsert for one imported row, with search keys and (vehicles) identity and
+    model validity; None for a vehicle whose reg normalizes to nothing"""
+    on_insert = {}
+    if source == "vehicles":
+        # Stored the way create_vehicle stores them
+        for field in ("vehicle_reg_no", "vin"):
+            if isinstance(doc.get(field), str):
+                doc[field] = doc[field].upper().replace(" ", "")
+    if source in IMPORT_SEARCH_KEYS:
+        doc.update(IMPORT_SEARCH_KEYS[source](doc))
+        doc["updated_at"] = now
+    if source == "vehicles":
+        if not doc["reg_key"]:
+            return None
+        validity = model_validity({"brand": "renault", **doc}, master_models)
+        if "brand" in doc:
+            doc["is_model_valid"] = validity
+        else:
+            on_insert.update({"brand": "renault", "is_model_valid": validity})
+        if not doc.get("vehicle_id"):
+            doc.pop("vehicle_id", None)
+            on_insert["vehicle_id"] = new_vehicle_id()
+        if "created_at" not in doc:
+            on_insert["created_at"] = now
+        # Vehicles are matched on the normalized reg, as the unique index is
+        match = {"reg_key": doc["reg_key"]}
+    else:
+        match = {key: doc[key]}
+    update = {"$set": doc}
+    if on_insert:
+        update["$setOnInsert"] = on_insert
+    return UpdateOne(match, update, upsert=True)
+
+async def run_import_job(job: dict, report) -> dict:
+    """Import job: upsert rows of an exported file back into its collection by natural key.
+
+    Rows get the same derived search keys (and, for vehicles, vehicle_id,
+    brand and model validity) as rows written through the API. Rows that
+    clash on a unique vehicle key are counted as failed.
+    """
+    source = job["params"].get("source")
+    if source not in EXPORT_SOURCES:
+        raise ValueError(f"Invalid import source: {source}")
+    spec = EXPORT_SOURCES[source]
+    key = spec["key"]
+    path = Path(job["input_path"])
+    master_models = (await get_reference_data()).vehicle_models() if source == "vehicles" else []
+    
+    imported = skipped = failed = processed = 0
+    for total, batch, _ in iter_import_rows(path):
+        now = datetime.now(timezone.utc).isoformat()
+        ops = []
+        for raw in batch:
+            doc = {}
+            for col in spec["columns"]:
+                value = import_value(raw.get(col), spec["types"].get(col, "string"))
+                if value is not None:
+                    doc[col] = value
+            op = import_upsert(source, key, doc, master_models, now) if doc.get(key) else None
+            if op is None:
+                skipped += 1
+                continue
+            ops.append(op)
+        if ops:
+            try:
+                await db[source].bulk_write(ops, ordered=False)
+                imported += len(ops)
+            except BulkWriteError as e:
+                errors = e.details.get("writeErrors", [])
+                if any(err.get("code") != 11000 for err in errors):
+                    raise
+                failed += len(errors)
+                imported += len(ops) - len(errors)
+        processed += len(batch)
+        await report(processed * 100 // total if total else 100)
+    
+    if source in ("appointments", "vehicles"):
+        vehicle_search_cache.clear()
+        vehicle_count_cache.clear()
+    path.unlink(missing_ok=True)
+    return {"rows": imported, "skipped": skipped, "failed": failed}
+
+async def run_rebuild_job(job: dict, report) -> dict:
+    """Rebuild job: run one named rebuild task, or all of them"""
+    target = job["params"].get("target", "all")
+    names = list(REBUILD_TASKS) if target == "all" else [target]
+    unknown = [n for n in names if n not in REBUILD_TASKS]
+    if unknown:
+        raise ValueError(f"Unknown rebuild target: {', '.join(unknown)}")
+    results = {}
+    for i, name in enumerate(names):
+        results[name] = await REBUILD_TASKS[name]()
+        await report((i + 1) * 100 // len(names))
+    return {"rebuilt": results}
+
+JOB_HANDLERS = {
+    "export": run_export_job,
+    "import": run_import_job,
+    "rebuild": run_rebuild_job,
+}
+
+async def execute_job(job: dict, worker_id: str):
+    """Run a leased job to completion, scheduling a retry or failing it on error"""
+    job_id = job["job_id"]
+    
+    if job["attempts"] > job.get("max_attempts", JOB_MAX_ATTEMPTS):
+        await update_leased_job(job_id, worker_id, {
+            "status": "failed",
+            "error": job.get("error") or "Exceeded max attempts",
+            "finished_at": datetime.now(timezone.utc).isoformat(),
+            "lease_owner": None,
+        })
+        return
+    
+    async def report(progress: int):
+        await update_leased_job(job_id, worker_id, {"progress": min(int(progress), 100)})
+    
+    heartbeat = asyncio.create_task(job_heartbeat(job_id, worker_id))
+    try:
+        result = await JOB_HANDLERS[job["type"]](job, report)
+    except JobLeaseLost:
+        logger.warning(f"Job {job_id}: lease lost, abandoning on {worker_id}")
+        return
+    except Exception as e:
+        logger.error(f"Job {job_id} attempt {job['attempts']} failed: {e}")
+        now = datetime.now(timezone.utc)
+        if job["attempts"] < job.get("max_attempts", JOB_MAX_ATTEMPTS):
+            retry_at = now + timedelta(seconds=JOB_RETRY_BACKOFF_SECONDS * 2 ** (job["attempts"] - 1))
+            fields = {"status": "queued", "run_after": retry_at.isoformat()}
+        else:
+            fields = {"status": "failed", "finished_at": now.isoformat()}
+            if job.get("input_path"):
+                Path(job["input_path"]).unlink(missing_ok=True)
+        try:
+            await update_leased_job(job_id, worker_id, {**fields, "error": str(e), "lease_owner": None})
+        except JobLeaseLost:
+            pass
+        return
+    finally:
+        heartbeat.cancel()
+    
+    now = datetime.now(timezone.utc)
+    if result.get("artifact_path"):
+        result["artifact_expires_at"] = (now + timedelta(hours=JOB_ARTIFACT_TTL_HOURS)).isoformat()
+    try:
+        await update_leased_job(job_id, worker_id, {
+            "status": "succeeded",
+            "progress": 100,
+            "result": result,
+            "error": None,
+            "finished_at": now.isoformat(),
+            "lease_owner": None,
+        })
+    except JobLeaseLost:
+        logger.warning(f"Job {job_id}: lease lost before completion on {worker_id}")
+
+async def job_worker_loop(worker_id: str):
+    """Background task: lease and run jobs one at a time"""
+    while True:
+        try:
+            job = await claim_job(worker_id)
+            if job:
+                await execute_job(job, worker_id)
+                continue
+        except Exception as e:
+            logger.error(f"Job worker {worker_id} error: {e}")
+        await asyncio.sleep(JOB_POLL_SECONDS)
+
+async def expire_job_artifacts() -> int:
+    """Delete artifacts past their expiry and mark their jobs expired"""
+    now_iso = datetime.now(timezone.utc).isoformat()
+    count = 0
+    async for job in db.jobs.find(
+        {"status": "succeeded", "result.artifact_expires_at": {"$lt": now_iso}},
+        {"_id": 0, "job_id": 1, "result": 1}
+    ):
+        Path(job["result"]["artifact_path"]).unlink(missing_ok=True)
+        await db.jobs.update_one(
+            {"job_id": job["job_id"]},
+            {"$set": {"status": "expired", "updated_at": now_iso}}
+        )
+        count += 1
+    return count
+
+@scheduled_job("job_artifact_cleanup", "*/10 * * * *")
+async def cleanup_job_artifacts(scheduled_for: datetime):
+    """Every 10 minutes: expire job artifacts"""
+    return {"expired": await expire_job_artifacts()}
+
+@app.on_event("startup")
+async def start_job_workers():
+    host = socket.gethostname()
+    for n in range(JOB_WORKER_CONCURRENCY):
+        asyncio.create_task(job_worker_loop(f"{host}:{os.getpid()}:{n}"))
+
+@rebuild_task("indexes")
+async def rebuild_indexes():
+    await ensure_indexes()
+    return "ok"
+
+async def get_visible_job(user: dict, job_id: str) -> dict:
+    """Fetch a job the user may see (own jobs; CRM/DP see all)"""
+    job = await db.jobs.find_one({"job_id": job_id}, {"_id": 0})
+    if not job:
+        raise HTTPException(status_code=404, detail="Job not found")
+    if user["role"] not in ("CRM", "DP") and job["created_by"] != user["user_id"]:
+        raise HTTPException(status_code=404, detail="Job not found")
+    return job
+
+@api_router.post("/jobs", status_code=202)
+async def create_job(request: Request, data: JobCreate):
+    """Queue an export or rebuild job (CRM/DP only)"""
+    user = await require_role(request, ["CRM", "DP"])
+    
+    if data.type not in JOB_TYPES:
+        raise HTTPException(status_code=400, detail=f"Unknown job type. Allowed: {', '.join(JOB_TYPES)}")
+    if data.type == "import":
+        raise HTTPException(status_code=400, detail="Upload import files to /api/jobs/import")
+    if data.type == "vehicle_import":
+        raise HTTPException(status_code=400, detail="Upload vehicle files to /api/vehicles/import")
+    if data.type == "export":
+        if data.params.get("source", "appointments") not in EXPORT_SOURCES:
+            raise HTTPException(status_code=400, detail=f"Unknown source. Allowed: {', '.join(EXPORT_SOURCES)}")
+        if data.params.get("format", "csv") not in EXPORT_MEDIA_TYPES:
+            raise HTTPException(status_code=400, detail=f"Unknown format. Allowed: {', '.join(EXPORT_MEDIA_TYPES)}")
+        export_query(data.params.get("source", "appointments"), data.params.get("date_from"), data.params.get("date_to"))
+    if data.type == "rebuild":
+        target = data.params.get("target", "all")
+        if target != "all" and target not in REBUILD_TASKS:
+            raise HTTPException(status_code=400, detail=f"Unknown target. Allowed: all, {', '.join(REBUILD_TASKS)}")
+    
+    job = await enqueue_job(data.type, data.params, user)
+    return job_public(job)
+
+@api_router.post("/jobs/import", status_code=202)
+async def create_import_job(request: Request, source: str, file: UploadFile = File(...)):
+    """Queue an import of a CSV/XLSX/Parquet file into a collection (CRM/DP only)"""
+    user = await require_role(request, ["CRM", "DP"])
+    
+    if source not in EXPORT_SOURCES:
+        raise HTTPException(status_code=400, detail=f"Unknown source. Allowed: {', '.join(EXPORT_SOURCES)}")
+    suffix = Path(file.filename or "").suffix.lower()
+    if suffix not in (".csv", ".xlsx", ".parquet"):
+        raise HTTPException(status_code=400, detail="File type not allowed. Allowed: .csv, .xlsx, .parquet")
+    
+    input_path = job_artifact_path(f"import_{uuid.uuid4().hex[:12]}", suffix)
+    await save_upload(file, input_path)
+    
+    job = await enqueue_job("import", {"source": source, "file_name": file.filename}, user, str(input_path))
+    return job_public(job)
+
+@api_router.get("/jobs")
+async def get_jobs(request: Request, status: str = None):
+    """List recent jobs (own jobs; CRM/DP see all)"""
+    user = await get_current_user(request)
+    query = {}
+    if user["role"] not in ("CRM", "DP"):
+        query["created_by"] = user["user_id"]
+    if status:
+        query["status"] = status
+    jobs = await db.jobs.find(query, {"_id": 0}).sort("created_at", -1).to_list(100)
+    return [job_public(j) for j in jobs]
+
+@api_router.get("/jobs/{job_id}")
+async def get_job(request: Request, job_id: str):
+    """Poll a job's status and progress"""
+    user = await get_current_user(request)
+    return job_public(await get_visible_job(user, job_id))
+
+@api_router.get("/jobs/{job_id}/download")
+async def download_job_result(request: Request, job_id: str):
+    """Download a finished job's artifact"""
+    user = await get_current_user(request)
+    job = await get_visible_job(user, job_id)
+    
+    if job["status"] == "expired":
+        raise HTTPException(status_code=410, detail="Job result has expired")
+    result = job.get("result") or {}
+    if job["status"] != "succeeded" or not result.get("artifact_path"):
+        raise HTTPException(status_code=409, detail="Job has no downloadable result")
+    path = Path(result["artifact_path"])
+    if not path.exists():
+        raise HTTPException(status_code=410, detail="Job result has expired")
+    
+    return FileResponse(path, media_type=result["media_type"], filename=result["file_name"])
+
+# ============== SEED DATA ==============
+
+@api_router.post("/seed")
+async def seed_data():
+    """Seed initial data for testing"""
+    # Check if admin already exists
+    existing_admin = await db.users.find_one({"username": "admin"}, {"_id": 0})
+    if existing_admin:
+        return {"message": "Data already seeded"}
+    
+    # Create default settings
+    await db.settings.delete_many({})
+    await db.settings.insert_one(DEFAULT_SETTINGS.copy())
+    
+    # Create users with username/password
+    users = [
+        {
+            "user_id": "user_admin_001",
+            "username": "admin",
+            "password_hash": hash_password("admin"),
+            "name": "Tanshu Agarwal",
+            "role": "DP",
+            "email": "tanshu@bohania.com",
+            "mobile": "9876543210",
+            "department": "Admin",
+            "designation": "Dealer Principal",
+            "branch": "Main Branch",
+            "is_active": True,
+            "is_locked": False,
+            "module_access": ["Dashboard", "Customer Relations", "Parts", "Bodyshop", "Mechanical", "Insurance", "HR", "Customers", "Settings", "Users"],
+            "created_at": datetime.now(timezone.utc).isoformat()
+        },
+        {
+            "user_id": "user_receptionist_001",
+            "username": "reception",
+            "password_hash": hash_password("reception123"),
+            "name": "Front Desk",
+            "role": "Receptionist",
+            "email": "reception@bohania.com",
+            "mobile": "9876543211",
+            "department": "Customer Relations",
+            "designation": "Receptionist",
+            "branch": "Main Branch",
+            "is_active": True,
+            "is_locked": False,
+            "module_access": ["Dashboard", "Customer Relations"],
+            "created_at": datetime.now(timezone.utc).isoformat()
+        },
+        {
+            "user_id": "user_cre_001",
+            "username": "cre1",
+            "password_hash": hash_password("cre123"),
+            "name": "CRE Alex",
+            "role": "CRE",
+            "email": "cre1@bohania.com",
+            "mobile": "9876543212",
+            "department": "Customer Relations",
+            "designation": "Customer Relationship Executive",
+            "branch": "Main Branch",
+            "is_active": True,
+            "is_locked": False,
+            "module_access": ["Dashboard", "Customer Relations"],
+            "created_at": datetime.now(timezone.utc).isoformat()
+        },
+        {
+            "user_id": "user_cre_002",
+            "username": "cre2",
+            "password_hash": hash_password("cre123"),
+            "name": "CRE Jordan",
+            "role": "CRE",
+            "email": "cre2@bohania.com",
+            "mobile": "9876543213",
+            "department": "Customer Relations",
+            "designation": "Customer Relationship Executive",
+            "branch": "North Branch",
+            "is_active": True,
+            "is_locked": False,
+            "module_access": ["Dashboard", "Customer Relations"],
+            "created_at": datetime.now(timezone.utc).isoformat()
+        }
+    ]
+    
+    await db.users.delete_many({})
+    await db.users.insert_many(users)
+    await bump_reference_data()
+    
+    # Create sample appointments
+    today = datetime.now(timezone.utc).strftime("%Y-%m-%d")
+    tomorrow = (datetime.now(timezone.utc) + timedelta(days=1)).strftime("%Y-%m-%d")
+    
+    await db.appointments.delete_many({})
+    
+    appointments = [
+        {
+            "appointment_id": f"appt_{uuid.uuid4().hex[:12]}",
+            "sl_no": 1,
+            "branch": "Main Branch",
+            "appointment_date": today,
+            "appointment_time": "09:00",
+            "source": "SDR",
+            "customer_name": "John Smith",
+            "customer_phone": "9876543210",
+            "customer_email": "john@example.com",
+            "vehicle_reg_no": "KA01AB1234",
+            "model": "Kwid",
+            "current_km": 25000,
+            "ots_recall": False,
+            "service_type": "PMS",
+            "allocated_sa": "SA - John",
+            "specific_repair_request": "AC not cooling properly",
+            "priority_customer": True,
+            "docket_readiness": True,
+            "n_minus_1_confirmation_status": "Confirmed",
+            "n_minus_1_confirmation_notes": "Customer confirmed via call",
             "appointment_status": "Confirmed",
             "appointment_day_outcome": None,
             "appointment_day_outcome_notes": None,
@@ -1437,7 +2870,10 @@ async def seed_data():
         }
     ]
     
+    for appt in appointments:
+        appt.update(appointment_search_keys(appt))
     await db.appointments.insert_many(appointments)
+    await db.customers.bulk_write([op for op in map(customer_upsert, appointments) if op])
     
     # Create N-1 task for tomorrow's appointment
     await db.tasks.delete_many({})
@@ -1492,7 +2928,12 @@ async def seed_demo_appointments():
     end_date = "2026-05-30"
 
     # Delete only today and future appointments
+    deleted = await db.appointments.find(
+        {"appointment_date": {"$gte": today}},
+        {"_id": 0, "appointment_id": 1, "booking_id": 1}
+    ).to_list(None)
     await db.appointments.delete_many({"appointment_date": {"$gte": today}})
+    await record_tombstones("appointments", deleted)
 
     customers = [
         ("Aarav Mehta", "9012345601", "aarav.m@gmail.com"),
@@ -1587,6 +3028,7 @@ async def seed_demo_appointments():
                 "created_at": datetime.now(timezone.utc).isoformat(),
                 "updated_at": datetime.now(timezone.utc).isoformat(),
             }
+            appt.update(appointment_search_keys(appt))
             appointments.append(appt)
 
         day_idx += 1
@@ -1595,75 +3037,182 @@ async def seed_demo_appointments():
     # Bulk insert
     if appointments:
         await db.appointments.insert_many(appointments)
+        await db.customers.bulk_write([op for op in map(customer_upsert, appointments) if op])
 
     return {"message": f"Seeded {len(appointments)} appointments from {today} to {end_date} (4 per day)"}
 
 # ============== AUTO NO-SHOW CRON ==============
 
+NO_SHOW_SWEEP_CHUNK = 5000
+
 async def mark_no_show_for_date(target_date: str):
-    """Mark all unreported appointments for a given date as No-show."""
-    # Find appointments that haven't been marked with a final day outcome
+    """Mark all unreported appointments for a given date as No-show.
+    
+    Runs in chunks: capture the ids, flip them with one update_many, then
+    write activity logs with one insert_many for the rows that update
+    actually changed.
+    """
+    started = time.perf_counter()
+    # Appointments that haven't been marked with a final day outcome
     query = {
         "appointment_date": target_date,
-        "appointment_status": {"$nin": ["Rescheduled", "Cancelled", "No-show", "No Show"]},
+        "appointment_status": {"$nin": ["Rescheduled", "Cancelled", "No-show", "No Show", "Reported"]},
         "$or": [
             {"appointment_day_outcome": None},
             {"appointment_day_outcome": {"$exists": False}},
             {"appointment_day_outcome": ""},
         ]
     }
-    # Also skip appointments already reported
-    cursor = db.appointments.find(query, {"_id": 0, "appointment_id": 1, "appointment_status": 1})
-    appointments = await cursor.to_list(1000)
     
     count = 0
-    for appt in appointments:
-        if appt.get("appointment_status") == "Reported":
-            continue
-        await db.appointments.update_one(
-            {"appointment_id": appt["appointment_id"]},
+    while True:
+        ids = [
+            doc["appointment_id"]
+            for doc in await db.appointments.find(
+                query, {"_id": 0, "appointment_id": 1}
+            ).limit(NO_SHOW_SWEEP_CHUNK).to_list(NO_SHOW_SWEEP_CHUNK)
+        ]
+        if not ids:
+            break
+        # Re-apply the filter so anything reported meanwhile is left alone;
+        # updated appointments drop out of the query, so the loop terminates
+        stamp = datetime.now(timezone.utc).isoformat()
+        result = await db.appointments.update_many(
+            {**query, "appointment_id": {"$in": ids}},
             {"$set": {
                 "appointment_status": "No-show",
                 "appointment_day_outcome": "No-show",
-                "updated_at": datetime.now(timezone.utc).isoformat()
+                "updated_at": stamp
             }}
         )
-        await log_activity(
-            appt["appointment_id"],
-            "system",
-            "System",
-            "Auto-marked as No-show (post 7 PM)"
-        )
-        count += 1
-    
+        if result.modified_count:
+            # Rows reported between the find and the update were skipped; log only the ones marked
+            marked = await db.appointments.find(
+                {"appointment_id": {"$in": ids}, "appointment_day_outcome": "No-show", "updated_at": stamp},
+                {"_id": 0, "appointment_id": 1}
+            ).to_list(len(ids))
+            if marked:
+                await db.activity_logs.insert_many([
+                    build_activity_log(doc["appointment_id"], "system", "System", "Auto-marked as No-show (post 7 PM)")
+                    for doc in marked
+                ], ordered=False)
+        count += result.modified_count
+    
+    elapsed_ms = (time.perf_counter() - started) * 1000
+    logger.info(f"No-show sweep for {target_date}: marked {count} appointments in {elapsed_ms:.0f} ms")
     return count
 
-async def no_show_cron_loop():
-    """Background task: every minute check if it's past 7 PM IST, and mark no-shows for today."""
-    marked_dates = set()
-    while True:
+@scheduled_job("no_show_sweep", "0 19 * * *", catch_up=7)
+async def scheduled_no_show_sweep(scheduled_for: datetime):
+    """Daily at 7 PM IST: mark that day's unreported appointments as No-show"""
+    target_date = scheduled_for.astimezone(IST).strftime("%Y-%m-%d")
+    count = await mark_no_show_for_date(target_date)
+    return {"date": target_date, "marked": count}
+
+# Vehicle keys whose unique index is in place. Until a key's index exists
+# (e.g. legacy duplicates block it), vehicle writes look that key up first.
+vehicle_unique_keys = set()
+
+@app.on_event("startup")
+async def ensure_indexes():
+    """Create the indexes the query paths rely on (idempotent)"""
+    await db.appointments.create_index([("appointment_date", 1), ("appointment_time", 1)])
+    await db.appointments.create_index([("updated_at", 1), ("_id", 1)])
+    await db.reception_entries.create_index([("updated_at", 1), ("_id", 1)])
+    await db.reception_entries.create_index([("branch", 1), ("entry_time", 1)])
+    await db.customers.create_index("phone_key", unique=True)
+    await db.vehicles.create_index([("created_at", -1), ("vehicle_id", -1)])
+    await db.vehicles.create_index([("brand", 1), ("created_at", -1), ("vehicle_id", -1)])
+    await db.vehicles.create_index([("brand", 1), ("search_tokens", 1)])
+    await db.vehicles.create_index([("brand", 1), ("is_model_valid", 1), ("created_at", -1), ("vehicle_id", -1)])
+    await db.vehicles.create_index([("brand", 1), ("vin_rev", 1)])
+    await db.vehicles.create_index([("brand", 1), ("reg_key", 1)])
+    await db.customers.create_index("vehicle_regs")
+    await db.reception_entries.create_index([("branch", 1), ("vehicle_reception_time", -1), ("entry_id", -1)])
+    await db.reception_entries.create_index([("vehicle_reception_time", -1), ("entry_id", -1)])
+    await db.vehicles.create_index([("updated_at", 1), ("_id", 1)])
+    await db.vehicle_documents.create_index([("vehicle_id", 1), ("uploaded_at", -1)])
+    await db.vehicle_documents.create_index("blob_id")
+    await db.deleted_records.create_index([("deleted_at", 1), ("_id", 1)])
+    await db.jobs.create_index("job_id", unique=True)
+    await db.jobs.create_index([("status", 1), ("run_after", 1)])
+    await db.jobs.create_index([("status", 1), ("lease_expires_at", 1)])
+    await db.scheduled_jobs.create_index("name", unique=True)
+    await db.appointments.create_index([("appointment_date", 1), ("n_minus_1_confirmation_status", 1)])
+    await db.appointments.create_index("appointment_id")
+    await db.tasks.create_index([("assigned_to", 1), ("status", 1)])
+    for collection in ("appointments", "reception_entries", "vehicles"):
+        for key in ("reg_key", "phone_key", "vin_rev"):
+            await db[collection].create_index(key)
+    await ensure_vehicle_unique_indexes()
+    try:
+        await db.tasks.create_index([("appointment_id", 1), ("task_type", 1)], unique=True)
+    except Exception as e:
+        # Pre-existing duplicate tasks block the unique index; upserts still dedupe
+        logger.error(f"Could not create unique tasks index: {e}")
+
+async def ensure_vehicle_unique_indexes():
+    """Build the unique vehicle identity indexes whose keys are fully backfilled.
+
+    Descending key patterns keep these apart from the plain search indexes;
+    the partial filter leaves blank keys out. A key some vehicle still lacks
+    is left to backfill_search_keys, which calls this again when done: built
+    earlier, the index would claim an enforcement the legacy rows escape.
+    """
+    for key in ("vehicle_id", "reg_key", "vin_rev"):
+        if key in vehicle_unique_keys:
+            continue
+        if key != "vehicle_id" and await db.vehicles.find_one({key: {"$exists": False}}, {"_id": 1}):
+            logger.info(f"Unique vehicles.{key} index waits for the search key backfill")
+            continue
         try:
-            # IST = UTC+5:30
-            now_utc = datetime.now(timezone.utc)
-            ist_offset = timedelta(hours=5, minutes=30)
-            now_ist = now_utc + ist_offset
-            today_str = now_ist.strftime("%Y-%m-%d")
-            
-            if now_ist.hour >= 19 and today_str not in marked_dates:
-                count = await mark_no_show_for_date(today_str)
-                marked_dates.add(today_str)
-                if count > 0:
-                    logger.info(f"Auto No-show cron: marked {count} appointments for {today_str}")
-                # Clean up old dates from memory
-                marked_dates.discard((now_ist - timedelta(days=2)).strftime("%Y-%m-%d"))
+            await db.vehicles.create_index(
+                [(key, -1)], name=f"{key}_unique", unique=True, partialFilterExpression={key: {"$gt": ""}}
+            )
+            vehicle_unique_keys.add(key)
         except Exception as e:
-            logger.error(f"No-show cron error: {e}")
-        
-        await asyncio.sleep(60)
+            # Pre-existing duplicates block the index until they are merged;
+            # meanwhile writers fall back to looking the key up
+            dupes = await db.vehicles.aggregate([
+                {"$match": {key: {"$gt": ""}}},
+                {"$group": {"_id": f"${key}", "n": {"$sum": 1}}},
+                {"$match": {"n": {"$gt": 1}}},
+                {"$limit": 20},
+            ]).to_list(20)
+            logger.error(
+                f"Could not create unique vehicles.{key} index, duplicates are pre-checked instead: {e}; "
+                f"duplicated values include {[d['_id'] for d in dupes]}"
+            )
 
-@app.on_event("startup")
-async def start_no_show_cron():
-    asyncio.create_task(no_show_cron_loop())
+N_MINUS_1_TASK_BATCH = 1000
+
+async def generate_n_minus_1_tasks(target_date: str) -> int:
+    """Upsert N-1 reminder tasks for every pending-confirmation appointment on a date"""
+    cursor = db.appointments.find(
+        {
+            "appointment_date": target_date,
+            "n_minus_1_confirmation_status": "Pending",
+            "appointment_status": {"$nin": ["Rescheduled", "Cancelled"]},
+        },
+        {"_id": 0, "appointment_id": 1, "assigned_cre_user": 1}
+    ).batch_size(N_MINUS_1_TASK_BATCH)
+    created = 0
+    ops = []
+    async for appt in cursor:
+        ops.append(n_minus_1_task_upsert(appt))
+        if len(ops) >= N_MINUS_1_TASK_BATCH:
+            created += (await db.tasks.bulk_write(ops, ordered=False)).upserted_count
+            ops = []
+    if ops:
+        created += (await db.tasks.bulk_write(ops, ordered=False)).upserted_count
+    return created
+
+@scheduled_job("n_minus_1_tasks", "5 0 * * *", catch_up=1)
+async def scheduled_n_minus_1_tasks(scheduled_for: datetime):
+    """Nightly: create missing N-1 reminder tasks for the next day's appointments"""
+    target_date = (scheduled_for.astimezone(IST) + timedelta(days=1)).strftime("%Y-%m-%d")
+    created = await generate_n_minus_1_tasks(target_date)
+    return {"date": target_date, "created": created}
 
 # Also expose a manual trigger endpoint for testing
 @api_router.post("/appointments/mark-no-show")
@@ -1723,86 +3272,282 @@ class ReceptionEntryUpdate(BaseModel):
     rc_not_collected: Optional[bool] = None
     rc_not_collected_reason: Optional[str] = None
 
+SEARCH_KEY_BATCH = 1000
+
+SEARCH_KEY_CONFLICT_LIMIT = 100
+
+async def write_search_keys(collection: str, rows: List[tuple], conflicts: List[str]) -> int:
+    """Write (_id, keys) rows; a vehicle that clashes on a unique reg / VIN key
+    is written with that key blanked (outside the partial index) and reported"""
+    ops = [UpdateOne({"_id": _id}, {"$set": keys}) for _id, keys in rows]
+    try:
+        return (await db[collection].bulk_write(ops, ordered=False)).modified_count
+    except BulkWriteError as e:
+        if any(err.get("code") != 11000 for err in e.details.get("writeErrors", [])):
+            raise
+        retry = []
+        for err in e.details["writeErrors"]:
+            _id, keys = rows[err["index"]]
+            conflicts.append(str(_id))
+            clashes = [
+                k for k in ("reg_key", "vin_rev")
+                if keys.get(k) and await db[collection].find_one({k: keys[k], "_id": {"$ne": _id}}, {"_id": 1})
+            ]
+            retry.append(UpdateOne({"_id": _id}, {"$set": {**keys, **{k: "" for k in clashes}}}))
+        modified = e.details.get("nModified", 0)
+        return modified + (await db[collection].bulk_write(retry, ordered=False)).modified_count
+
+@rebuild_task("search_keys")
+async def backfill_search_keys():
+    """Recompute reg_key / phone_key / vin_rev on appointments, reception entries and vehicles.
+
+    Legacy documents without updated_at are stamped now, so the change feed
+    and the search index pick them up.
+
+    Vehicles that duplicate another's reg / VIN key get that key blanked and
+    are listed under "conflicts"; the unique vehicle indexes are built once
+    every vehicle has its keys.
+    """
+    counts = {}
+    conflicts = []
+    for collection, keys_for in (
+        ("appointments", appointment_search_keys),
+        ("reception_entries", reception_search_keys),
+        ("vehicles", vehicle_search_keys),
+    ):
+        await db[collection].update_many(
+            {"updated_at": None}, {"$set": {"updated_at": datetime.now(timezone.utc).isoformat()}}
+        )
+        ops = []
+        counts[collection] = 0
+        cursor = db[collection].find(
+            {}, {
+                "vehicle_reg_no": 1, "vehicle_reg": 1, "customer_phone": 1, "contact_no": 1, "vin": 1,
+                "engine_no": 1, "customer_name": 1, "first_name": 1, "last_name": 1, "company_name": 1, "make": 1,
+            }
+        ).batch_size(SEARCH_KEY_BATCH)
+        async for doc in cursor:
+            ops.append((doc["_id"], keys_for(doc)))
+            if len(ops) >= SEARCH_KEY_BATCH:
+                counts[collection] += await write_search_keys(collection, ops, conflicts)
+                ops = []
+        if ops:
+            counts[collection] += await write_search_keys(collection, ops, conflicts)
+    if conflicts:
+        logger.error(f"Search key backfill: {len(conflicts)} vehicles duplicate another's reg / VIN key")
+        counts["conflicts"] = conflicts[:SEARCH_KEY_CONFLICT_LIMIT]
+    await ensure_vehicle_unique_indexes()
+    return counts
+
+@app.on_event("startup")
+async def queue_search_key_backfill():
+    """Queue the search key backfill once if any document predates the keys (or updated_at)"""
+    missing = (
+        await db.appointments.find_one({"reg_key": {"$exists": False}}, {"_id": 1})
+        or await db.reception_entries.find_one({"reg_key": {"$exists": False}}, {"_id": 1})
+        or await db.vehicles.find_one({"search_tokens": {"$exists": False}}, {"_id": 1})
+        or await db.appointments.find_one({"updated_at": None}, {"_id": 1})
+        or await db.reception_entries.find_one({"updated_at": None}, {"_id": 1})
+        or await db.vehicles.find_one({"updated_at": None}, {"_id": 1})
+    )
+    pending = await db.jobs.find_one({
+        "type": "rebuild", "params.target": "search_keys", "status": {"$in": ["queued", "running"]}
+    }, {"_id": 1})
+    if missing and not pending:
+        await enqueue_job("rebuild", {"target": "search_keys"}, {"user_id": "system", "name": "System"})
+
+VEHICLE_SEARCH_LIMIT = 20
+VEHICLE_SEARCH_CACHE_SIZE = 256
+VEHICLE_SEARCH_CACHE_TTL_SECONDS = 30
+
+# Recent complete search results, keyed by normalized query:
+# key -> (stored_at, appointment docs, vehicle docs). Only results that were
+# not cut off by the limit are stored, so a narrower query ("WB74" -> "WB74U")
+# can be answered by filtering them.
+vehicle_search_cache = OrderedDict()
+
+def cached_vehicle_search(reg: str):
+    """(key, entry) for the longest fresh cached prefix of reg, or None"""
+    now = time.monotonic()
+    for n in range(len(reg), 1, -1):
+        entry = vehicle_search_cache.get(reg[:n])
+        if entry and now - entry[0] < VEHICLE_SEARCH_CACHE_TTL_SECONDS:
+            vehicle_search_cache.move_to_end(reg[:n])
+            return reg[:n], entry
+    return None
+
+def cache_vehicle_search(reg: str, appt_docs: List[dict], veh_docs: List[dict]):
+    if len(appt_docs) >= VEHICLE_SEARCH_LIMIT or len(veh_docs) >= VEHICLE_SEARCH_LIMIT:
+        return
+    vehicle_search_cache[reg] = (time.monotonic(), appt_docs, veh_docs)
+    vehicle_search_cache.move_to_end(reg)
+    while len(vehicle_search_cache) > VEHICLE_SEARCH_CACHE_SIZE:
+        vehicle_search_cache.popitem(last=False)
+
+async def query_vehicle_sources(clauses: List[dict]) -> tuple:
+    """Run the appointments and vehicles lookups concurrently"""
+    return await asyncio.gather(
+        db.appointments.find({"$or": clauses}, {"_id": 0})
+            .sort("appointment_date", -1).limit(VEHICLE_SEARCH_LIMIT).to_list(VEHICLE_SEARCH_LIMIT),
+        db.vehicles.find({"$or": clauses}, {"_id": 0})
+            .limit(VEHICLE_SEARCH_LIMIT).to_list(VEHICLE_SEARCH_LIMIT),
+    )
+
 @api_router.get("/reception/search-vehicle")
 async def search_vehicle(request: Request, q: str = ""):
     """Search vehicles by Reg No, Phone, or VIN across appointments and reception entries"""
     await get_current_user(request)
     if not q or len(q) < 2:
         return []
-    q_upper = q.upper().replace(" ", "")
-    q_regex = {"$regex": q, "$options": "i"}
-    q_regex_nospace = {"$regex": q_upper, "$options": "i"}
+    clauses = search_key_query(q)
+    if not clauses:
+        return []
+    reg = normalize_reg(q)
 
-    # Search in appointments
-    appt_results = []
-    appt_cursor = db.appointments.find(
-        {"$or": [
-            {"vehicle_reg_no": q_regex_nospace},
-            {"customer_phone": q_regex},
-            {"vin": q_regex_nospace},
-        ]},
-        {"_id": 0}
-    ).sort("appointment_date", -1).limit(20)
-    async for doc in appt_cursor:
-        appt_results.append({
+    cached = cached_vehicle_search(reg)
+    if cached and cached[0] == reg:
+        _, appt_docs, veh_docs = cached[1]
+    elif cached:
+        # Narrowed query: reg/phone prefix matches are a subset of the cached
+        # ones; VIN suffix matches are not, so only that clause goes to Mongo
+        _, cached_appts, cached_vehs = cached[1]
+        vin_appts, vin_vehs = await query_vehicle_sources([c for c in clauses if "vin_rev" in c])
+        appt_docs = [d for d in cached_appts if search_key_prefix_match(d, reg)]
+        seen_appts = {d.get("appointment_id") for d in appt_docs}
+        appt_docs += [d for d in vin_appts if d.get("appointment_id") not in seen_appts]
+        appt_docs.sort(key=lambda d: d.get("appointment_date") or "", reverse=True)
+        veh_docs = [d for d in cached_vehs if search_key_prefix_match(d, reg)]
+        seen_vehs = {d.get("reg_key") for d in veh_docs}
+        veh_docs += [d for d in vin_vehs if d.get("reg_key") not in seen_vehs]
+        cache_vehicle_search(reg, appt_docs, veh_docs)
+    else:
+        appt_docs, veh_docs = await query_vehicle_sources(clauses)
+        cache_vehicle_search(reg, appt_docs, veh_docs)
+
+    appt_results = [
+        {
             "source": "appointment",
-            "vehicle_reg_no": doc.get("vehicle_reg_no", ""),
+            "vehicle_reg_no": doc.get("vehicle_reg_no") or doc.get("vehicle_reg", ""),
             "vin": doc.get("vin", ""),
             "engine_no": doc.get("engine_no", ""),
-            "model": doc.get("vehicle_model", ""),
+            "model": doc.get("vehicle_model") or doc.get("model", ""),
             "customer_name": doc.get("customer_name", ""),
             "customer_phone": doc.get("customer_phone", ""),
             "customer_email": doc.get("customer_email", ""),
             "appointment_id": doc.get("appointment_id", ""),
-        })
-
-    # Search in vehicles collection
-    veh_cursor = db.vehicles.find(
-        {"$or": [
-            {"vehicle_reg_no": q_regex_nospace},
-            {"vin": q_regex_nospace},
-            {"contact_no": q_regex},
-        ]},
-        {"_id": 0}
-    ).limit(20)
-    veh_results = []
-    async for doc in veh_cursor:
-        veh_results.append({
+        }
+        for doc in appt_docs[:VEHICLE_SEARCH_LIMIT]
+    ]
+    veh_results = [
+        {
             "source": "vehicle_db",
             "vehicle_reg_no": doc.get("vehicle_reg_no", ""),
             "vin": doc.get("vin", ""),
             "engine_no": doc.get("engine_no", ""),
             "model": doc.get("model", ""),
-            "customer_name": f'{doc.get("first_name", "")} {doc.get("last_name", "")}'.strip() or doc.get("company_name", ""),
-            "customer_phone": doc.get("contact_no", ""),
+            "customer_name": f'{doc.get("first_name", "")} {doc.get("last_name", "")}'.strip() or doc.get("company_name", "") or doc.get("customer_name", ""),
+            "customer_phone": doc.get("contact_no") or doc.get("customer_phone", ""),
             "customer_email": doc.get("email", ""),
-        })
+        }
+        for doc in veh_docs[:VEHICLE_SEARCH_LIMIT]
+    ]
 
-    # Deduplicate by reg_no
+    # Merge by normalized (reg, VIN)
     seen = set()
     combined = []
     for r in appt_results + veh_results:
-        key = (r.get("vehicle_reg_no", "").upper().replace(" ", ""), r.get("vin", "").upper().replace(" ", ""))
+        key = (normalize_reg(r.get("vehicle_reg_no")), normalize_reg(r.get("vin")))
         if key not in seen:
             seen.add(key)
             combined.append(r)
     return combined
 
+DUPLICATE_CHECK_MAX_ITEMS = 1000
+
+class DuplicateCheckItem(BaseModel):
+    reg_no: str = ""
+    vin: str = ""
+
+class DuplicateCheckRequest(BaseModel):
+    items: List[DuplicateCheckItem]
+
+async def find_existing_vehicle_keys(regs: List[str], vins: List[str]) -> tuple:
+    """(existing reg keys, existing VIN keys) across vehicles and appointments, in two concurrent queries"""
+    vin_revs = [v[::-1] for v in vins]
+    vehicle_clauses = []
+    if regs:
+        vehicle_clauses.append({"reg_key": {"$in": regs}})
+    if vin_revs:
+        vehicle_clauses.append({"vin_rev": {"$in": vin_revs}})
+    if not vehicle_clauses:
+        return set(), set()
+
+    async def no_matches():
+        return []
+
+    vehicles, appointments = await asyncio.gather(
+        db.vehicles.find({"$or": vehicle_clauses}, {"_id": 0, "reg_key": 1, "vin_rev": 1}).to_list(None),
+        db.appointments.find({"reg_key": {"$in": regs}}, {"_id": 0, "reg_key": 1}).to_list(None) if regs else no_matches(),
+    )
+    existing_regs = {d.get("reg_key") for d in vehicles} | {d.get("reg_key") for d in appointments}
+    existing_vins = {(d.get("vin_rev") or "")[::-1] for d in vehicles}
+    return existing_regs, existing_vins
+
 @api_router.get("/reception/check-duplicate")
 async def check_vehicle_duplicate(request: Request, reg_no: str = "", vin: str = ""):
     """Check if vehicle reg no or VIN already exists"""
     await get_current_user(request)
-    reg_clean = reg_no.upper().replace(" ", "")
-    vin_clean = vin.upper().replace(" ", "")
-    dup_reg = False
-    dup_vin = False
-    if reg_clean:
-        dup_reg = await db.vehicles.find_one({"vehicle_reg_no": reg_clean}) is not None
-        if not dup_reg:
-            dup_reg = await db.appointments.find_one({"vehicle_reg_no": reg_clean}) is not None
-    if vin_clean:
-        dup_vin = await db.vehicles.find_one({"vin": vin_clean}) is not None
-    return {"duplicate_reg": dup_reg, "duplicate_vin": dup_vin}
+    reg_clean = normalize_reg(reg_no)
+    vin_clean = normalize_reg(vin)
+    existing_regs, existing_vins = await find_existing_vehicle_keys(
+        [reg_clean] if reg_clean else [], [vin_clean] if vin_clean else []
+    )
+    return {"duplicate_reg": reg_clean in existing_regs, "duplicate_vin": vin_clean in existing_vins}
+
+@api_router.post("/reception/check-duplicates")
+async def check_vehicle_duplicates(request: Request, data: DuplicateCheckRequest):
+    """Check many reg no / VIN pairs at once (bulk onboarding, imports)"""
+    await get_current_user(request)
+    if len(data.items) > DUPLICATE_CHECK_MAX_ITEMS:
+        raise HTTPException(status_code=400, detail=f"At most {DUPLICATE_CHECK_MAX_ITEMS} items per request")
+
+    pairs = [(normalize_reg(item.reg_no), normalize_reg(item.vin)) for item in data.items]
+    regs = sorted({reg for reg, _ in pairs if reg})
+    vins = sorted({vin for _, vin in pairs if vin})
+    existing_regs, existing_vins = await find_existing_vehicle_keys(regs, vins)
+
+    reg_counts = {}
+    vin_counts = {}
+    for reg, vin in pairs:
+        if reg:
+            reg_counts[reg] = reg_counts.get(reg, 0) + 1
+        if vin:
+            vin_counts[vin] = vin_counts.get(vin, 0) + 1
+
+    results = []
+    for item, (reg, vin) in zip(data.items, pairs):
+        results.append({
+            "reg_no": item.reg_no,
+            "vin": item.vin,
+            "duplicate_reg": bool(reg) and reg in existing_regs,
+            "duplicate_vin": bool(vin) and vin in existing_vins,
+            "duplicate_in_batch": (bool(reg) and reg_counts[reg] > 1) or (bool(vin) and vin_counts[vin] > 1),
+        })
+    return {"results": results}
+
+async def attach_to_vin_owner(vehicle_doc: dict) -> dict:
+    """The VIN is already on another registration: check the walk-in in
+    against that vehicle (refreshing its contact details) rather than turning it away"""
+    contact = {k: v for k, v in vehicle_doc.items() if k not in ("vehicle_reg_no", "reg_key", "vin", "vin_rev")}
+    owner = await db.vehicles.find_one_and_update(
+        {"vin_rev": vehicle_doc["vin_rev"]},
+        {"$set": contact},
+        projection={"_id": 0},
+        return_document=ReturnDocument.AFTER,
+    )
+    if not owner:
+        raise HTTPException(status_code=409, detail="Vehicle changed during check-in, please retry")
+    return owner
 
 @api_router.post("/reception", status_code=201)
 async def create_reception_entry(request: Request, data: ReceptionEntryCreate):
@@ -1836,11 +3581,36 @@ async def create_reception_entry(request: Request, data: ReceptionEntryCreate):
         "preferred_contact_time": data.preferred_contact_time or [],
         "updated_at": now.isoformat(),
     }
-    await db.vehicles.update_one(
-        {"vehicle_reg_no": reg_clean},
-        {"$set": vehicle_doc, "$setOnInsert": {"created_at": now.isoformat()}},
-        upsert=True
+    vehicle_doc.update(vehicle_search_keys(vehicle_doc))
+    # Without a unique VIN index nothing below raises the clash: look it up
+    vin_taken = (
+        vehicle_doc["vin_rev"] and "vin_rev" not in vehicle_unique_keys
+        and await db.vehicles.find_one(
+            {"vin_rev": vehicle_doc["vin_rev"], "reg_key": {"$ne": vehicle_doc["reg_key"]}}, {"_id": 1}
+        )
     )
+    for attempt in range(2):
+        if vin_taken:
+            break
+        try:
+            vehicle_doc = await db.vehicles.find_one_and_update(
+                {"reg_key": vehicle_doc["reg_key"]},
+                {"$set": vehicle_doc, "$setOnInsert": {
+                    "vehicle_id": new_vehicle_id(), "brand": "renault", "is_model_valid": False,
+                    "created_at": now.isoformat(),
+                }},
+                projection={"_id": 0},
+                upsert=True,
+                return_document=ReturnDocument.AFTER,
+            )
+            break
+        except DuplicateKeyError as e:
+            vin_taken = "VIN" in duplicate_vehicle_detail(e.details)
+            # A concurrent upsert inserted this reg first: retry as an update
+            if attempt and not vin_taken:
+                raise HTTPException(status_code=400, detail=duplicate_vehicle_detail(e.details))
+    if vin_taken:
+        vehicle_doc = await attach_to_vin_owner(vehicle_doc)
 
     # Determine status
     contact_validated = bool(data.contact_no)
@@ -1894,40 +3664,73 @@ async def create_reception_entry(request: Request, data: ReceptionEntryCreate):
         "created_at": now.isoformat(),
         "updated_at": now.isoformat(),
     }
+    entry.update(reception_search_keys(entry))
     await db.reception_entries.insert_one(entry)
     entry.pop("_id", None)
+    index_vehicle(vehicle_doc)
+    index_reception_entry(entry)
+    vehicle_search_cache.clear()
+    vehicle_count_cache.clear()
+    await sync_customer(entry)
     return entry
 
-@api_router.get("/reception")
-async def get_reception_entries(request: Request, branch: str = None, date_filter: str = "today", source: str = None, status: str = None, date_from: str = None, date_to: str = None):
-    """Get reception entries with filters"""
-    await get_current_user(request)
-    query = {}
-    now_utc = datetime.now(timezone.utc)
-    ist_offset = timedelta(hours=5, minutes=30)
-    now_ist = now_utc + ist_offset
-    today_str = now_ist.strftime("%Y-%m-%d")
+RECEPTION_PAGE_SIZE = 500
+RECEPTION_SORT_FIELDS = ["vehicle_reception_time", "entry_id"]
+
+def ist_day_start(day: str) -> datetime:
+    """Midnight IST of a YYYY-MM-DD date, as a UTC datetime"""
+    try:
+        start = datetime.strptime(day, "%Y-%m-%d").replace(tzinfo=IST)
+    except ValueError:
+        raise HTTPException(status_code=400, detail="Dates must be YYYY-MM-DD")
+    return start.astimezone(timezone.utc)
 
+def entry_time_range(date_filter: str, date_from: str = None, date_to: str = None) -> Optional[dict]:
+    """`entry_time` predicate for an IST day window, bounded in the stored UTC ISO format"""
+    today = datetime.now(IST).date()
     if date_filter == "today":
-        query["entry_time"] = {"$gte": today_str + "T00:00:00", "$lte": today_str + "T23:59:59"}
+        start, end = today, today
     elif date_filter == "yesterday":
-        yesterday = (now_ist - timedelta(days=1)).strftime("%Y-%m-%d")
-        query["entry_time"] = {"$gte": yesterday + "T00:00:00", "$lte": yesterday + "T23:59:59"}
+        start = end = today - timedelta(days=1)
     elif date_filter == "this_week":
-        week_start = (now_ist - timedelta(days=now_ist.weekday())).strftime("%Y-%m-%d")
-        query["entry_time"] = {"$gte": week_start + "T00:00:00"}
+        start, end = today - timedelta(days=today.weekday()), None
     elif date_filter == "custom" and date_from and date_to:
-        query["entry_time"] = {"$gte": date_from + "T00:00:00", "$lte": date_to + "T23:59:59"}
+        start, end = date_from, date_to
+    else:
+        return None
+    bounds = {"$gte": ist_day_start(str(start)).isoformat()}
+    if end is not None:
+        bounds["$lt"] = (ist_day_start(str(end)) + timedelta(days=1)).isoformat()
+    return bounds
+
+@api_router.get("/reception")
+async def get_reception_entries(request: Request, response: Response, branch: str = None, date_filter: str = "today", source: str = None, status: str = None, date_from: str = None, date_to: str = None, cursor: str = None, limit: int = RECEPTION_PAGE_SIZE):
+    """Get reception entries with filters, latest reception time first.
 
+    Pages by keyset; when more remain, the X-Next-Cursor header carries the
+    cursor for the next page.
+    """
+    await get_current_user(request)
+    limit = max(1, min(limit, 500))
+    query = {}
+    time_range = entry_time_range(date_filter, date_from, date_to)
+    if time_range:
+        query["entry_time"] = time_range
     if branch:
         query["branch"] = branch
     if source:
         query["source"] = source
     if status:
         query["status"] = status
+    if cursor:
+        query.update(keyset_filter(RECEPTION_SORT_FIELDS, decode_cursor(cursor), direction=-1))
 
-    cursor = db.reception_entries.find(query, {"_id": 0}).sort("vehicle_reception_time", -1)
-    entries = await cursor.to_list(500)
+    entries = await db.reception_entries.find(query, {"_id": 0}).sort(
+        [(f, -1) for f in RECEPTION_SORT_FIELDS]
+    ).to_list(limit + 1)
+    if len(entries) > limit:
+        entries = entries[:limit]
+        response.headers["X-Next-Cursor"] = encode_cursor([entries[-1].get(f) for f in RECEPTION_SORT_FIELDS])
     return entries
 
 @api_router.get("/reception/{entry_id}")
@@ -1948,6 +3751,8 @@ async def update_reception_entry(request: Request, entry_id: str, data: Receptio
         raise HTTPException(status_code=404, detail="Entry not found")
     update_dict = {k: v for k, v in data.model_dump(exclude_unset=True).items() if v is not None}
     update_dict["updated_at"] = datetime.now(timezone.utc).isoformat()
+    if "contact_no" in update_dict:
+        update_dict.update(reception_search_keys({**entry, **update_dict}))
     await db.reception_entries.update_one({"entry_id": entry_id}, {"$set": update_dict})
     updated = await db.reception_entries.find_one({"entry_id": entry_id}, {"_id": 0})
     return updated
@@ -1960,6 +3765,7 @@ async def delete_reception_entry(request: Request, entry_id: str):
     if not entry:
         raise HTTPException(status_code=404, detail="Entry not found")
     await db.reception_entries.delete_one({"entry_id": entry_id})
+    await record_tombstones("reception_entries", [entry])
     return {"message": "Entry deleted"}
 
 @api_router.get("/reception/vehicle/{reg_no}")
@@ -1974,6 +3780,53 @@ async def get_vehicle_details(request: Request, reg_no: str):
 
 # ============== VEHICLES MODULE ==============
 
+ULID_ALPHABET = "0123456789ABCDEFGHJKMNPQRSTVWXYZ"
+
+def new_vehicle_id() -> str:
+    """VEH- + ULID (48-bit ms timestamp, 80 random bits): unique and sorted by creation time"""
+    value = (int(time.time() * 1000) << 80) | secrets.randbits(80)
+    chars = []
+    for _ in range(26):
+        chars.append(ULID_ALPHABET[value & 31])
+        value >>= 5
+    return "VEH-" + "".join(reversed(chars))
+
+def duplicate_vehicle_detail(details: Optional[dict]) -> str:
+    """Message for a duplicate-key error on the unique vehicle reg / VIN indexes"""
+    details = details or {}
+    if "vin_rev" in (details.get("keyPattern") or {}) or "vin_rev" in details.get("errmsg", ""):
+        return "Vehicle with this VIN already exists"
+    return "Vehicle with this registration number already exists"
+
+async def unindexed_vehicle_duplicates(docs: List[dict], exclude_id: str = None) -> tuple:
+    """(reg keys, reversed VIN keys) among docs that already exist in vehicles.
+
+    Only checks keys whose unique index is missing; indexed keys are left to
+    the DuplicateKeyError from the write itself.
+    """
+    clauses = []
+    for key in ("reg_key", "vin_rev"):
+        values = [d[key] for d in docs if d.get(key)]
+        if key not in vehicle_unique_keys and values:
+            clauses.append({key: {"$in": values}})
+    if not clauses:
+        return set(), set()
+    query = {"$or": clauses}
+    if exclude_id:
+        query["vehicle_id"] = {"$ne": exclude_id}
+    existing = await db.vehicles.find(query, {"_id": 0, "reg_key": 1, "vin_rev": 1}).to_list(None)
+    regs = {d.get("reg_key") for d in existing} if "reg_key" not in vehicle_unique_keys else set()
+    vins = {d.get("vin_rev") for d in existing} if "vin_rev" not in vehicle_unique_keys else set()
+    return regs, vins
+
+async def ensure_vehicle_keys_free(doc: dict, exclude_id: str = None):
+    """400 if doc's reg / VIN is taken and no unique index would catch it"""
+    regs, vins = await unindexed_vehicle_duplicates([doc], exclude_id)
+    if doc.get("reg_key") in regs:
+        raise HTTPException(status_code=400, detail="Vehicle with this registration number already exists")
+    if doc.get("vin_rev") in vins:
+        raise HTTPException(status_code=400, detail="Vehicle with this VIN already exists")
+
 class VehicleCreate(BaseModel):
     vehicle_reg_no: str
     vin: Optional[str] = None
@@ -1994,52 +3847,186 @@ class VehicleUpdate(BaseModel):
     customer_name: Optional[str] = None
     customer_phone: Optional[str] = None
 
+VEHICLE_PAGE_SIZE = 100
+VEHICLE_SORT_FIELDS = ["created_at", "vehicle_id"]
+VEHICLE_SEARCH_SORT_FIELDS = ["score", "created_at", "vehicle_id"]
+VEHICLE_COUNT_CACHE_SIZE = 64
+VEHICLE_COUNT_CACHE_TTL_SECONDS = 30
+
+# Filtered list totals: query key -> (stored_at, count)
+vehicle_count_cache = OrderedDict()
+
+async def vehicle_total(query: dict) -> int:
+    """Total for the list header: estimated when unfiltered, else a briefly cached count"""
+    if not query:
+        return await db.vehicles.estimated_document_count()
+    key = json.dumps(query, sort_keys=True, default=str)
+    entry = vehicle_count_cache.get(key)
+    if entry and time.monotonic() - entry[0] < VEHICLE_COUNT_CACHE_TTL_SECONDS:
+        vehicle_count_cache.move_to_end(key)
+        return entry[1]
+    count = await db.vehicles.count_documents(query)
+    vehicle_count_cache[key] = (time.monotonic(), count)
+    while len(vehicle_count_cache) > VEHICLE_COUNT_CACHE_SIZE:
+        vehicle_count_cache.popitem(last=False)
+    return count
+
+@rebuild_task("vehicle_brands")
+async def backfill_vehicle_brands():
+    """Vehicles saved before brands existed are Renault"""
+    result = await db.vehicles.update_many(
+        {"brand": {"$exists": False}},
+        {"$set": {"brand": "renault", "updated_at": datetime.now(timezone.utc).isoformat()}},
+    )
+    return {"vehicles": result.modified_count}
+
+@app.on_event("startup")
+async def ensure_vehicle_brands():
+    await backfill_vehicle_brands()
+
+@rebuild_task("vehicle_ids")
+async def backfill_vehicle_ids():
+    """Give vehicles created by the old reception upsert a vehicle_id"""
+    ops = []
+    updated = 0
+    now = datetime.now(timezone.utc).isoformat()
+    async for doc in db.vehicles.find({"vehicle_id": {"$in": [None, ""]}}, {"_id": 1}).batch_size(SEARCH_KEY_BATCH):
+        ops.append(UpdateOne({"_id": doc["_id"]}, {"$set": {"vehicle_id": new_vehicle_id(), "updated_at": now}}))
+        if len(ops) >= SEARCH_KEY_BATCH:
+            updated += (await db.vehicles.bulk_write(ops, ordered=False)).modified_count
+            ops = []
+    if ops:
+        updated += (await db.vehicles.bulk_write(ops, ordered=False)).modified_count
+    return {"vehicles": updated}
+
+@app.on_event("startup")
+async def ensure_vehicle_ids():
+    if await db.vehicles.find_one({"vehicle_id": {"$in": [None, ""]}}, {"_id": 1}):
+        await backfill_vehicle_ids()
+
+def model_validity(vehicle: dict, master_models: List[str]) -> Optional[bool]:
+    """Stored is_model_valid: Renault model in the master list; None for other brands"""
+    if vehicle.get("brand", "renault") != "renault":
+        return None
+    return bool(vehicle.get("model")) and vehicle["model"] in master_models
+
+async def recompute_model_validity(master_models: List[str]) -> int:
+    """Re-flag Renault vehicles after the master model list changes"""
+    now = datetime.now(timezone.utc).isoformat()
+    valid = await db.vehicles.update_many(
+        {"brand": "renault", "model": {"$in": master_models}, "is_model_valid": {"$ne": True}},
+        {"$set": {"is_model_valid": True, "updated_at": now}},
+    )
+    invalid = await db.vehicles.update_many(
+        {"brand": "renault", "model": {"$nin": master_models}, "is_model_valid": {"$ne": False}},
+        {"$set": {"is_model_valid": False, "updated_at": now}},
+    )
+    return valid.modified_count + invalid.modified_count
+
+@rebuild_task("model_validity")
+async def backfill_model_validity():
+    """Set is_model_valid on every vehicle from the current master list"""
+    modified = await recompute_model_validity((await get_reference_data()).vehicle_models())
+    other = await db.vehicles.update_many(
+        {"brand": {"$ne": "renault"}, "is_model_valid": {"$ne": None}},
+        {"$set": {"is_model_valid": None, "updated_at": datetime.now(timezone.utc).isoformat()}},
+    )
+    return {"vehicles": modified + other.modified_count}
+
+@app.on_event("startup")
+async def ensure_model_validity():
+    if await db.vehicles.find_one({"is_model_valid": {"$exists": False}}, {"_id": 1}):
+        await backfill_model_validity()
+
+def vehicle_search_match(search: str) -> dict:
+    """Indexed candidate filter: every word prefixes a token, or the whole input prefixes reg / suffixes VIN"""
+    full = normalize_reg(search)
+    words = [w for w in (normalize_reg(w) for w in search.split()) if w]
+    return {"$or": [
+        {"$and": [{"search_tokens": {"$regex": f"^{w}"}} for w in words]},
+        {"reg_key": {"$regex": f"^{full}"}},
+        {"vin_rev": {"$regex": f"^{full[::-1]}"}},
+    ]}
+
+def vehicle_search_score(search: str) -> dict:
+    """3 = exact reg / VIN, 2 = reg or VIN prefix (or VIN suffix), 1 = word match"""
+    full = normalize_reg(search)
+
+    def starts(field: str, value: str) -> dict:
+        return {"$eq": [{"$substrCP": [{"$ifNull": [field, ""]}, 0, len(value)]}, value]}
+
+    return {"$switch": {
+        "branches": [
+            {"case": {"$or": [{"$eq": ["$reg_key", full]}, {"$eq": ["$vin_rev", full[::-1]]}]}, "then": 3},
+            {"case": {"$or": [
+                starts("$reg_key", full), starts("$vin", full), starts("$vin_rev", full[::-1]),
+            ]}, "then": 2},
+        ],
+        "default": 1,
+    }}
+
+async def search_vehicles(response: Response, query: dict, search: str, cursor: Optional[str], limit: int) -> List[dict]:
+    """Ranked page of GET /vehicles?search=: best score first, then newest"""
+    match = {**query, **vehicle_search_match(search)}
+    pipeline = [{"$match": match}, {"$addFields": {"score": vehicle_search_score(search)}}]
+    if cursor:
+        pipeline.append({"$match": keyset_filter(VEHICLE_SEARCH_SORT_FIELDS, decode_cursor(cursor), direction=-1)})
+    else:
+        response.headers["X-Total-Count"] = str(await vehicle_total(match))
+    pipeline += [
+        {"$sort": {f: -1 for f in VEHICLE_SEARCH_SORT_FIELDS}},
+        {"$limit": limit + 1},
+        {"$project": {"_id": 0}},
+    ]
+    vehicles = await db.vehicles.aggregate(pipeline).to_list(limit + 1)
+    if len(vehicles) > limit:
+        vehicles = vehicles[:limit]
+        response.headers["X-Next-Cursor"] = encode_cursor([vehicles[-1].get(f) for f in VEHICLE_SEARCH_SORT_FIELDS])
+    for v in vehicles:
+        v.pop("score", None)
+    return vehicles
+
 @api_router.get("/vehicles")
-async def get_vehicles(request: Request, model: str = None, search: str = None, brand: str = None):
-    """Get all vehicles with optional filters"""
+async def get_vehicles(request: Request, response: Response, model: str = None, search: str = None, brand: str = None, model_valid: Optional[bool] = None, cursor: str = None, limit: int = VEHICLE_PAGE_SIZE):
+    """Get vehicles with optional filters, newest first.
+
+    Pages by keyset; when more remain, the X-Next-Cursor header carries the
+    cursor for the next page. The first page also sets X-Total-Count.
+    """
     await get_current_user(request)
+    limit = max(1, min(limit, 500))
     
     # Get master model list from settings
-    settings = await db.settings.find_one({"settings_id": "main"})
-    master_models = settings.get("vehicle_models", []) if settings else []
+    master_models = (await get_reference_data()).vehicle_models()
     
     query = {}
     
     # Filter by brand (renault or other)
-    if brand:
-        if brand == "renault":
-            query["$or"] = [{"brand": "renault"}, {"brand": {"$exists": False}}]
-        elif brand == "other":
-            query["brand"] = "other"
+    if brand in ("renault", "other"):
+        query["brand"] = brand
     
     # Filter by model (only if it's in master list)
     if model and model in master_models:
         query["model"] = model
+    if model_valid is not None:
+        query["is_model_valid"] = model_valid
     
-    # Search by reg_no, vin, engine_no, customer_name, customer_phone, make (NOT by model if not in master)
-    if search:
-        search_clean = search.strip()
-        search_query = [
-            {"vehicle_reg_no": {"$regex": search_clean, "$options": "i"}},
-            {"vin": {"$regex": search_clean, "$options": "i"}},
-            {"engine_no": {"$regex": search_clean, "$options": "i"}},
-            {"customer_name": {"$regex": search_clean, "$options": "i"}},
-            {"customer_phone": {"$regex": search_clean, "$options": "i"}},
-            {"make": {"$regex": search_clean, "$options": "i"}},
-        ]
-        if "$or" in query:
-            # Combine brand filter with search
-            query = {"$and": [{"$or": query["$or"]}, {"$or": search_query}]}
-        else:
-            query["$or"] = search_query
-    
-    cursor = db.vehicles.find(query, {"_id": 0}).sort("created_at", -1)
-    vehicles = await cursor.to_list(500)
-    
-    # Add is_model_valid flag to each vehicle
-    for v in vehicles:
-        v["is_model_valid"] = v.get("model") in master_models if v.get("model") else False
+    # Search by reg_no, vin, engine_no, customer name, phone, make (NOT by model if not in master)
+    if search and normalize_reg(search):
+        return await search_vehicles(response, query, search, cursor, limit)
     
+    if cursor:
+        page_query = {"$and": [query, keyset_filter(VEHICLE_SORT_FIELDS, decode_cursor(cursor), direction=-1)]}
+    else:
+        page_query = query
+        response.headers["X-Total-Count"] = str(await vehicle_total(query))
+    
+    vehicles = await db.vehicles.find(page_query, {"_id": 0}).sort(
+        [(f, -1) for f in VEHICLE_SORT_FIELDS]
+    ).to_list(limit + 1)
+    if len(vehicles) > limit:
+        vehicles = vehicles[:limit]
+        response.headers["X-Next-Cursor"] = encode_cursor([vehicles[-1].get(f) for f in VEHICLE_SORT_FIELDS])
     return vehicles
 
 @api_router.get("/vehicles/{vehicle_id}")
@@ -2049,12 +4036,6 @@ async def get_vehicle(request: Request, vehicle_id: str):
     vehicle = await db.vehicles.find_one({"vehicle_id": vehicle_id}, {"_id": 0})
     if not vehicle:
         raise HTTPException(status_code=404, detail="Vehicle not found")
-    
-    # Check if model is valid
-    settings = await db.settings.find_one({"settings_id": "main"})
-    master_models = settings.get("vehicle_models", []) if settings else []
-    vehicle["is_model_valid"] = vehicle.get("model") in master_models if vehicle.get("model") else False
-    
     return vehicle
 
 @api_router.post("/vehicles", status_code=201)
@@ -2070,8 +4051,7 @@ async def create_vehicle(request: Request, data: VehicleCreate):
     
     # Check model is from master list only for Renault vehicles
     if is_renault:
-        settings = await db.settings.find_one({"settings_id": "main"})
-        master_models = settings.get("vehicle_models", []) if settings else []
+        master_models = (await get_reference_data()).vehicle_models()
         
         if data.model and data.model not in master_models:
             raise HTTPException(status_code=400, detail="Model must be from the master list in Other Settings")
@@ -2083,24 +4063,11 @@ async def create_vehicle(request: Request, data: VehicleCreate):
         if not data.make:
             raise HTTPException(status_code=400, detail="Make (brand name) is required for Other Brands vehicles")
     
-    # Check for duplicate reg_no
     reg_clean = data.vehicle_reg_no.upper().replace(" ", "")
-    existing = await db.vehicles.find_one({"vehicle_reg_no": reg_clean})
-    if existing:
-        raise HTTPException(status_code=400, detail="Vehicle with this registration number already exists")
-    
-    # Check for duplicate VIN
-    vin_clean = data.vin.upper().replace(" ", "")
-    existing_vin = await db.vehicles.find_one({"vin": vin_clean})
-    if existing_vin:
-        raise HTTPException(status_code=400, detail="Vehicle with this VIN already exists")
-    
-    vehicle_id = f"VEH-{datetime.now().strftime('%Y%m%d%H%M%S')}-{reg_clean[-4:]}"
-    
     vehicle = {
-        "vehicle_id": vehicle_id,
+        "vehicle_id": new_vehicle_id(),
         "vehicle_reg_no": reg_clean,
-        "vin": data.vin.upper().replace(" ", "") if data.vin else None,
+        "vin": data.vin.upper().replace(" ", ""),
         "engine_no": data.engine_no.upper() if data.engine_no else None,
         "model": data.model,
         "brand": data.brand,
@@ -2109,11 +4076,21 @@ async def create_vehicle(request: Request, data: VehicleCreate):
         "customer_phone": data.customer_phone,
         "created_at": datetime.now(timezone.utc).isoformat(),
         "updated_at": datetime.now(timezone.utc).isoformat(),
+        "is_model_valid": True if is_renault else None,
     }
+    vehicle.update(vehicle_search_keys(vehicle))
     
-    await db.vehicles.insert_one(vehicle)
+    # The unique reg / VIN indexes are the duplicate check
+    await ensure_vehicle_keys_free(vehicle)
+    try:
+        await db.vehicles.insert_one(vehicle)
+    except DuplicateKeyError as e:
+        raise HTTPException(status_code=400, detail=duplicate_vehicle_detail(e.details))
     del vehicle["_id"]
-    vehicle["is_model_valid"] = True if is_renault else None
+    index_vehicle(vehicle)
+    vehicle_search_cache.clear()
+    vehicle_count_cache.clear()
+    await sync_customer(vehicle)
     return vehicle
 
 @api_router.put("/vehicles/{vehicle_id}")
@@ -2132,8 +4109,7 @@ async def update_vehicle(request: Request, vehicle_id: str, data: VehicleUpdate)
     
     # Check model is from master list if being updated for Renault vehicles
     if data.model and is_renault:
-        settings = await db.settings.find_one({"settings_id": "main"})
-        master_models = settings.get("vehicle_models", []) if settings else []
+        master_models = (await get_reference_data()).vehicle_models()
         if data.model not in master_models:
             raise HTTPException(status_code=400, detail="Model must be from the master list in Other Settings")
     
@@ -2156,18 +4132,21 @@ async def update_vehicle(request: Request, vehicle_id: str, data: VehicleUpdate)
         update_dict["customer_phone"] = data.customer_phone
     
     update_dict["updated_at"] = datetime.now(timezone.utc).isoformat()
+    update_dict.update(vehicle_search_keys({**vehicle, **update_dict}))
+    update_dict["is_model_valid"] = model_validity(
+        {**vehicle, **update_dict}, (await get_reference_data()).vehicle_models()
+    )
     
-    await db.vehicles.update_one({"vehicle_id": vehicle_id}, {"$set": update_dict})
+    await ensure_vehicle_keys_free(update_dict, exclude_id=vehicle_id)
+    try:
+        await db.vehicles.update_one({"vehicle_id": vehicle_id}, {"$set": update_dict})
+    except DuplicateKeyError as e:
+        raise HTTPException(status_code=400, detail=duplicate_vehicle_detail(e.details))
     updated = await db.vehicles.find_one({"vehicle_id": vehicle_id}, {"_id": 0})
-    
-    # Check if model is valid (only for Renault)
-    if updated.get("brand", "renault") == "renault":
-        settings = await db.settings.find_one({"settings_id": "main"})
-        master_models = settings.get("vehicle_models", []) if settings else []
-        updated["is_model_valid"] = updated.get("model") in master_models if updated.get("model") else False
-    else:
-        updated["is_model_valid"] = None
-    
+    index_vehicle(updated)
+    vehicle_search_cache.clear()
+    vehicle_count_cache.clear()
+    await sync_customer(updated)
     return updated
 
 @api_router.delete("/vehicles/{vehicle_id}")
@@ -2178,10 +4157,568 @@ async def delete_vehicle(request: Request, vehicle_id: str):
     if not vehicle:
         raise HTTPException(status_code=404, detail="Vehicle not found")
     await db.vehicles.delete_one({"vehicle_id": vehicle_id})
+    await record_tombstones("vehicles", [vehicle])
+    search_index.remove(vehicle_index_key(vehicle))
+    vehicle_search_cache.clear()
+    vehicle_count_cache.clear()
     return {"message": "Vehicle deleted"}
 
+VEHICLE_IMPORT_COLUMNS = ["vehicle_reg_no", "vin", "engine_no", "model", "brand", "make", "customer_name", "customer_phone"]
+VEHICLE_IMPORT_ERROR_LIMIT = 1000
+
+def import_cells(raw: dict) -> dict:
+    """Row keyed by snake_case header ("Vehicle Reg No" -> vehicle_reg_no)"""
+    return {str(k).strip().lower().replace(" ", "_"): v for k, v in raw.items() if k is not None}
+
+def vehicle_import_row(raw: dict, master_models: List[str], now: str) -> dict:
+    """Vehicle document for one import row, validated like create_vehicle; ValueError says why not"""
+    cells = import_cells(raw)
+    row = {col: (import_value(cells.get(col), "string") or "").strip() for col in VEHICLE_IMPORT_COLUMNS}
+    brand = (row["brand"] or "renault").lower()
+    if not row["vehicle_reg_no"]:
+        raise ValueError("Registration number is required")
+    if not row["vin"]:
+        raise ValueError("VIN is required")
+    if brand not in ("renault", "other"):
+        raise ValueError("Brand must be renault or other")
+    if brand == "renault":
+        if not row["model"]:
+            raise ValueError("Model is required for Renault vehicles")
+        if row["model"] not in master_models:
+            raise ValueError("Model must be from the master list in Other Settings")
+    elif not row["make"]:
+        raise ValueError("Make (brand name) is required for Other Brands vehicles")
+
+    reg_clean = row["vehicle_reg_no"].upper().replace(" ", "")
+    vehicle = {
+        "vehicle_id": new_vehicle_id(),
+        "vehicle_reg_no": reg_clean,
+        "vin": row["vin"].upper().replace(" ", ""),
+        "engine_no": row["engine_no"].upper() or None,
+        "model": row["model"] or None,
+        "brand": brand,
+        "make": row["make"] or None,
+        "customer_name": row["customer_name"] or None,
+        "customer_phone": row["customer_phone"] or None,
+        "created_at": now,
+        "updated_at": now,
+    }
+    vehicle["is_model_valid"] = model_validity(vehicle, master_models)
+    vehicle.update(vehicle_search_keys(vehicle))
+    return vehicle
+
+def write_import_errors(path: Path, errors: List[dict]):
+    with open(path, "w", newline="", encoding="utf-8") as fh:
+        writer = csv.DictWriter(fh, fieldnames=["sheet", "row", "vehicle_reg_no", "vin", "error"])
+        writer.writeheader()
+        writer.writerows(errors)
+
+async def run_vehicle_import_job(job: dict, report) -> dict:
+    """Vehicle import job: validate, dedupe and insert_many new vehicles batch by batch.
+
+    Rows already in the database are caught by the unique reg / VIN indexes
+    and reported from the BulkWriteError; only a key whose index is missing is
+    looked up beforehand.
+    """
+    path = Path(job["input_path"])
+    master_models = (await get_reference_data()).vehicle_models()
+    seen_regs, seen_vins = set(), set()
+    errors = []
+    sheets = {}  # sheet name -> order in the file, for sorting the report
+    inserted = processed = 0
+
+    def reject(position: tuple, raw: dict, reason: str):
+        sheet, row_no = position
+        cells = import_cells(raw)
+        errors.append({
+            "sheet": sheet,
+            "row": row_no,
+            "vehicle_reg_no": str(cells.get("vehicle_reg_no") or ""),
+            "vin": str(cells.get("vin") or ""),
+            "error": reason,
+        })
+
+    for total, batch, (sheet, first_row) in iter_import_rows(path):
+        now = datetime.now(timezone.utc).isoformat()
+        sheets.setdefault(sheet, len(sheets))
+        docs, sources = [], []
+        for offset, raw in enumerate(batch):
+            position = (sheet, first_row + offset)
+            try:
+                doc = vehicle_import_row(raw, master_models, now)
+            except ValueError as e:
+                reject(position, raw, str(e))
+                continue
+            if doc["reg_key"] in seen_regs:
+                reject(position, doc, "Duplicate registration number in file")
+            elif doc["vin_rev"] in seen_vins:
+                reject(position, doc, "Duplicate VIN in file")
+            else:
+                seen_regs.add(doc["reg_key"])
+                seen_vins.add(doc["vin_rev"])
+                docs.append(doc)
+                sources.append(position)
+
+        if docs:
+            existing_regs, existing_vins = await unindexed_vehicle_duplicates(docs)
+            if existing_regs or existing_vins:
+                kept = []
+                for doc, position in zip(docs, sources):
+                    if doc["reg_key"] in existing_regs:
+                        reject(position, doc, "Vehicle with this registration number already exists")
+                    elif doc["vin_rev"] in existing_vins:
+                        reject(position, doc, "Vehicle with this VIN already exists")
+                    else:
+                        kept.append((doc, position))
+                docs, sources = [d for d, _ in kept], [p for _, p in kept]
+
+        if docs:
+            failed = set()
+            try:
+                await db.vehicles.insert_many(docs, ordered=False)
+            except BulkWriteError as e:
+                for err in e.details.get("writeErrors", []):
+                    failed.add(err["index"])
+                    reason = duplicate_vehicle_detail(err) if err.get("code") == 11000 else err.get("errmsg", "Insert failed")
+                    reject(sources[err["index"]], docs[err["index"]], reason)
+            created = [d for i, d in enumerate(docs) if i not in failed]
+            inserted += len(created)
+            for doc in created:
+                doc.pop("_id", None)
+                index_vehicle(doc)
+            customer_ops = [op for op in map(customer_upsert, created) if op]
+            if customer_ops:
+                await db.customers.bulk_write(customer_ops)
+
+        processed += len(batch)
+        await report(processed * 100 // total if total else 100)
+
+    if inserted:
+        vehicle_search_cache.clear()
+        vehicle_count_cache.clear()
+    path.unlink(missing_ok=True)
+    errors.sort(key=lambda e: (sheets[e["sheet"]], e["row"]))
+    result = {"rows": processed, "inserted": inserted, "failed": len(errors), "errors": errors[:VEHICLE_IMPORT_ERROR_LIMIT]}
+    if errors:
+        report_path = job_artifact_path(job["job_id"], ".csv")
+        write_import_errors(report_path, errors)
+        result.update({"artifact_path": str(report_path), "file_name": "vehicle_import_errors.csv", "media_type": "text/csv"})
+    return result
+
+JOB_HANDLERS["vehicle_import"] = run_vehicle_import_job
+
+@api_router.post("/vehicles/import", status_code=202)
+async def import_vehicles(request: Request, file: UploadFile = File(...)):
+    """Queue a bulk vehicle import from CSV/XLSX (CRM/DP only); the job result lists rejected rows"""
+    user = await require_role(request, ["CRM", "DP"])
+    suffix = Path(file.filename or "").suffix.lower()
+    if suffix not in (".csv", ".xlsx"):
+        raise HTTPException(status_code=400, detail="File type not allowed. Allowed: .csv, .xlsx")
+    
+    input_path = job_artifact_path(f"vehicle_import_{uuid.uuid4().hex[:12]}", suffix)
+    await save_upload(file, input_path)
+    job = await enqueue_job("vehicle_import", {"file_name": file.filename}, user, str(input_path))
+    return job_public(job)
+
+# ============== DOCUMENT BLOB STORE ==============
+
+# Vehicle document contents live outside Mongo documents, addressed by the
+# SHA-256 of their bytes; vehicle_documents keeps only metadata and blob_id.
+# DOCUMENT_STORE picks the backend: "local" (files under DOCUMENT_BLOB_DIR,
+# served with FileResponse) or "gridfs".
+#
+# Identical uploads share one blob. document_blobs counts the documents
+# referencing each blob; a blob is removed when its count drops to zero.
+
+DOCUMENT_STORE = os.environ.get("DOCUMENT_STORE", "local")
+DOCUMENT_BLOB_DIR = Path(os.environ.get("DOCUMENT_BLOB_DIR", str(ROOT_DIR / "document_blobs")))
+BLOB_CHUNK_SIZE = 1024 * 1024
+DOCUMENT_MIGRATION_BATCH = 20
+BLOB_REMOVAL_WAIT_SECONDS = 5
+
+async def iter_bytes(content: bytes):
+    """Chunks of an in-memory payload, for store_blob"""
+    for i in range(0, len(content), BLOB_CHUNK_SIZE):
+        yield content[i:i + BLOB_CHUNK_SIZE]
+
+class LocalBlobStore:
+    """Content-addressed files on disk: <root>/<first two hex digits>/<sha256>"""
+
+    def __init__(self, root: Path):
+        self.root = root
+
+    def path(self, blob_id: str) -> Path:
+        return self.root / blob_id[:2] / blob_id
+
+    async def stage(self, chunks) -> dict:
+        """Write an async iterator of chunks to a staging file, hashing as it goes.
+
+        Disk writes run in the threadpool so a slow disk does not stall the event loop.
+        """
+        staging = self.root / "staging"
+        await run_in_threadpool(staging.mkdir, parents=True, exist_ok=True)
+        tmp_path = staging / uuid.uuid4().hex
+        digest = hashlib.sha256()
+        size = 0
+        fh = await run_in_threadpool(open, tmp_path, "wb")
+        try:
+            async for chunk in chunks:
+                digest.update(chunk)
+                size += len(chunk)
+                await run_in_threadpool(fh.write, chunk)
+            await run_in_threadpool(fh.close)
+        except BaseException:
+            fh.close()
+            await run_in_threadpool(tmp_path.unlink, missing_ok=True)
+            raise
+        return {"blob_id": digest.hexdigest(), "size": size, "tmp_path": tmp_path}
+
+    async def commit(self, staged: dict):
+        """Move a staged file into place under its hash"""
+        target = self.path(staged["blob_id"])
+        await run_in_threadpool(target.parent.mkdir, exist_ok=True)
+        # Same name means same bytes, so replacing an existing blob is harmless
+        await run_in_threadpool(os.replace, staged["tmp_path"], target)
+
+    async def discard(self, staged: dict):
+        await run_in_threadpool(staged["tmp_path"].unlink, missing_ok=True)
+
+    async def size(self, blob_id: str) -> int:
+        path = self.path(blob_id)
+        if not path.is_file():
+            raise HTTPException(status_code=404, detail="Document content not found")
+        return path.stat().st_size
+
+    async def read(self, blob_id: str, start: int, length: int):
+        """Yield `length` bytes of a blob from offset `start`"""
+        with open(self.path(blob_id), "rb") as fh:
+            fh.seek(start)
+            while length > 0 and (chunk := fh.read(min(BLOB_CHUNK_SIZE, length))):
+                length -= len(chunk)
+                yield chunk
+
+    async def response(self, blob_id: str, media_type: str, headers: dict) -> Response:
+        """The whole blob, sent with sendfile where the server supports it"""
+        return FileResponse(self.path(blob_id), media_type=media_type, headers=headers)
+
+    async def delete(self, blob_id: str):
+        self.path(blob_id).unlink(missing_ok=True)
+
+class GridFSBlobStore:
+    """Blobs in the document_contents GridFS bucket, one file per sha256 filename"""
+
+    def __init__(self, database):
+        self.bucket = AsyncIOMotorGridFSBucket(database, bucket_name="document_contents")
+        self.files = database["document_contents.files"]
+
+    async def stage(self, chunks) -> dict:
+        """Write an async iterator of chunks to a staging file, hashing as it goes"""
+        stream = self.bucket.open_upload_stream(f"staging-{uuid.uuid4().hex}", chunk_size_bytes=BLOB_CHUNK_SIZE)
+        digest = hashlib.sha256()
+        size = 0
+        try:
+            async for chunk in chunks:
+                digest.update(chunk)
+                size += len(chunk)
+                await stream.write(chunk)
+        except BaseException:
+            await stream.abort()
+            raise
+        await stream.close()
+        return {"blob_id": digest.hexdigest(), "size": size, "file_id": stream._id}
+
+    async def commit(self, staged: dict):
+        """Name a staged file after its hash, or drop it if that blob is already stored"""
+        if await self.files.find_one({"filename": staged["blob_id"]}, {"_id": 1}):
+            await self.bucket.delete(staged["file_id"])
+        else:
+            await self.bucket.rename(staged["file_id"], staged["blob_id"])
+
+    async def discard(self, staged: dict):
+        await self.bucket.delete(staged["file_id"])
+
+    async def open(self, blob_id: str):
+        try:
+            return await self.bucket.open_download_stream_by_name(blob_id)
+        except NoFile:
+            raise HTTPException(status_code=404, detail="Document content not found")
+
+    async def size(self, blob_id: str) -> int:
+        return (await self.open(blob_id)).length
+
+    async def read(self, blob_id: str, start: int, length: int):
+        """Yield `length` bytes of a blob from offset `start`"""
+        grid_out = await self.open(blob_id)
+        grid_out.seek(start)
+        while length > 0 and (chunk := await grid_out.read(min(BLOB_CHUNK_SIZE, length))):
+            length -= len(chunk)
+            yield chunk
+
+    async def response(self, blob_id: str, media_type: str, headers: dict) -> Response:
+        """The whole blob, streamed chunk by chunk"""
+        size = await self.size(blob_id)
+        return StreamingResponse(
+            self.read(blob_id, 0, size), media_type=media_type, headers={**headers, "Content-Length": str(size)}
+        )
+
+    async def delete(self, blob_id: str):
+        async for doc in self.files.find({"filename": blob_id}, {"_id": 1}):
+            await self.bucket.delete(doc["_id"])
+
+blob_store = GridFSBlobStore(db) if DOCUMENT_STORE == "gridfs" else LocalBlobStore(DOCUMENT_BLOB_DIR)
+
+async def store_blob(chunks) -> tuple:
+    """Store content and count one reference to it; returns (blob_id, size).
+
+    The reference is counted before the blob is put in place, and waits out
+    a release that is removing the same blob, so a removal can never take
+    out content an upload has just referenced. If the removal outlasts
+    BLOB_REMOVAL_WAIT_SECONDS the upload fails rather than race it.
+    """
+    staged = await blob_store.stage(chunks)
+    try:
+        await db.document_blobs.update_one(
+            {"_id": staged["blob_id"]},
+            {"$inc": {"ref_count": 1}, "$setOnInsert": {
+                "size": staged["size"], "created_at": datetime.now(timezone.utc).isoformat(),
+            }},
+            upsert=True,
+        )
+        deadline = time.monotonic() + BLOB_REMOVAL_WAIT_SECONDS
+        while await db.document_blobs.find_one({"_id": staged["blob_id"], "removing": True}, {"_id": 1}):
+            if time.monotonic() >= deadline:
+                await db.document_blobs.update_one({"_id": staged["blob_id"]}, {"$inc": {"ref_count": -1}})
+                raise HTTPException(status_code=503, detail="Identical content is being removed, please retry")
+            await asyncio.sleep(0.05)
+    except BaseException:
+        await blob_store.discard(staged)
+        raise
+    await blob_store.commit(staged)
+    return staged["blob_id"], staged["size"]
+
+async def release_blob(blob_id: str):
+    """Drop one reference to a blob, removing the blob once nothing references it"""
+    blob = await db.document_blobs.find_one_and_update(
+        {"_id": blob_id, "ref_count": {"$gt": 0}}, {"$inc": {"ref_count": -1}},
+        return_document=ReturnDocument.AFTER,
+    )
+    if blob is None or blob["ref_count"] > 0:
+        return
+    claimed = await db.document_blobs.find_one_and_update(
+        {"_id": blob_id, "ref_count": 0, "removing": {"$ne": True}}, {"$set": {"removing": True}}
+    )
+    if not claimed:
+        return
+    # Documents stored before reference counting began may still point here
+    # (see recount_document_blobs); keep the blob and correct its count
+    in_use = await db.vehicle_documents.count_documents({"blob_id": blob_id})
+    if in_use:
+        await db.document_blobs.update_one(
+            {"_id": blob_id}, {"$max": {"ref_count": in_use}, "$unset": {"removing": ""}}
+        )
+        return
+    try:
+        await blob_store.delete(blob_id)
+    finally:
+        # An upload of the same content may have counted a new reference meanwhile;
+        # it puts the blob back once "removing" is cleared.
+        await db.document_blobs.delete_one({"_id": blob_id, "ref_count": 0})
+        await db.document_blobs.update_one({"_id": blob_id}, {"$unset": {"removing": ""}})
+
+# Legacy rows still waiting for migration; rows whose file_data could not be
+# decoded are marked with file_data_error, keep their base64 and are skipped
+UNMIGRATED_DOCUMENTS = {"file_data": {"$exists": True}, "file_data_error": {"$exists": False}}
+
+@rebuild_task("document_blobs")
+async def migrate_document_blobs():
+    """Move base64 file_data of older vehicle documents into the blob store"""
+    migrated = failed = 0
+    while True:
+        docs = await db.vehicle_documents.find(
+            UNMIGRATED_DOCUMENTS, {"_id": 1, "document_id": 1, "file_data": 1}
+        ).to_list(DOCUMENT_MIGRATION_BATCH)
+        if not docs:
+            break
+        ops = []
+        for doc in docs:
+            try:
+                content = base64.b64decode(doc["file_data"] or "")
+            except (binascii.Error, ValueError) as e:
+                logger.warning(f"Document {doc.get('document_id', doc['_id'])} has undecodable file_data: {e}")
+                ops.append(UpdateOne({"_id": doc["_id"]}, {"$set": {"file_data_error": str(e)}}))
+                failed += 1
+                continue
+            blob_id, size = await store_blob(iter_bytes(content))
+            ops.append(UpdateOne(
+                {"_id": doc["_id"]},
+                {"$set": {"blob_id": blob_id, "file_size": size}, "$unset": {"file_data": ""}},
+            ))
+            migrated += 1
+        await db.vehicle_documents.bulk_write(ops, ordered=False)
+    return {"vehicle_documents": migrated, "failed": failed}
+
+@rebuild_task("document_blob_refs")
+async def recount_document_blobs():
+    """Count references to blobs stored before counting began.
+
+    Runs alongside uploads and deletes, so it only ever raises a count
+    ($max): an increment that lands after the aggregate is read is kept,
+    and a count the aggregate misses is repaired by release_blob, which
+    never removes a blob a document still points at.
+    """
+    now = datetime.now(timezone.utc).isoformat()
+    ops = []
+    counted = 0
+    async for row in db.vehicle_documents.aggregate([
+        {"$match": {"blob_id": {"$exists": True}}},
+        {"$group": {"_id": "$blob_id", "refs": {"$sum": 1}, "size": {"$first": "$file_size"}}},
+    ]):
+        ops.append(UpdateOne(
+            {"_id": row["_id"]},
+            {"$max": {"ref_count": row["refs"]}, "$setOnInsert": {"size": row["size"], "created_at": now}},
+            upsert=True,
+        ))
+        if len(ops) >= SEARCH_KEY_BATCH:
+            await db.document_blobs.bulk_write(ops, ordered=False)
+            counted += len(ops)
+            ops = []
+    if ops:
+        await db.document_blobs.bulk_write(ops, ordered=False)
+        counted += len(ops)
+    return {"blobs": counted}
+
+@app.on_event("startup")
+async def queue_document_blob_migration():
+    """Queue the blob migration once if any document still holds base64 file_data"""
+    legacy = await db.vehicle_documents.find_one(UNMIGRATED_DOCUMENTS, {"_id": 1})
+    pending = await db.jobs.find_one({
+        "type": "rebuild", "params.target": "document_blobs", "status": {"$in": ["queued", "running"]}
+    }, {"_id": 1})
+    if legacy and not pending:
+        await enqueue_job("rebuild", {"target": "document_blobs"}, {"user_id": "system", "name": "System"})
+
+@app.on_event("startup")
+async def queue_document_blob_recount():
+    """Count blob references once for documents stored before counting began.
+
+    Waits for a queued or running blob migration to finish first (it is
+    queued again on a later startup).
+    """
+    uncounted = (
+        not await db.jobs.find_one(
+            {"type": "rebuild", "params.target": "document_blob_refs", "status": "succeeded"}, {"_id": 1}
+        )
+        and await db.vehicle_documents.find_one({"blob_id": {"$exists": True}}, {"_id": 1})
+    )
+    pending = await db.jobs.find_one({
+        "type": "rebuild", "params.target": {"$in": ["document_blob_refs", "document_blobs"]},
+        "status": {"$in": ["queued", "running"]},
+    }, {"_id": 1})
+    if uncounted and not pending:
+        await enqueue_job("rebuild", {"target": "document_blob_refs"}, {"user_id": "system", "name": "System"})
+
 # ============== VEHICLE DOCUMENTS ==============
 
+DOCUMENT_MAX_BYTES = 5 * 1024 * 1024
+DOCUMENT_EXTENSIONS = [".pdf", ".jpg", ".jpeg", ".png", ".doc", ".docx"]
+# Multipart boundaries and part headers on top of the file itself
+MULTIPART_OVERHEAD_BYTES = 16 * 1024
+
+class MultipartFileStream:
+    """The file field of a multipart/form-data request, read as it arrives.
+
+    start() reads the body up to the end of the file part's headers, so the
+    filename and content type are known before any file bytes are consumed;
+    chunks() then yields the file's bytes one network chunk at a time.
+    """
+
+    def __init__(self, request: Request, field: str = "file"):
+        _, params = parse_options_header(request.headers.get("content-type", ""))
+        if b"boundary" not in params:
+            raise HTTPException(status_code=400, detail="Expected a multipart/form-data upload")
+        self.body = request.stream()
+        self.field = field
+        self.filename = None
+        self.content_type = None
+        self._pending = []
+        self._part_headers = {}
+        self._header_name = b""
+        self._header_value = b""
+        self._in_file = False
+        self._file_done = False
+        self.parser = python_multipart.MultipartParser(params[b"boundary"], {
+            "on_part_begin": self._on_part_begin,
+            "on_header_field": self._on_header_field,
+            "on_header_value": self._on_header_value,
+            "on_header_end": self._on_header_end,
+            "on_headers_finished": self._on_headers_finished,
+            "on_part_data": self._on_part_data,
+            "on_part_end": self._on_part_end,
+        })
+
+    def _on_part_begin(self):
+        self._part_headers = {}
+
+    def _on_header_field(self, data: bytes, start: int, end: int):
+        self._header_name += data[start:end]
+
+    def _on_header_value(self, data: bytes, start: int, end: int):
+        self._header_value += data[start:end]
+
+    def _on_header_end(self):
+        self._part_headers[self._header_name.lower()] = self._header_value
+        self._header_name = b""
+        self._header_value = b""
+
+    def _on_headers_finished(self):
+        _, options = parse_options_header(self._part_headers.get(b"content-disposition", b""))
+        if self.filename is None and options.get(b"name") == self.field.encode() and b"filename" in options:
+            self.filename = options[b"filename"].decode("utf-8", "replace")
+            self.content_type = self._part_headers.get(b"content-type", b"application/octet-stream").decode("latin-1")
+            self._in_file = True
+
+    def _on_part_data(self, data: bytes, start: int, end: int):
+        if self._in_file:
+            self._pending.append(data[start:end])
+
+    def _on_part_end(self):
+        if self._in_file:
+            self._in_file = False
+            self._file_done = True
+
+    async def _feed(self) -> bool:
+        """Parse the next body chunk; False once the body is exhausted"""
+        try:
+            chunk = await self.body.__anext__()
+        except StopAsyncIteration:
+            return False
+        if chunk:
+            self.parser.write(chunk)
+        return True
+
+    async def start(self):
+        while self.filename is None:
+            if not await self._feed():
+                raise HTTPException(status_code=400, detail=f"No '{self.field}' file in the upload")
+
+    async def chunks(self):
+        while True:
+            while self._pending:
+                yield self._pending.pop(0)
+            if self._file_done:
+                return
+            if not await self._feed():
+                raise HTTPException(status_code=400, detail="Upload ended before the file did")
+
+async def limit_size(chunks, max_bytes: int, detail: str):
+    """Pass chunks through, failing with 400 once more than max_bytes have gone by"""
+    size = 0
+    async for chunk in chunks:
+        size += len(chunk)
+        if size > max_bytes:
+            raise HTTPException(status_code=400, detail=detail)
+        yield chunk
+
 @api_router.get("/vehicles/{vehicle_id}/documents")
 async def get_vehicle_documents(request: Request, vehicle_id: str):
     """Get all documents for a vehicle"""
@@ -2191,7 +4728,7 @@ async def get_vehicle_documents(request: Request, vehicle_id: str):
     if not vehicle:
         raise HTTPException(status_code=404, detail="Vehicle not found")
     
-    cursor = db.vehicle_documents.find({"vehicle_id": vehicle_id}, {"_id": 0, "file_data": 0}).sort("uploaded_at", -1)
+    cursor = db.vehicle_documents.find({"vehicle_id": vehicle_id}, {"_id": 0, "file_data": 0, "file_data_error": 0, "blob_id": 0}).sort("uploaded_at", -1)
     documents = await cursor.to_list(100)
     
     # Add file_url to each document
@@ -2200,78 +4737,146 @@ async def get_vehicle_documents(request: Request, vehicle_id: str):
     
     return documents
 
-@api_router.post("/vehicles/{vehicle_id}/documents", status_code=201)
-async def upload_vehicle_document(
-    request: Request, 
-    vehicle_id: str, 
-    file: UploadFile = File(...),
-    document_type: str = "general"
-):
-    """Upload a document for a vehicle"""
+@api_router.post(
+    "/vehicles/{vehicle_id}/documents",
+    status_code=201,
+    openapi_extra={"requestBody": {"required": True, "content": {"multipart/form-data": {"schema": {
+        "type": "object", "required": ["file"], "properties": {"file": {"type": "string", "format": "binary"}},
+    }}}}},
+)
+async def upload_vehicle_document(request: Request, vehicle_id: str, document_type: str = "general"):
+    """Upload a document for a vehicle.
+
+    The multipart body is read as it arrives: the type and declared size are
+    checked before any file bytes are consumed, and the bytes are hashed and
+    written to the blob store chunk by chunk.
+    """
     await get_current_user(request)
     
     vehicle = await db.vehicles.find_one({"vehicle_id": vehicle_id})
     if not vehicle:
         raise HTTPException(status_code=404, detail="Vehicle not found")
     
-    # Validate file size (max 5MB)
-    content = await file.read()
-    if len(content) > 5 * 1024 * 1024:
-        raise HTTPException(status_code=400, detail="File size must be less than 5MB")
+    # Validate file size (max 5MB) up front when the client declares it
+    size_error = "File size must be less than 5MB"
+    declared = request.headers.get("content-length", "")
+    if declared.isdigit() and int(declared) > DOCUMENT_MAX_BYTES + MULTIPART_OVERHEAD_BYTES:
+        raise HTTPException(status_code=400, detail=size_error)
+    
+    upload = MultipartFileStream(request)
+    await upload.start()
     
     # Validate file type
-    allowed_extensions = [".pdf", ".jpg", ".jpeg", ".png", ".doc", ".docx"]
-    file_ext = Path(file.filename).suffix.lower()
-    if file_ext not in allowed_extensions:
-        raise HTTPException(status_code=400, detail=f"File type not allowed. Allowed: {', '.join(allowed_extensions)}")
+    file_ext = Path(upload.filename).suffix.lower()
+    if file_ext not in DOCUMENT_EXTENSIONS:
+        raise HTTPException(status_code=400, detail=f"File type not allowed. Allowed: {', '.join(DOCUMENT_EXTENSIONS)}")
     
     # Create document record
     document_id = f"DOC-{datetime.now().strftime('%Y%m%d%H%M%S')}-{uuid.uuid4().hex[:6]}"
     
-    # Store file content as base64 (for simplicity - in production, use S3/GCS)
-    file_data = base64.b64encode(content).decode("utf-8")
+    # Chunked or understated bodies are still cut off at the limit
+    blob_id, size = await store_blob(limit_size(upload.chunks(), DOCUMENT_MAX_BYTES, size_error))
     
     document = {
         "document_id": document_id,
         "vehicle_id": vehicle_id,
-        "file_name": file.filename,
-        "file_type": file.content_type,
-        "file_size": len(content),
-        "file_data": file_data,
+        "file_name": upload.filename,
+        "file_type": upload.content_type,
+        "file_size": size,
+        "blob_id": blob_id,
         "document_type": document_type,
         "uploaded_at": datetime.now(timezone.utc).isoformat(),
     }
     
     await db.vehicle_documents.insert_one(document)
     
-    # Return without file_data (too large for response)
     return {
         "document_id": document_id,
         "vehicle_id": vehicle_id,
-        "file_name": file.filename,
-        "file_type": file.content_type,
-        "file_size": len(content),
+        "file_name": upload.filename,
+        "file_type": upload.content_type,
+        "file_size": size,
         "document_type": document_type,
         "uploaded_at": document["uploaded_at"],
         "file_url": f"/api/vehicles/{vehicle_id}/documents/{document_id}/download"
     }
 
+# Document contents never change in place (a new upload is a new document),
+# so browsers may keep them for good; private keeps them out of shared caches.
+DOCUMENT_CACHE_CONTROL = "private, max-age=31536000, immutable"
+
+def etag_matches(header: Optional[str], etag: str) -> bool:
+    """Whether an If-None-Match / If-Range value names `etag` (weak or strong)"""
+    if not header:
+        return False
+    tags = [tag.strip() for tag in header.split(",")]
+    return "*" in tags or etag in [tag.removeprefix("W/") for tag in tags]
+
+def parse_byte_range(header: Optional[str], size: int) -> Optional[tuple]:
+    """(start, end) of a single-range Range header; None means send the whole body.
+
+    Malformed and multi-range headers are ignored, as RFC 9110 allows.
+    """
+    match = re.fullmatch(r"bytes=(\d*)-(\d*)", (header or "").strip())
+    if not match or match.groups() == ("", ""):
+        return None
+    first, last = match.groups()
+    if first:
+        start = int(first)
+        end = min(int(last), size - 1) if last else size - 1
+        if last and int(last) < start:
+            return None
+    else:
+        start, end = max(size - int(last), 0), size - 1
+    if start >= size or end < start:
+        raise HTTPException(status_code=416, detail="Range not satisfiable", headers={"Content-Range": f"bytes */{size}"})
+    return start, end
+
 @api_router.get("/vehicles/{vehicle_id}/documents/{document_id}/download")
 async def download_vehicle_document(request: Request, vehicle_id: str, document_id: str):
-    """Download a vehicle document"""
+    """Download a vehicle document.
+
+    The ETag is the content hash: If-None-Match gets a 304, and a single
+    byte Range (guarded by If-Range) gets a 206 with just those bytes.
+    """
     await get_current_user(request)
     
     document = await db.vehicle_documents.find_one({"document_id": document_id, "vehicle_id": vehicle_id})
     if not document:
         raise HTTPException(status_code=404, detail="Document not found")
     
-    # Decode file content
-    file_content = base64.b64decode(document["file_data"])
-    
+    if not document.get("blob_id"):
+        # Not moved to the blob store yet (see migrate_document_blobs)
+        if document.get("file_data_error"):
+            raise HTTPException(status_code=422, detail="Document content is corrupt and cannot be downloaded")
+        return StreamingResponse(
+            io.BytesIO(base64.b64decode(document["file_data"])),
+            media_type=document["file_type"],
+            headers={"Content-Disposition": f"attachment; filename={document['file_name']}"}
+        )
+    blob_id = document["blob_id"]
+    etag = f'"{blob_id}"'
+    headers = {
+        "ETag": etag,
+        "Cache-Control": DOCUMENT_CACHE_CONTROL,
+        "Accept-Ranges": "bytes",
+        "Content-Disposition": f"attachment; filename={document['file_name']}",
+    }
+    if etag_matches(request.headers.get("if-none-match"), etag):
+        return Response(status_code=304, headers=headers)
+    
+    size = await blob_store.size(blob_id)
+    byte_range = None
+    if_range = request.headers.get("if-range")
+    if not if_range or etag_matches(if_range, etag):
+        byte_range = parse_byte_range(request.headers.get("range"), size)
+    if byte_range is None:
+        return await blob_store.response(blob_id, document["file_type"], headers)
+    start, end = byte_range
+    headers["Content-Range"] = f"bytes {start}-{end}/{size}"
+    headers["Content-Length"] = str(end - start + 1)
     return StreamingResponse(
-        io.BytesIO(file_content),
-        media_type=document["file_type"],
-        headers={"Content-Disposition": f"attachment; filename={document['file_name']}"}
+        blob_store.read(blob_id, start, end - start + 1), status_code=206, media_type=document["file_type"], headers=headers
     )
 
 @api_router.delete("/vehicles/{vehicle_id}/documents/{document_id}")
@@ -2283,9 +4888,473 @@ async def delete_vehicle_document(request: Request, vehicle_id: str, document_id
     if not document:
         raise HTTPException(status_code=404, detail="Document not found")
     
-    await db.vehicle_documents.delete_one({"document_id": document_id})
+    result = await db.vehicle_documents.delete_one({"document_id": document_id})
+    if result.deleted_count and document.get("blob_id"):
+        await release_blob(document["blob_id"])
     return {"message": "Document deleted"}
 
+@api_router.get("/documents/storage-report")
+async def document_storage_report(request: Request):
+    """Space used by vehicle documents and saved by storing identical content once"""
+    await require_role(request, ["CRM", "DP"])
+    totals = await db.document_blobs.aggregate([
+        {"$match": {"ref_count": {"$gt": 0}}},
+        {"$group": {
+            "_id": None,
+            "blobs": {"$sum": 1},
+            "documents": {"$sum": "$ref_count"},
+            "stored_bytes": {"$sum": "$size"},
+            "logical_bytes": {"$sum": {"$multiply": ["$size", "$ref_count"]}},
+            "shared_blobs": {"$sum": {"$cond": [{"$gt": ["$ref_count", 1]}, 1, 0]}},
+        }},
+    ]).to_list(1)
+    report = totals[0] if totals else {"blobs": 0, "documents": 0, "stored_bytes": 0, "logical_bytes": 0, "shared_blobs": 0}
+    report.pop("_id", None)
+    report["saved_bytes"] = report["logical_bytes"] - report["stored_bytes"]
+    report["saved_percent"] = round(100 * report["saved_bytes"] / report["logical_bytes"], 1) if report["logical_bytes"] else 0.0
+    return report
+
+# ============== VEHICLE TIMELINE ==============
+
+# Appointments, reception check-ins and documents for one vehicle, newest
+# first. Appointments and check-ins are joined on the normalized reg / VIN
+# keys; a reschedule chain (appointments sharing a booking_id) is one event.
+# Event times are IST wall-clock strings ("YYYY-MM-DDTHH:MM"), the form
+# appointments and check-ins are entered in.
+
+TIMELINE_PAGE_SIZE = 50
+TIMELINE_SORT_FIELDS = ["at", "ref_id"]
+TIMELINE_APPOINTMENT_FIELDS = (
+    "appointment_id", "booking_id", "branch", "appointment_date", "appointment_time", "service_type",
+    "appointment_status", "allocated_sa", "current_km", "customer_name", "customer_phone", "is_rescheduled",
+    "reschedule_history", "created_at",
+)
+TIMELINE_RECEPTION_FIELDS = (
+    "entry_id", "vehicle_reception_time", "source", "status", "branch", "customer_name", "contact_no",
+    "linked_appointment_id", "created_by_name",
+)
+TIMELINE_DOCUMENT_FIELDS = ("document_id", "file_name", "file_type", "file_size", "document_type", "uploaded_at")
+
+def vehicle_key_match(vehicle: dict) -> dict:
+    """Match documents that carry the vehicle's reg or VIN key"""
+    keys = search_keys(vehicle.get("vehicle_reg_no"), None, vehicle.get("vin"))
+    clauses = [{key: keys[key]} for key in ("reg_key", "vin_rev") if keys[key]]
+    return {"$or": clauses} if clauses else {"_id": {"$exists": False}}
+
+def vehicle_timeline_pipeline(vehicle: dict, cursor: Optional[str], limit: int) -> List[dict]:
+    match = vehicle_key_match(vehicle)
+    vehicle_id = vehicle["vehicle_id"]
+    pipeline = [
+        {"$match": match},
+        {"$project": {"_id": 0, **{f: 1 for f in TIMELINE_APPOINTMENT_FIELDS}}},
+        {"$sort": {"appointment_date": 1, "appointment_time": 1, "created_at": 1}},
+        {"$group": {
+            "_id": {"$ifNull": ["$booking_id", "$appointment_id"]},
+            "latest": {"$last": "$$ROOT"},
+            "chain": {"$push": {
+                "appointment_id": "$appointment_id",
+                "appointment_date": "$appointment_date",
+                "appointment_time": "$appointment_time",
+                "appointment_status": "$appointment_status",
+            }},
+        }},
+        {"$project": {
+            "_id": 0,
+            "kind": {"$literal": "appointment"},
+            "at": {"$concat": [
+                {"$ifNull": ["$latest.appointment_date", ""]}, "T", {"$ifNull": ["$latest.appointment_time", ""]},
+            ]},
+            "ref_id": "$latest.appointment_id",
+            "data": "$latest",
+            "chain": 1,
+        }},
+        {"$unionWith": {"coll": "reception_entries", "pipeline": [
+            {"$match": match},
+            {"$project": {
+                "_id": 0,
+                "kind": {"$literal": "reception"},
+                "at": {"$ifNull": ["$vehicle_reception_time", ""]},
+                "ref_id": "$entry_id",
+                "data": {f: f"${f}" for f in TIMELINE_RECEPTION_FIELDS},
+            }},
+        ]}},
+        {"$unionWith": {"coll": "vehicle_documents", "pipeline": [
+            {"$match": {"vehicle_id": vehicle_id}},
+            {"$project": {
+                "_id": 0,
+                "kind": {"$literal": "document"},
+                # A malformed or missing uploaded_at sorts last instead of
+                # failing the whole request
+                "at": {"$ifNull": [{"$dateToString": {
+                    "date": {"$dateFromString": {"dateString": "$uploaded_at", "onError": None, "onNull": None}},
+                    "format": "%Y-%m-%dT%H:%M",
+                    "timezone": "+05:30",
+                }}, ""]},
+                "ref_id": "$document_id",
+                "data": {f: f"${f}" for f in TIMELINE_DOCUMENT_FIELDS},
+            }},
+        ]}},
+    ]
+    if cursor:
+        pipeline.append({"$match": keyset_filter(TIMELINE_SORT_FIELDS, decode_cursor(cursor), direction=-1)})
+    pipeline += [{"$sort": {f: -1 for f in TIMELINE_SORT_FIELDS}}, {"$limit": limit + 1}]
+    return pipeline
+
+@api_router.get("/vehicles/{vehicle_id}/timeline")
+async def get_vehicle_timeline(request: Request, response: Response, vehicle_id: str, cursor: str = None, limit: int = TIMELINE_PAGE_SIZE):
+    """Service history of a vehicle, newest first.
+
+    Each event has kind (appointment / reception / document), at, ref_id and
+    data; appointment events also carry their reschedule chain. Pages by
+    keyset through the X-Next-Cursor header.
+    """
+    await get_current_user(request)
+    limit = max(1, min(limit, 200))
+    vehicle = await db.vehicles.find_one({"vehicle_id": vehicle_id}, {"_id": 0, "vehicle_id": 1, "vehicle_reg_no": 1, "vin": 1})
+    if not vehicle:
+        raise HTTPException(status_code=404, detail="Vehicle not found")
+    events = await db.appointments.aggregate(vehicle_timeline_pipeline(vehicle, cursor, limit)).to_list(limit + 1)
+    if len(events) > limit:
+        events = events[:limit]
+        response.headers["X-Next-Cursor"] = encode_cursor([events[-1][f] for f in TIMELINE_SORT_FIELDS])
+    for event in events:
+        if event["kind"] == "document":
+            event["data"]["file_url"] = f"/api/vehicles/{vehicle_id}/documents/{event['ref_id']}/download"
+    return events
+
+# ============== CUSTOMERS ==============
+
+# One customer document per normalized phone number, merged from the
+# appointments, reception entries and vehicles written for it. Profile fields
+# are last-writer-wins (blanks never overwrite); vehicle regs and appointment
+# ids accumulate.
+
+CUSTOMER_BACKFILL_BATCH = 1000
+CUSTOMER_APPOINTMENT_LIMIT = 50
+CUSTOMER_PROFILE_FIELDS = ("customer_type", "company_name", "alternate_no", "address", "city", "state", "pin")
+
+def customer_profile(doc: dict) -> dict:
+    """Non-empty customer fields of an appointment, reception entry or vehicle"""
+    person = f'{doc.get("first_name") or ""} {doc.get("last_name") or ""}'.strip()
+    profile = {
+        "phone": doc.get("customer_phone") or doc.get("contact_no"),
+        "name": doc.get("customer_name") or person or doc.get("company_name"),
+        "email": doc.get("customer_email") or doc.get("email"),
+    }
+    profile.update({f: doc.get(f) for f in CUSTOMER_PROFILE_FIELDS})
+    return {k: v for k, v in profile.items() if v}
+
+def customer_upsert(doc: dict) -> Optional[UpdateOne]:
+    """Upsert merging one appointment / reception entry / vehicle into its customer"""
+    profile = customer_profile(doc)
+    phone_key = normalize_phone(profile.get("phone"))
+    if not phone_key:
+        return None
+    now = datetime.now(timezone.utc).isoformat()
+    update = {
+        "$set": {**profile, "updated_at": now},
+        "$setOnInsert": {"customer_id": f"cust_{uuid.uuid4().hex[:12]}", "created_at": now},
+    }
+    links = {}
+    reg = normalize_reg(doc.get("vehicle_reg_no") or doc.get("vehicle_reg"))
+    if reg:
+        links["vehicle_regs"] = reg
+    if doc.get("appointment_id"):
+        links["appointment_ids"] = doc["appointment_id"]
+    if links:
+        update["$addToSet"] = links
+    if doc.get("appointment_date"):
+        update["$max"] = {"last_appointment_date": doc["appointment_date"]}
+    return UpdateOne({"phone_key": phone_key}, update, upsert=True)
+
+async def sync_customer(doc: dict):
+    """Merge a freshly written document into the customers collection"""
+    op = customer_upsert(doc)
+    if op:
+        await db.customers.bulk_write([op])
+
+async def unlink_customer_appointment(phone: Optional[str], appointment_id: str):
+    """Drop an appointment from the customer it was filed under (phone changed)"""
+    phone_key = normalize_phone(phone)
+    if phone_key:
+        await db.customers.update_one({"phone_key": phone_key}, {"$pull": {"appointment_ids": appointment_id}})
+
+@rebuild_task("customers")
+async def backfill_customers():
+    """Rebuild customers from vehicles, reception entries and appointments, oldest writes first"""
+    counts = {}
+    for collection in ("vehicles", "reception_entries", "appointments"):
+        ops = []
+        counts[collection] = 0
+        cursor = db[collection].find({}, {"_id": 0}).sort("updated_at", 1).batch_size(CUSTOMER_BACKFILL_BATCH)
+        async for doc in cursor:
+            op = customer_upsert(doc)
+            if op:
+                ops.append(op)
+            if len(ops) >= CUSTOMER_BACKFILL_BATCH:
+                await db.customers.bulk_write(ops)
+                counts[collection] += len(ops)
+                ops = []
+        if ops:
+            await db.customers.bulk_write(ops)
+            counts[collection] += len(ops)
+    return counts
+
+@app.on_event("startup")
+async def queue_customer_backfill():
+    """Queue the customer backfill once if there is history but no customers yet"""
+    if await db.customers.find_one({}, {"_id": 1}):
+        return
+    history = (
+        await db.appointments.find_one({}, {"_id": 1})
+        or await db.reception_entries.find_one({}, {"_id": 1})
+        or await db.vehicles.find_one({}, {"_id": 1})
+    )
+    pending = await db.jobs.find_one({
+        "type": "rebuild", "params.target": "customers", "status": {"$in": ["queued", "running"]}
+    }, {"_id": 1})
+    if history and not pending:
+        await enqueue_job("rebuild", {"target": "customers"}, {"user_id": "system", "name": "System"})
+
+@api_router.get("/customers/{phone}")
+async def get_customer(request: Request, phone: str):
+    """Customer 360: profile, linked vehicles and most recent appointments"""
+    await get_current_user(request)
+    phone_key = normalize_phone(phone)
+    customer = await db.customers.find_one({"phone_key": phone_key}, {"_id": 0}) if phone_key else None
+    if not customer:
+        raise HTTPException(status_code=404, detail="Customer not found")
+
+    vehicles, appointments = await asyncio.gather(
+        db.vehicles.find({"reg_key": {"$in": customer.get("vehicle_regs", [])}}, {"_id": 0}).to_list(None),
+        db.appointments.find(
+            {"appointment_id": {"$in": customer.get("appointment_ids", [])}}, {"_id": 0}
+        ).sort([("appointment_date", -1), ("appointment_time", -1)]).to_list(CUSTOMER_APPOINTMENT_LIMIT),
+    )
+    customer["vehicles"] = vehicles
+    customer["appointments"] = appointments
+    return customer
+
+# ============== OMNI SEARCH ==============
+
+SEARCH_MIN_QUERY = 3
+SEARCH_BUDGET_MS = 50
+SEARCH_INDEX_REFRESH_SECONDS = 15
+SEARCH_TYPE_ORDER = {"appointment": 0, "vehicle": 1, "customer": 2}
+
+def search_term(value: Any) -> str:
+    """Lowercase alphanumerics only, so '#SILB0001' and 'silb 0001' compare equal"""
+    return re.sub(r"[^a-z0-9]", "", str(value or "").lower())
+
+def trigrams(term: str) -> set:
+    return {term[i:i + 3] for i in range(len(term) - 2)}
+
+class TrigramIndex:
+    """In-process trigram inverted index over appointments, vehicles and customers.
+    
+    Each entity has a set of normalized terms; a query matches an entity when
+    the query is a substring of one of its terms. Candidates come from
+    intersecting the posting sets of the query's trigrams.
+    """
+
+    def __init__(self):
+        self.entities = {}
+        self.postings = {}
+        self.ready = False
+        self.watermarks = {}
+
+    def upsert(self, key: str, entity_type: str, entity_id: str, data: dict, terms: List[Any]):
+        self.remove(key)
+        normalized = sorted({t for t in (search_term(v) for v in terms) if t})
+        grams = set()
+        for term in normalized:
+            grams |= trigrams(term)
+        self.entities[key] = {"type": entity_type, "id": entity_id, "data": data, "terms": normalized, "grams": grams}
+        for gram in grams:
+            self.postings.setdefault(gram, set()).add(key)
+
+    def remove(self, key: str):
+        entity = self.entities.pop(key, None)
+        if not entity:
+            return
+        for gram in entity["grams"]:
+            keys = self.postings.get(gram)
+            if keys is not None:
+                keys.discard(key)
+                if not keys:
+                    del self.postings[gram]
+
+    def search(self, q: str, limit: int = 20, budget_ms: int = SEARCH_BUDGET_MS, types: List[str] = None) -> dict:
+        started = time.perf_counter()
+        needle = search_term(q)
+        if len(needle) < SEARCH_MIN_QUERY:
+            return {"results": [], "truncated": False, "took_ms": 0}
+        
+        posting_sets = sorted((self.postings.get(g, set()) for g in trigrams(needle)), key=len)
+        candidates = set(posting_sets[0]).intersection(*posting_sets[1:]) if posting_sets else set()
+        
+        results = []
+        truncated = False
+        for n, key in enumerate(candidates):
+            if n % 256 == 0 and (time.perf_counter() - started) * 1000 > budget_ms:
+                truncated = True
+                break
+            entity = self.entities[key]
+            if types and entity["type"] not in types:
+                continue
+            score = 0
+            for term in entity["terms"]:
+                if term == needle:
+                    score = 100
+                    break
+                if term.startswith(needle):
+                    score = max(score, 75)
+                elif term.endswith(needle):
+                    score = max(score, 60)
+                elif needle in term:
+                    score = max(score, 40)
+            if score:
+                results.append({"type": entity["type"], "id": entity["id"], "score": score, "data": entity["data"]})
+        
+        results.sort(key=lambda r: (-r["score"], SEARCH_TYPE_ORDER.get(r["type"], 9), str(r["id"])))
+        return {
+            "results": results[:limit],
+            "truncated": truncated,
+            "took_ms": round((time.perf_counter() - started) * 1000, 2),
+        }
+
+search_index = TrigramIndex()
+
+def index_appointment(doc: dict):
+    """Add or refresh an appointment (and its customer) in the omni-search index"""
+    keys = appointment_search_keys(doc)
+    reg = doc.get("vehicle_reg_no") or doc.get("vehicle_reg") or ""
+    search_index.upsert(
+        f"appointment:{doc['appointment_id']}", "appointment", doc["appointment_id"],
+        {
+            "booking_id": doc.get("booking_id"),
+            "customer_name": doc.get("customer_name"),
+            "customer_phone": doc.get("customer_phone"),
+            "vehicle_reg_no": reg,
+            "appointment_date": doc.get("appointment_date"),
+            "appointment_time": doc.get("appointment_time"),
+            "appointment_status": doc.get("appointment_status"),
+            "branch": doc.get("branch"),
+        },
+        [doc.get("booking_id"), doc.get("customer_name"), *(doc.get("customer_name") or "").split(),
+         keys["reg_key"], keys["phone_key"]],
+    )
+    index_customer(keys["phone_key"], doc.get("customer_name"), reg)
+
+def vehicle_index_key(doc: dict) -> str:
+    return f"vehicle:{doc.get('vehicle_id') or normalize_reg(doc.get('vehicle_reg_no'))}"
+
+def index_vehicle(doc: dict):
+    """Add or refresh a vehicle (and its customer) in the omni-search index"""
+    keys = vehicle_search_keys(doc)
+    if not keys["reg_key"]:
+        return
+    name = (
+        doc.get("customer_name")
+        or f'{doc.get("first_name", "")} {doc.get("last_name", "")}'.strip()
+        or doc.get("company_name")
+    )
+    search_index.upsert(
+        vehicle_index_key(doc), "vehicle", doc.get("vehicle_id") or doc.get("vehicle_reg_no"),
+        {
+            "vehicle_id": doc.get("vehicle_id"),
+            "vehicle_reg_no": doc.get("vehicle_reg_no"),
+            "vin": doc.get("vin"),
+            "brand": doc.get("brand"),
+            "make": doc.get("make"),
+            "model": doc.get("model"),
+            "customer_name": name,
+            "customer_phone": doc.get("customer_phone") or doc.get("contact_no"),
+        },
+        [keys["reg_key"], doc.get("vin"), doc.get("engine_no"), name, *(name or "").split(),
+         keys["phone_key"], doc.get("make"), doc.get("model")],
+    )
+    index_customer(keys["phone_key"], name, doc.get("vehicle_reg_no"))
+
+def index_customer(phone_key: str, name: Optional[str], reg: Optional[str]):
+    """Merge a name / vehicle sighting into the customer entity for a phone number"""
+    if not phone_key:
+        return
+    key = f"customer:{phone_key}"
+    existing = search_index.entities.get(key)
+    data = dict(existing["data"]) if existing else {"phone": phone_key, "names": [], "vehicles": []}
+    if name and name not in data["names"]:
+        data["names"] = data["names"] + [name]
+    if reg and reg not in data["vehicles"]:
+        data["vehicles"] = data["vehicles"] + [reg]
+    terms = [phone_key, *data["names"], *[w for n in data["names"] for w in n.split()]]
+    search_index.upsert(key, "customer", phone_key, data, terms)
+
+def index_reception_entry(doc: dict):
+    name = doc.get("customer_name") or doc.get("company_name")
+    index_customer(normalize_phone(doc.get("contact_no")), name, doc.get("vehicle_reg_no"))
+
+SEARCH_INDEX_SOURCES = (
+    ("appointments", index_appointment),
+    ("vehicles", index_vehicle),
+    ("reception_entries", index_reception_entry),
+)
+
+async def refresh_search_index():
+    """Apply writes (possibly made by other workers) since each collection's watermark.
+    
+    Like the change feed, each pass stops CHANGE_FEED_SAFETY_LAG_SECONDS short
+    of now so a write still committing with an earlier timestamp is picked up
+    next time. The first pass also takes legacy rows that have no updated_at.
+    """
+    upper = (datetime.now(timezone.utc) - timedelta(seconds=CHANGE_FEED_SAFETY_LAG_SECONDS)).isoformat()
+    for collection, index_doc in SEARCH_INDEX_SOURCES:
+        since = search_index.watermarks.get(collection)
+        window = {"updated_at": {"$gte": since or "", "$lt": upper}}
+        query = window if since is not None else {"$or": [window, {"updated_at": None}]}
+        async for doc in db[collection].find(query, {"_id": 0}):
+            index_doc(doc)
+        search_index.watermarks[collection] = upper
+    
+    since = search_index.watermarks.get("deleted_records", "")
+    async for tomb in db.deleted_records.find({"deleted_at": {"$gte": since, "$lt": upper}}, {"_id": 0}):
+        keys = tomb.get("keys", {})
+        if tomb["collection"] == "appointments" and keys.get("appointment_id"):
+            search_index.remove(f"appointment:{keys['appointment_id']}")
+        elif tomb["collection"] == "vehicles":
+            search_index.remove(vehicle_index_key(keys))
+    search_index.watermarks["deleted_records"] = upper
+
+async def search_index_loop():
+    """Background task: build the omni-search index, then keep it refreshed"""
+    while True:
+        try:
+            started = time.perf_counter()
+            await refresh_search_index()
+            if not search_index.ready:
+                search_index.ready = True
+                logger.info(
+                    f"Search index built: {len(search_index.entities)} entities in "
+                    f"{(time.perf_counter() - started):.1f} s"
+                )
+        except Exception as e:
+            logger.error(f"Search index refresh error: {e}")
+        await asyncio.sleep(SEARCH_INDEX_REFRESH_SECONDS)
+
+@app.on_event("startup")
+async def start_search_index():
+    asyncio.create_task(search_index_loop())
+
+@api_router.get("/search")
+async def omni_search(request: Request, q: str = "", limit: int = 20, types: str = None):
+    """Ranked search across appointments, vehicles, customers and booking IDs"""
+    await get_current_user(request)
+    limit = max(1, min(limit, 100))
+    type_list = [t for t in types.split(",") if t] if types else None
+    result = search_index.search(q, limit=limit, types=type_list)
+    result["index_ready"] = search_index.ready
+    return result
+
 # ============== ROOT ROUTE ==============
 
 @api_router.get("/")
@@ -2301,6 +5370,7 @@ app.add_middleware(
     allow_origins=os.environ.get('CORS_ORIGINS', '*').split(','),
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=["X-Next-Cursor", "X-Total-Count", "ETag", "Content-Range", "Accept-Ranges"],
 )
 
 @app.on_event("shutdown")
@@ -236,6 +236,17 @@ class TestSettingsAPI:
             assert sa in data['service_advisors'], f"SA {sa} not in settings"
         
         print(f"SAs match data: {data['service_advisors']}")
+    
+    def test_settings_update_visible_immediately(self):
+        """PUT /api/settings invalidates the cached copy for the next read"""
+        original = self.session.get(f"{BASE_URL}/api/settings").json()["sources"]
+        updated = original + ["TEST_SOURCE"]
+        response = self.session.put(f"{BASE_URL}/api/settings", json={"sources": updated})
+        assert response.status_code == 200
+        try:
+            assert self.session.get(f"{BASE_URL}/api/settings").json()["sources"] == updated
+        finally:
+            self.session.put(f"{BASE_URL}/api/settings", json={"sources": original})
 
 
 class TestCREsAPI:
@@ -268,5 +279,55 @@ class TestCREsAPI:
         print(f"CREs loaded: {[c['name'] for c in data]}")
 
 
+
+class TestTasksAPI:
+    """Task inbox tests"""
+    
+    @pytest.fixture(autouse=True)
+    def setup_session(self):
+        """Setup authenticated session"""
+        self.session = requests.Session()
+        login_response = self.session.post(f"{BASE_URL}/api/auth/login", json={
+            "username": "admin",
+            "password": "admin"
+        })
+        assert login_response.status_code == 200
+    
+    def test_tasks_sorted_by_appointment(self):
+        """GET /api/tasks returns tasks with appointment_info, ordered by appointment date/time"""
+        response = self.session.get(f"{BASE_URL}/api/tasks?status=pending")
+        assert response.status_code == 200
+        tasks = response.json()
+        keys = [
+            (t.get("appointment_info", {}).get("appointment_date", "9999-12-31"),
+             t.get("appointment_info", {}).get("appointment_time", ""))
+            for t in tasks
+        ]
+        assert keys == sorted(keys), "Tasks should be sorted by appointment date and time"
+        for task in tasks:
+            assert "sort_date" not in task
+    
+    def test_tasks_keyset_pagination(self):
+        """Following X-Next-Cursor pages through tasks without repeats"""
+        seen = []
+        cursor = None
+        for _ in range(50):
+            params = {"status": "pending", "limit": 2}
+            if cursor:
+                params["cursor"] = cursor
+            response = self.session.get(f"{BASE_URL}/api/tasks", params=params)
+            assert response.status_code == 200
+            seen.extend(t["task_id"] for t in response.json())
+            cursor = response.headers.get("X-Next-Cursor")
+            if not cursor:
+                break
+        assert len(seen) == len(set(seen)), "Pages should not overlap"
+    
+    def test_tasks_invalid_cursor(self):
+        """A malformed cursor is rejected"""
+        response = self.session.get(f"{BASE_URL}/api/tasks?cursor=not-a-cursor")
+        assert response.status_code == 400
+
+
 if __name__ == "__main__":
     pytest.main([__file__, "-v"])
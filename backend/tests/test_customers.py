@@ -0,0 +1,49 @@
+"""
+Backend API Tests for the Customer master
+Tests: GET /api/customers/{phone} profile with linked vehicles and appointments
+"""
+import pytest
+import requests
+import os
+
+BASE_URL = os.environ.get('REACT_APP_BACKEND_URL', '').rstrip('/')
+
+
+class TestCustomers:
+    """Customer 360 endpoint tests"""
+    
+    @pytest.fixture(autouse=True)
+    def setup_session(self):
+        """Setup authenticated session"""
+        self.session = requests.Session()
+        login_response = self.session.post(f"{BASE_URL}/api/auth/login", json={
+            "username": "admin",
+            "password": "admin"
+        })
+        assert login_response.status_code == 200, f"Login failed: {login_response.text}"
+    
+    def test_customer_from_appointment(self):
+        """A customer's appointments are linked under their normalized phone"""
+        appts = self.session.get(f"{BASE_URL}/api/appointments?view=upcoming").json()
+        if not appts:
+            pytest.skip("No appointments to look up")
+        appt = appts[0]
+        phone = "+91 " + appt["customer_phone"]
+        response = self.session.get(f"{BASE_URL}/api/customers/{phone}")
+        assert response.status_code == 200, f"Customer lookup failed: {response.text}"
+        data = response.json()
+        assert data["phone_key"] == appt["customer_phone"][-10:]
+        assert appt["appointment_id"] in data["appointment_ids"]
+        assert isinstance(data["vehicles"], list)
+        assert isinstance(data["appointments"], list)
+        print(f"Customer {data['name']}: {len(data['appointment_ids'])} appointments, {len(data['vehicle_regs'])} vehicles")
+    
+    def test_customer_not_found(self):
+        """Unknown phone returns 404"""
+        response = self.session.get(f"{BASE_URL}/api/customers/0000000000")
+        assert response.status_code == 404
+    
+    def test_customer_requires_auth(self):
+        """Customer lookup requires authentication"""
+        response = requests.get(f"{BASE_URL}/api/customers/9876543210")
+        assert response.status_code == 401
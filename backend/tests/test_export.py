@@ -0,0 +1,153 @@
+"""
+Backend API Tests for Export functionality
+Tests: streamed CSV export with a fixed column schema, Parquet/XLSX exports per collection,
+delta export since a watermark
+"""
+import csv
+import io
+import pytest
+import requests
+import os
+import time
+from datetime import datetime, timedelta, timezone
+
+BASE_URL = os.environ.get('REACT_APP_BACKEND_URL', '').rstrip('/')
+
+
+class TestExportAPI:
+    """Export endpoint tests"""
+    
+    @pytest.fixture(autouse=True)
+    def setup_session(self):
+        """Setup authenticated session"""
+        self.session = requests.Session()
+        login_response = self.session.post(f"{BASE_URL}/api/auth/login", json={
+            "username": "admin",
+            "password": "admin"
+        })
+        assert login_response.status_code == 200, f"Login failed: {login_response.text}"
+    
+    def test_export_csv_has_stable_header(self):
+        """GET /api/export/csv should use the declared column schema for every row"""
+        response = self.session.get(f"{BASE_URL}/api/export/csv?view=all")
+        if response.status_code == 404:
+            pytest.skip("No appointments to export")
+        assert response.status_code == 200, f"Export failed: {response.text}"
+        assert response.headers["content-type"].startswith("text/csv")
+        
+        reader = csv.DictReader(io.StringIO(response.text))
+        assert reader.fieldnames[0] == "appointment_id"
+        assert "vehicle_reg_no" in reader.fieldnames
+        assert "reschedule_history" in reader.fieldnames
+        rows = list(reader)
+        assert len(rows) > 0
+        for row in rows:
+            assert None not in row, f"Row has values outside the header: {row}"
+        print(f"Exported {len(rows)} appointments")
+    
+    def test_export_csv_includes_seeded_appointments(self):
+        """Seeded appointments (vehicle_reg field) should export under vehicle_reg_no"""
+        response = self.session.get(f"{BASE_URL}/api/export/csv?view=all")
+        if response.status_code == 404:
+            pytest.skip("No appointments to export")
+        rows = list(csv.DictReader(io.StringIO(response.text)))
+        seeded = [r for r in rows if r["appointment_id"].startswith("apt_up_")]
+        for row in seeded:
+            assert row["vehicle_reg_no"], f"Seeded row lost its reg no: {row['appointment_id']}"
+    
+    def test_export_csv_requires_crm(self):
+        """Unauthenticated export should be rejected"""
+        response = requests.get(f"{BASE_URL}/api/export/csv?view=all")
+        assert response.status_code == 401
+    
+    @pytest.mark.parametrize("source", ["appointments", "reception_entries", "vehicles", "activity_logs"])
+    def test_export_sources_as_csv(self, source):
+        """GET /api/export should export every supported collection"""
+        response = self.session.get(f"{BASE_URL}/api/export?source={source}&format=csv")
+        assert response.status_code == 200, f"Export of {source} failed: {response.text}"
+        header = response.text.splitlines()[0]
+        assert header, f"{source} export has no header"
+    
+    def test_export_parquet_is_typed(self):
+        """Parquet export should carry typed columns"""
+        pd = pytest.importorskip("pandas")
+        response = self.session.get(f"{BASE_URL}/api/export?source=appointments&format=parquet")
+        assert response.status_code == 200, f"Parquet export failed: {response.text}"
+        frame = pd.read_parquet(io.BytesIO(response.content))
+        assert str(frame["sl_no"].dtype) == "Int64"
+        assert str(frame["priority_customer"].dtype) == "boolean"
+        print(f"Parquet export has {len(frame)} rows")
+    
+    def test_export_xlsx(self):
+        """XLSX export should be a valid workbook"""
+        response = self.session.get(f"{BASE_URL}/api/export?source=vehicles&format=xlsx")
+        assert response.status_code == 200, f"XLSX export failed: {response.text}"
+        assert response.content[:2] == b"PK", "XLSX should be a zip container"
+    
+    def test_export_rejects_unknown_format(self):
+        """Unknown formats and sources should be rejected"""
+        response = self.session.get(f"{BASE_URL}/api/export?source=appointments&format=json")
+        assert response.status_code == 400
+        response = self.session.get(f"{BASE_URL}/api/export?source=users&format=csv")
+        assert response.status_code == 400
+    
+    def test_export_rejects_bad_dates(self):
+        """Malformed date bounds are a 400, not a server error"""
+        response = self.session.get(f"{BASE_URL}/api/export?source=appointments&format=csv&date_to=31-12-2024")
+        assert response.status_code == 400
+        response = self.session.get(f"{BASE_URL}/api/export?source=appointments&format=parquet&date_from=soon")
+        assert response.status_code == 400
+    
+    def test_export_changes_watermark(self):
+        """GET /api/export/changes pages through changes with a watermark"""
+        response = self.session.get(f"{BASE_URL}/api/export/changes?limit=50")
+        assert response.status_code == 200, f"Changes failed: {response.text}"
+        data = response.json()
+        assert set(data["changes"]) == {"appointments", "reception_entries", "vehicles"}
+        assert "tombstones" in data
+        assert data["next_watermark"]
+        
+        # Following the watermark never returns a change twice
+        seen = {(c, d.get("updated_at"), str(d)) for c, docs in data["changes"].items() for d in docs}
+        follow = self.session.get(f"{BASE_URL}/api/export/changes", params={"since": data["next_watermark"]})
+        assert follow.status_code == 200
+        for collection, docs in follow.json()["changes"].items():
+            for doc in docs:
+                assert (collection, doc.get("updated_at"), str(doc)) not in seen
+    
+    def test_export_changes_pages_through_one_timestamp(self):
+        """More rows than `limit` sharing one updated_at still page to the end"""
+        since = (datetime.now(timezone.utc) - timedelta(seconds=1)).isoformat()
+        suffix = str(int(time.time()))[-6:]
+        regs = [f"TESTTIE{suffix}{i}" for i in range(5)]
+        csv_body = "\n".join(["vehicle_reg_no,vin,brand,make"] + [f"{r},{r}VIN,other,Make" for r in regs])
+        response = self.session.post(
+            f"{BASE_URL}/api/vehicles/import", files={"file": ("vehicles.csv", csv_body, "text/csv")}
+        )
+        assert response.status_code == 202, f"Import failed: {response.text}"
+        job_id = response.json()["job_id"]
+        for _ in range(60):
+            job = self.session.get(f"{BASE_URL}/api/jobs/{job_id}").json()
+            if job["status"] not in ("queued", "running"):
+                break
+            time.sleep(1)
+        assert job["status"] == "succeeded", f"Import job failed: {job.get('error')}"
+        time.sleep(6)  # past the feed's safety lag
+        
+        found = []
+        for _ in range(50):
+            page = self.session.get(f"{BASE_URL}/api/export/changes", params={"since": since, "limit": 2}).json()
+            found += [v["vehicle_reg_no"] for v in page["changes"]["vehicles"] if v["vehicle_reg_no"] in regs]
+            since = page["next_watermark"]
+            if not page["has_more"]:
+                break
+        else:
+            pytest.fail("Change feed did not reach the end")
+        assert sorted(found) == sorted(regs)
+        for v in self.session.get(f"{BASE_URL}/api/vehicles", params={"search": f"TESTTIE{suffix}"}).json():
+            self.session.delete(f"{BASE_URL}/api/vehicles/{v['vehicle_id']}")
+    
+    def test_export_changes_rejects_bad_watermark(self):
+        """Malformed watermarks are rejected"""
+        response = self.session.get(f"{BASE_URL}/api/export/changes?since=yesterday")
+        assert response.status_code == 400
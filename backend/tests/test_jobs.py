@@ -0,0 +1,144 @@
+"""
+Backend API Tests for Background Jobs
+Tests: queue an export job, poll status/progress, download the artifact, vehicle import, validation
+"""
+import time
+import pytest
+import requests
+import os
+
+BASE_URL = os.environ.get('REACT_APP_BACKEND_URL', '').rstrip('/')
+
+
+class TestJobsAPI:
+    """Background job queue tests"""
+    
+    @pytest.fixture(autouse=True)
+    def setup_session(self):
+        """Setup authenticated session"""
+        self.session = requests.Session()
+        login_response = self.session.post(f"{BASE_URL}/api/auth/login", json={
+            "username": "admin",
+            "password": "admin"
+        })
+        assert login_response.status_code == 200, f"Login failed: {login_response.text}"
+    
+    def wait_for_job(self, job_id, timeout=60):
+        """Poll a job until it leaves queued/running"""
+        deadline = time.time() + timeout
+        while time.time() < deadline:
+            response = self.session.get(f"{BASE_URL}/api/jobs/{job_id}")
+            assert response.status_code == 200, f"Poll failed: {response.text}"
+            job = response.json()
+            if job["status"] not in ("queued", "running"):
+                return job
+            time.sleep(1)
+        pytest.fail(f"Job {job_id} did not finish in {timeout}s")
+    
+    def test_export_job_lifecycle(self):
+        """POST /api/jobs export -> poll -> download"""
+        response = self.session.post(f"{BASE_URL}/api/jobs", json={
+            "type": "export",
+            "params": {"source": "vehicles", "format": "csv"}
+        })
+        assert response.status_code == 202, f"Create job failed: {response.text}"
+        job = response.json()
+        assert job["status"] == "queued"
+        assert "lease_owner" not in job
+        
+        job = self.wait_for_job(job["job_id"])
+        assert job["status"] == "succeeded", f"Job failed: {job.get('error')}"
+        assert job["progress"] == 100
+        assert "artifact_path" not in job["result"]
+        
+        download = self.session.get(f"{BASE_URL}{job['download_url']}")
+        assert download.status_code == 200
+        assert download.text.startswith("vehicle_id,")
+        print(f"Export job {job['job_id']} produced {job['result']['rows']} rows")
+    
+    def test_rebuild_job(self):
+        """POST /api/jobs rebuild of indexes should succeed"""
+        response = self.session.post(f"{BASE_URL}/api/jobs", json={
+            "type": "rebuild",
+            "params": {"target": "indexes"}
+        })
+        assert response.status_code == 202, f"Create job failed: {response.text}"
+        job = self.wait_for_job(response.json()["job_id"])
+        assert job["status"] == "succeeded", f"Job failed: {job.get('error')}"
+    
+    def test_job_validation(self):
+        """Unknown job types, sources and rebuild targets are rejected"""
+        response = self.session.post(f"{BASE_URL}/api/jobs", json={"type": "delete_everything"})
+        assert response.status_code == 400
+        response = self.session.post(f"{BASE_URL}/api/jobs", json={"type": "export", "params": {"source": "users"}})
+        assert response.status_code == 400
+        response = self.session.post(f"{BASE_URL}/api/jobs", json={"type": "rebuild", "params": {"target": "bogus"}})
+        assert response.status_code == 400
+    
+    def test_vehicle_import_job(self):
+        """POST /api/vehicles/import inserts valid rows and reports rejected ones"""
+        suffix = str(int(time.time()))[-6:]
+        csv_body = "\n".join([
+            "vehicle_reg_no,vin,brand,make,model",
+            f"TESTIMP{suffix},TESTIMPVIN{suffix},other,Honda,City",
+            f"TESTIMP{suffix},TESTIMPVIN{suffix}X,other,Honda,City",
+            f"TESTIMPB{suffix},,other,Honda,City",
+        ])
+        response = self.session.post(
+            f"{BASE_URL}/api/vehicles/import",
+            files={"file": ("vehicles.csv", csv_body, "text/csv")},
+        )
+        assert response.status_code == 202, f"Import failed: {response.text}"
+        job = self.wait_for_job(response.json()["job_id"])
+        assert job["status"] == "succeeded", f"Job failed: {job.get('error')}"
+        result = job["result"]
+        assert result["inserted"] == 1
+        assert [e["row"] for e in result["errors"]] == [3, 4]
+        assert "download_url" in job
+        
+        vehicles = self.session.get(f"{BASE_URL}/api/vehicles", params={"search": f"TESTIMP{suffix}", "brand": "other"}).json()
+        for v in vehicles:
+            self.session.delete(f"{BASE_URL}/api/vehicles/{v['vehicle_id']}")
+    
+    def test_vehicle_import_xlsx_rows_per_sheet(self):
+        """XLSX errors carry the sheet name and the row number within that sheet"""
+        from io import BytesIO
+        from openpyxl import Workbook
+
+        suffix = str(int(time.time()))[-6:]
+        workbook = Workbook()
+        first = workbook.active
+        first.title = "North"
+        second = workbook.create_sheet("South")
+        for sheet, tag in ((first, "N"), (second, "S")):
+            sheet.append(["vehicle_reg_no", "vin", "brand", "make", "model"])
+            sheet.append([f"TESTX{tag}{suffix}", f"TESTXVIN{tag}{suffix}", "other", "Honda", "City"])
+            sheet.append(["", f"TESTXVIN{tag}{suffix}B", "other", "Honda", "City"])
+        body = BytesIO()
+        workbook.save(body)
+        response = self.session.post(
+            f"{BASE_URL}/api/vehicles/import",
+            files={"file": ("vehicles.xlsx", body.getvalue(), "application/vnd.openxmlformats-officedocument.spreadsheetml.sheet")},
+        )
+        assert response.status_code == 202, f"Import failed: {response.text}"
+        job = self.wait_for_job(response.json()["job_id"])
+        assert job["status"] == "succeeded", f"Job failed: {job.get('error')}"
+        assert [(e["sheet"], e["row"]) for e in job["result"]["errors"]] == [("North", 3), ("South", 3)]
+
+        vehicles = self.session.get(f"{BASE_URL}/api/vehicles", params={"search": "TESTX", "brand": "other"}).json()
+        for v in vehicles:
+            if v["vehicle_reg_no"].endswith(suffix):
+                self.session.delete(f"{BASE_URL}/api/vehicles/{v['vehicle_id']}")
+
+    def test_vehicle_import_rejects_file_type(self):
+        """Only CSV and XLSX vehicle files are accepted"""
+        response = self.session.post(
+            f"{BASE_URL}/api/vehicles/import",
+            files={"file": ("vehicles.txt", "x", "text/plain")},
+        )
+        assert response.status_code == 400
+    
+    def test_unknown_job_404(self):
+        """GET /api/jobs/{id} for a missing job returns 404"""
+        response = self.session.get(f"{BASE_URL}/api/jobs/job_doesnotexist")
+        assert response.status_code == 404
@@ -8,9 +8,11 @@ Test cases for:
 import pytest
 import requests
 import os
-from datetime import datetime, timedelta
+import time
+from datetime import datetime, timedelta, timezone
 
 BASE_URL = os.environ.get('REACT_APP_BACKEND_URL', '').rstrip('/')
+IST = timezone(timedelta(hours=5, minutes=30))
 
 class TestNoShowEndpoint:
     """Tests for the auto no-show cron endpoint"""
@@ -45,6 +47,65 @@ class TestNoShowEndpoint:
         assert yesterday in data["message"]
         print(f"No-show with date param: {data}")
     
+    def test_mark_noshow_rerun_is_noop(self):
+        """Running the sweep twice for the same date marks nothing the second time"""
+        yesterday = (datetime.now() - timedelta(days=1)).strftime("%Y-%m-%d")
+        self.session.post(f"{BASE_URL}/api/appointments/mark-no-show?date={yesterday}")
+        response = self.session.post(f"{BASE_URL}/api/appointments/mark-no-show?date={yesterday}")
+        assert response.status_code == 200
+        assert response.json()["message"].startswith("Marked 0 ")
+    
+    def test_noshow_sweep_is_scheduled(self):
+        """The no-show sweep is registered on the scheduler with persisted state"""
+        response = self.session.get(f"{BASE_URL}/api/scheduler/jobs")
+        assert response.status_code == 200, f"Scheduler jobs failed: {response.text}"
+        jobs = {j["name"]: j for j in response.json()}
+        assert "no_show_sweep" in jobs
+        assert jobs["no_show_sweep"]["cron"] == "0 19 * * *"
+        assert jobs["no_show_sweep"]["next_run_at"]
+        assert "n_minus_1_tasks" in jobs, "Nightly N-1 task generation should be scheduled"
+    
+    def test_manual_noshow_sweep_targets_last_slot(self):
+        """A manual trigger re-runs the last 7 PM IST slot, never a slot still to come"""
+        response = self.session.post(f"{BASE_URL}/api/scheduler/jobs/no_show_sweep/run")
+        assert response.status_code == 200, f"Trigger failed: {response.text}"
+        slot = datetime.fromisoformat(response.json()["scheduled_for"]).astimezone(IST)
+        assert (slot.hour, slot.minute) == (19, 0)
+        assert slot <= datetime.now(IST)
+    
+    def run_scheduled_job(self, name, timeout=90):
+        """Trigger a scheduled job and wait for a scheduler worker to finish it"""
+        response = self.session.post(f"{BASE_URL}/api/scheduler/jobs/{name}/run")
+        assert response.status_code == 200, f"Trigger failed: {response.text}"
+        slot = response.json()["scheduled_for"]
+        deadline = time.time() + timeout
+        while time.time() < deadline:
+            jobs = {j["name"]: j for j in self.session.get(f"{BASE_URL}/api/scheduler/jobs").json()}
+            job = jobs[name]
+            if job["next_run_at"] > slot and not job.get("lease_owner"):
+                assert job["last_status"] == "succeeded", f"{name} failed: {job.get('last_error')}"
+                return job["last_result"]
+            time.sleep(2)
+        pytest.fail(f"{name} did not run within {timeout}s")
+    
+    def test_n_minus_1_task_job_is_idempotent(self):
+        """Re-running the N-1 task job creates no further tasks"""
+        first = self.run_scheduled_job("n_minus_1_tasks")
+        before = self.n_minus_1_task_ids(first["date"])
+        second = self.run_scheduled_job("n_minus_1_tasks")
+        assert second["date"] == first["date"]
+        assert second["created"] == 0
+        assert self.n_minus_1_task_ids(second["date"]) == before
+    
+    def n_minus_1_task_ids(self, date):
+        """Pending N-1 task ids for appointments on a date"""
+        tasks = self.session.get(f"{BASE_URL}/api/tasks", params={"limit": 500}).json()
+        return sorted(
+            t["task_id"] for t in tasks
+            if t["task_type"] == "n_minus_1_reminder"
+            and (t.get("appointment_info") or {}).get("appointment_date") == date
+        )
+    
     def test_mark_noshow_requires_auth(self):
         """POST /api/appointments/mark-no-show requires authentication"""
         # Create new session without auth
@@ -5,7 +5,8 @@ Tests: Search vehicle, Check duplicate, Create entry, Get entries, Get single en
 import pytest
 import requests
 import os
-from datetime import datetime
+import time
+from datetime import datetime, timedelta
 
 BASE_URL = os.environ.get('REACT_APP_BACKEND_URL', '').rstrip('/')
 
@@ -52,6 +53,80 @@ class TestReceptionModule:
         assert len(results) == 0, "Short query should return empty results"
         print("Short query correctly returns empty results")
     
+    def test_reception_search_vehicle_normalizes_input(self, session):
+        """Lowercase / spaced input matches the same vehicles as the normalized form"""
+        plain = session.get(f"{BASE_URL}/api/reception/search-vehicle?q=WB74").json()
+        spaced = session.get(f"{BASE_URL}/api/reception/search-vehicle", params={"q": "wb 74"}).json()
+        assert plain == spaced, "Search should ignore case and spaces"
+    
+    def test_reception_search_vehicle_regex_input_is_safe(self, session):
+        """Regex metacharacters in the query are not interpreted"""
+        response = session.get(f"{BASE_URL}/api/reception/search-vehicle", params={"q": "(.*"})
+        assert response.status_code == 200, f"Search failed: {response.text}"
+        assert response.json() == []
+    
+    @pytest.fixture(scope="class")
+    def federated_data(self, session):
+        """Vehicles TF<n>A1, TF<n>A2, TF<n>B1 plus two appointments for TF<n>A1 on different dates"""
+        prefix = f"TF{str(int(time.time()))[-6:]}"
+        vehicle_ids = []
+        for reg in (f"{prefix}A1", f"{prefix}A2", f"{prefix}B1"):
+            response = session.post(f"{BASE_URL}/api/vehicles", json={
+                "vehicle_reg_no": reg, "vin": f"{reg}VIN", "make": "Make", "brand": "other"
+            })
+            assert response.status_code == 201, f"Create vehicle failed: {response.text}"
+            vehicle_ids.append(response.json()["vehicle_id"])
+        appointment_ids = []
+        for days in (20, 30):
+            response = session.post(f"{BASE_URL}/api/appointments", json={
+                "branch": "Test Branch",
+                "appointment_date": (datetime.now() + timedelta(days=days)).strftime("%Y-%m-%d"),
+                "appointment_time": "10:00",
+                "source": "Walk-in",
+                "customer_name": "TEST Federated",
+                "customer_phone": "9000000000",
+                "vehicle_reg_no": f"{prefix}A1",
+                "service_type": "General Service",
+            })
+            assert response.status_code == 201, f"Create appointment failed: {response.text}"
+            appointment_ids.append(response.json()["appointment_id"])
+        yield {"prefix": prefix, "appointment_ids": appointment_ids}
+        for vehicle_id in vehicle_ids:
+            session.delete(f"{BASE_URL}/api/vehicles/{vehicle_id}")
+        for appointment_id in appointment_ids:
+            session.put(f"{BASE_URL}/api/appointments/{appointment_id}", json={"appointment_status": "Cancelled"})
+    
+    def test_reception_search_vehicle_merges_sources(self, session, federated_data):
+        """Appointment and vehicle matches are merged by (reg, VIN), appointments first, newest first"""
+        prefix = federated_data["prefix"]
+        results = session.get(f"{BASE_URL}/api/reception/search-vehicle", params={"q": prefix}).json()
+        assert len(results) == 4, f"Both appointments share (reg, VIN) and should merge: {results}"
+        assert (results[0]["source"], results[0]["vehicle_reg_no"]) == ("appointment", f"{prefix}A1")
+        assert results[0]["appointment_id"] == federated_data["appointment_ids"][1], "Latest appointment should win the merge"
+        assert [r["source"] for r in results[1:]] == ["vehicle_db"] * 3
+        assert sorted(r["vehicle_reg_no"] for r in results[1:]) == [f"{prefix}A1", f"{prefix}A2", f"{prefix}B1"]
+    
+    def test_reception_search_vehicle_narrowed_matches_cold(self, session, federated_data):
+        """A query narrowed from a cached prefix returns what the same query returns cold"""
+        prefix = federated_data["prefix"]
+        
+        def clear_cache():
+            # Any vehicle write clears the search cache
+            created = session.post(f"{BASE_URL}/api/vehicles", json={
+                "vehicle_reg_no": f"{prefix}Z9", "make": "Make", "brand": "other"
+            })
+            assert created.status_code == 201, f"Create vehicle failed: {created.text}"
+            session.delete(f"{BASE_URL}/api/vehicles/{created.json()['vehicle_id']}")
+        
+        clear_cache()
+        cold = session.get(f"{BASE_URL}/api/reception/search-vehicle", params={"q": f"{prefix}A"}).json()
+        assert sorted(r["vehicle_reg_no"] for r in cold if r["source"] == "vehicle_db") == [f"{prefix}A1", f"{prefix}A2"]
+        
+        clear_cache()
+        session.get(f"{BASE_URL}/api/reception/search-vehicle", params={"q": prefix})
+        narrowed = session.get(f"{BASE_URL}/api/reception/search-vehicle", params={"q": f"{prefix}A"}).json()
+        assert narrowed == cold
+    
     def test_reception_check_duplicate_non_existing(self, session):
         """Test duplicate check for non-existing vehicle"""
         response = session.get(f"{BASE_URL}/api/reception/check-duplicate?reg_no=TESTNONEXIST123&vin=TESTVIN123")
@@ -61,6 +136,23 @@ class TestReceptionModule:
         assert "duplicate_reg" in data, "Should have duplicate_reg field"
         assert "duplicate_vin" in data, "Should have duplicate_vin field"
     
+    def test_reception_check_duplicates_batch(self, session):
+        """Test batch duplicate check returns one verdict per item"""
+        response = session.post(f"{BASE_URL}/api/reception/check-duplicates", json={"items": [
+            {"reg_no": "NONEXIST999", "vin": "NONEXISTVIN999"},
+            {"reg_no": "nonexist 999", "vin": ""},
+            {"reg_no": "", "vin": ""},
+        ]})
+        assert response.status_code == 200
+        results = response.json()["results"]
+        assert len(results) == 3
+        assert results[0]["duplicate_reg"] == False
+        assert results[0]["duplicate_vin"] == False
+        assert results[0]["duplicate_in_batch"] == True
+        assert results[1]["duplicate_in_batch"] == True
+        assert results[2]["duplicate_in_batch"] == False
+        print("Batch duplicate check returns per-item verdicts")
+    
     def test_reception_create_entry(self, session):
         """Test creating a new reception entry"""
         now = datetime.utcnow().isoformat()
@@ -115,6 +207,24 @@ class TestReceptionModule:
             assert TestReceptionModule.created_entry_id in entry_ids, "Created entry should be in today's list"
             print(f"Created entry {TestReceptionModule.created_entry_id} found in list")
     
+    def test_reception_get_entries_paginates(self, session):
+        """Test reception list pages by cursor without repeating entries"""
+        response = session.get(f"{BASE_URL}/api/reception", params={"date_filter": "this_week", "limit": 1})
+        assert response.status_code == 200, f"Get entries failed: {response.text}"
+        first_page = response.json()
+        assert len(first_page) <= 1
+        next_cursor = response.headers.get("X-Next-Cursor")
+        if next_cursor:
+            response = session.get(f"{BASE_URL}/api/reception", params={"date_filter": "this_week", "limit": 1, "cursor": next_cursor})
+            assert response.status_code == 200
+            assert response.json()[0]["entry_id"] != first_page[0]["entry_id"]
+        print(f"First page: {len(first_page)} entries, next cursor: {bool(next_cursor)}")
+    
+    def test_reception_get_entries_invalid_cursor(self, session):
+        """Test malformed cursor is rejected"""
+        response = session.get(f"{BASE_URL}/api/reception", params={"cursor": "not-a-cursor"})
+        assert response.status_code == 400
+    
     def test_reception_get_single_entry(self, session):
         """Test getting a single reception entry by ID"""
         if not hasattr(TestReceptionModule, 'created_entry_id'):
@@ -0,0 +1,65 @@
+"""
+Backend API Tests for Omni Search
+Tests: GET /api/search ranked, typed results across appointments, vehicles, customers and booking IDs
+"""
+import pytest
+import requests
+import os
+
+BASE_URL = os.environ.get('REACT_APP_BACKEND_URL', '').rstrip('/')
+
+
+class TestOmniSearch:
+    """Omni-search endpoint tests"""
+    
+    @pytest.fixture(autouse=True)
+    def setup_session(self):
+        """Setup authenticated session"""
+        self.session = requests.Session()
+        login_response = self.session.post(f"{BASE_URL}/api/auth/login", json={
+            "username": "admin",
+            "password": "admin"
+        })
+        assert login_response.status_code == 200, f"Login failed: {login_response.text}"
+    
+    def test_search_response_shape(self):
+        """GET /api/search returns typed, scored results and timing"""
+        response = self.session.get(f"{BASE_URL}/api/search", params={"q": "9012"})
+        assert response.status_code == 200, f"Search failed: {response.text}"
+        data = response.json()
+        assert "results" in data and "took_ms" in data and "index_ready" in data
+        for r in data["results"]:
+            assert r["type"] in ("appointment", "vehicle", "customer")
+            assert "score" in r and "data" in r
+        scores = [r["score"] for r in data["results"]]
+        assert scores == sorted(scores, reverse=True), "Results should be ranked by score"
+    
+    def test_search_booking_id_exact_first(self):
+        """An exact booking id ranks its appointment first"""
+        appts = self.session.get(f"{BASE_URL}/api/appointments?view=upcoming").json()
+        booked = [a for a in appts if a.get("booking_id")]
+        if not booked:
+            pytest.skip("No appointments with booking ids")
+        booking_id = booked[0]["booking_id"]
+        data = self.session.get(f"{BASE_URL}/api/search", params={"q": booking_id}).json()
+        if not data["index_ready"]:
+            pytest.skip("Search index still building")
+        assert data["results"], f"No results for {booking_id}"
+        top = data["results"][0]
+        assert top["type"] == "appointment"
+        assert top["data"]["booking_id"] == booking_id
+    
+    def test_search_type_filter(self):
+        """types= restricts result types"""
+        data = self.session.get(f"{BASE_URL}/api/search", params={"q": "9012", "types": "customer"}).json()
+        assert all(r["type"] == "customer" for r in data["results"])
+    
+    def test_search_short_query(self):
+        """Queries under three characters return nothing"""
+        data = self.session.get(f"{BASE_URL}/api/search", params={"q": "ab"}).json()
+        assert data["results"] == []
+    
+    def test_search_requires_auth(self):
+        """Unauthenticated search is rejected"""
+        response = requests.get(f"{BASE_URL}/api/search", params={"q": "9012"})
+        assert response.status_code == 401
@@ -48,6 +48,35 @@ class TestVehicleAPIs:
             assert v.get("brand") == "other", f"Found non-other-brand vehicle: {v}"
         print(f"Found {len(vehicles)} Other Brand vehicles")
     
+    def test_get_vehicles_paginates(self, api_client):
+        """Test GET /api/vehicles pages by cursor and reports a total"""
+        response = api_client.get(f"{BASE_URL}/api/vehicles", params={"brand": "renault", "limit": 2})
+        assert response.status_code == 200
+        first_page = response.json()
+        assert len(first_page) <= 2
+        total = int(response.headers["X-Total-Count"])
+        assert total >= len(first_page)
+        seen = [v["vehicle_id"] for v in first_page]
+        next_cursor = response.headers.get("X-Next-Cursor")
+        while next_cursor:
+            response = api_client.get(f"{BASE_URL}/api/vehicles", params={"brand": "renault", "limit": 50, "cursor": next_cursor})
+            assert response.status_code == 200
+            assert "X-Total-Count" not in response.headers
+            seen += [v["vehicle_id"] for v in response.json()]
+            next_cursor = response.headers.get("X-Next-Cursor")
+        assert len(seen) == len(set(seen)), "Pages should not overlap"
+        print(f"Paged through {len(seen)} of {total} Renault vehicles")
+    
+    def test_get_vehicles_invalid_model_filter(self, api_client):
+        """Test filtering Renault vehicles by the stored is_model_valid flag"""
+        response = api_client.get(f"{BASE_URL}/api/vehicles", params={"brand": "renault", "model_valid": "false"})
+        assert response.status_code == 200
+        vehicles = response.json()
+        for v in vehicles:
+            assert v["is_model_valid"] is False, f"Found valid-model vehicle: {v}"
+        assert int(response.headers["X-Total-Count"]) >= len(vehicles)
+        print(f"{response.headers['X-Total-Count']} Renault vehicles have a model outside the master list")
+    
     def test_create_other_brand_vehicle(self, api_client):
         """Test creating a vehicle with brand=other and make field"""
         # Create Other Brand vehicle
@@ -97,6 +126,27 @@ class TestVehicleAPIs:
         
         return vehicle["vehicle_id"]
     
+    def test_create_vehicle_duplicate_normalized_reg(self, api_client):
+        """Test reg numbers differing only in spacing/punctuation are duplicates"""
+        first = api_client.post(f"{BASE_URL}/api/vehicles", json={
+            "vehicle_reg_no": "TEST DUP 01", "vin": "TESTDUPVIN01", "make": "Make", "brand": "other"
+        })
+        assert first.status_code == 201, f"Create failed: {first.text}"
+        try:
+            assert first.json()["vehicle_id"].startswith("VEH-")
+            second = api_client.post(f"{BASE_URL}/api/vehicles", json={
+                "vehicle_reg_no": "test-dup-01", "vin": "TESTDUPVIN02", "make": "Make", "brand": "other"
+            })
+            assert second.status_code == 400
+            assert "registration number" in second.json()["detail"]
+            third = api_client.post(f"{BASE_URL}/api/vehicles", json={
+                "vehicle_reg_no": "TESTDUP02", "vin": "testdupvin01", "make": "Make", "brand": "other"
+            })
+            assert third.status_code == 400
+            assert "VIN" in third.json()["detail"]
+        finally:
+            api_client.delete(f"{BASE_URL}/api/vehicles/{first.json()['vehicle_id']}")
+    
     def test_create_other_brand_vehicle_requires_make(self, api_client):
         """Test that creating Other Brand vehicle without make field fails"""
         payload = {
@@ -239,6 +289,32 @@ class TestVehicleAPIs:
         # Cleanup
         api_client.delete(f"{BASE_URL}/api/vehicles/{vehicle_id}")
     
+    def test_search_exact_reg_ranks_first(self, api_client):
+        """Test an exact reg no match ranks above prefix and word matches"""
+        payloads = [
+            {"vehicle_reg_no": "TESTRANK1", "vin": "TESTRANKVIN001", "make": "Make", "brand": "other"},
+            {"vehicle_reg_no": "TESTRANK12", "vin": "TESTRANKVIN002", "make": "Make", "brand": "other"},
+            {"vehicle_reg_no": "TESTOTHER9", "vin": "TESTRANKVIN003", "make": "Make", "brand": "other", "customer_name": "Testrank1 Owner"},
+        ]
+        created = []
+        for payload in payloads:
+            res = api_client.post(f"{BASE_URL}/api/vehicles", json=payload)
+            assert res.status_code == 201, f"Create failed: {res.text}"
+            created.append(res.json()["vehicle_id"])
+        try:
+            res = api_client.get(f"{BASE_URL}/api/vehicles", params={"search": "test rank1", "brand": "other"})
+            assert res.status_code == 200
+            regs = [v["vehicle_reg_no"] for v in res.json()]
+            assert regs[:2] == ["TESTRANK1", "TESTRANK12"], f"Unexpected ranking: {regs}"
+            assert "TESTOTHER9" not in regs
+            res = api_client.get(f"{BASE_URL}/api/vehicles", params={"search": "testrank1", "brand": "other"})
+            regs = [v["vehicle_reg_no"] for v in res.json()]
+            assert regs == ["TESTRANK1", "TESTRANK12", "TESTOTHER9"], f"Unexpected ranking: {regs}"
+            print(f"Ranked search results: {regs}")
+        finally:
+            for vehicle_id in created:
+                api_client.delete(f"{BASE_URL}/api/vehicles/{vehicle_id}")
+    
     def test_vehicle_profile_get(self, api_client):
         """Test getting a single vehicle by ID for profile page"""
         # First get any existing vehicle
@@ -260,6 +336,161 @@ class TestVehicleAPIs:
         else:
             pytest.skip("No Other Brand vehicles to test")
 
+    def test_vehicle_timeline_pages(self, api_client):
+        """Test the vehicle timeline merges events newest first and pages by cursor"""
+        res = api_client.post(f"{BASE_URL}/api/vehicles", json={
+            "vehicle_reg_no": "TESTTIMELINE1", "vin": "TESTTIMELINEVIN1", "make": "Make", "brand": "other"
+        })
+        assert res.status_code == 201, f"Create failed: {res.text}"
+        vehicle_id = res.json()["vehicle_id"]
+        try:
+            files = {"file": ("test.pdf", b"%PDF-1.4 test", "application/pdf")}
+            upload = api_client.post(
+                f"{BASE_URL}/api/vehicles/{vehicle_id}/documents", files=files,
+                headers={"Content-Type": None},
+            )
+            assert upload.status_code == 201, f"Upload failed: {upload.text}"
+
+            events, cursor = [], None
+            while True:
+                res = api_client.get(
+                    f"{BASE_URL}/api/vehicles/{vehicle_id}/timeline",
+                    params={"limit": 1, **({"cursor": cursor} if cursor else {})},
+                )
+                assert res.status_code == 200
+                events += res.json()
+                cursor = res.headers.get("X-Next-Cursor")
+                if not cursor:
+                    break
+            assert [e["at"] for e in events] == sorted((e["at"] for e in events), reverse=True)
+            documents = [e for e in events if e["kind"] == "document"]
+            assert [d["ref_id"] for d in documents] == [upload.json()["document_id"]]
+            assert "file_data" not in documents[0]["data"]
+            print(f"Timeline events: {len(events)}")
+
+            res = api_client.get(f"{BASE_URL}/api/vehicles/{vehicle_id}/timeline", params={"cursor": "not-a-cursor"})
+            assert res.status_code == 400
+        finally:
+            api_client.delete(f"{BASE_URL}/api/vehicles/{vehicle_id}")
+
+    def test_vehicle_document_round_trip(self, api_client):
+        """Test an uploaded document downloads byte for byte and lists metadata only"""
+        res = api_client.post(f"{BASE_URL}/api/vehicles", json={
+            "vehicle_reg_no": "TESTDOCBLOB1", "vin": "TESTDOCBLOBVIN1", "make": "Make", "brand": "other"
+        })
+        assert res.status_code == 201, f"Create failed: {res.text}"
+        vehicle_id = res.json()["vehicle_id"]
+        try:
+            content = b"%PDF-1.4 " + os.urandom(64)
+            upload = api_client.post(
+                f"{BASE_URL}/api/vehicles/{vehicle_id}/documents",
+                files={"file": ("scan.pdf", content, "application/pdf")},
+                headers={"Content-Type": None},
+            )
+            assert upload.status_code == 201, f"Upload failed: {upload.text}"
+            document = upload.json()
+            assert document["file_size"] == len(content)
+
+            download = api_client.get(f"{BASE_URL}{document['file_url']}")
+            assert download.status_code == 200
+            assert download.content == content
+
+            listed = api_client.get(f"{BASE_URL}/api/vehicles/{vehicle_id}/documents").json()
+            assert "file_data" not in listed[0] and "blob_id" not in listed[0]
+
+            res = api_client.delete(f"{BASE_URL}/api/vehicles/{vehicle_id}/documents/{document['document_id']}")
+            assert res.status_code == 200
+            assert api_client.get(f"{BASE_URL}{document['file_url']}").status_code == 404
+        finally:
+            api_client.delete(f"{BASE_URL}/api/vehicles/{vehicle_id}")
+
+    def test_vehicle_document_conditional_and_range(self, api_client):
+        """Test document downloads honour If-None-Match and byte ranges"""
+        res = api_client.post(f"{BASE_URL}/api/vehicles", json={
+            "vehicle_reg_no": "TESTDOCRANGE1", "vin": "TESTDOCRANGEVIN1", "make": "Make", "brand": "other"
+        })
+        assert res.status_code == 201, f"Create failed: {res.text}"
+        vehicle_id = res.json()["vehicle_id"]
+        try:
+            content = os.urandom(4096)
+            upload = api_client.post(
+                f"{BASE_URL}/api/vehicles/{vehicle_id}/documents",
+                files={"file": ("scan.pdf", content, "application/pdf")},
+                headers={"Content-Type": None},
+            )
+            assert upload.status_code == 201, f"Upload failed: {upload.text}"
+            url = f"{BASE_URL}{upload.json()['file_url']}"
+
+            full = api_client.get(url)
+            etag = full.headers["ETag"]
+            assert "immutable" in full.headers["Cache-Control"]
+            assert api_client.get(url, headers={"If-None-Match": etag}).status_code == 304
+
+            part = api_client.get(url, headers={"Range": "bytes=100-199"})
+            assert part.status_code == 206
+            assert part.headers["Content-Range"] == "bytes 100-199/4096"
+            assert part.content == content[100:200]
+            assert api_client.get(url, headers={"Range": "bytes=5000-"}).status_code == 416
+        finally:
+            api_client.delete(f"{BASE_URL}/api/vehicles/{vehicle_id}")
+
+    def test_vehicle_document_dedup(self, api_client):
+        """Test identical uploads share storage and survive deleting one copy"""
+        res = api_client.post(f"{BASE_URL}/api/vehicles", json={
+            "vehicle_reg_no": "TESTDOCDEDUP1", "vin": "TESTDOCDEDUPVIN1", "make": "Make", "brand": "other"
+        })
+        assert res.status_code == 201, f"Create failed: {res.text}"
+        vehicle_id = res.json()["vehicle_id"]
+        try:
+            content = os.urandom(2048)
+            before = api_client.get(f"{BASE_URL}/api/documents/storage-report").json()
+            uploads = []
+            for _ in range(2):
+                upload = api_client.post(
+                    f"{BASE_URL}/api/vehicles/{vehicle_id}/documents",
+                    files={"file": ("scan.pdf", content, "application/pdf")},
+                    headers={"Content-Type": None},
+                )
+                assert upload.status_code == 201, f"Upload failed: {upload.text}"
+                uploads.append(upload.json())
+            after = api_client.get(f"{BASE_URL}/api/documents/storage-report").json()
+            assert after["saved_bytes"] - before["saved_bytes"] == len(content)
+            assert after["stored_bytes"] - before["stored_bytes"] == len(content)
+            print(f"Document storage saved: {after['saved_bytes']} bytes")
+
+            api_client.delete(f"{BASE_URL}/api/vehicles/{vehicle_id}/documents/{uploads[0]['document_id']}")
+            download = api_client.get(f"{BASE_URL}{uploads[1]['file_url']}")
+            assert download.status_code == 200
+            assert download.content == content
+        finally:
+            api_client.delete(f"{BASE_URL}/api/vehicles/{vehicle_id}")
+
+    def test_vehicle_document_upload_rejections(self, api_client):
+        """Test oversized and disallowed uploads are rejected and nothing is stored"""
+        res = api_client.post(f"{BASE_URL}/api/vehicles", json={
+            "vehicle_reg_no": "TESTDOCLIMIT1", "vin": "TESTDOCLIMITVIN1", "make": "Make", "brand": "other"
+        })
+        assert res.status_code == 201, f"Create failed: {res.text}"
+        vehicle_id = res.json()["vehicle_id"]
+        try:
+            url = f"{BASE_URL}/api/vehicles/{vehicle_id}/documents"
+            res = api_client.post(url, files={"file": ("big.pdf", b"0" * (6 * 1024 * 1024), "application/pdf")},
+                                  headers={"Content-Type": None})
+            assert res.status_code == 400
+            assert "5MB" in res.json()["detail"]
+            res = api_client.post(url, files={"file": ("tool.exe", b"MZ", "application/octet-stream")},
+                                  headers={"Content-Type": None})
+            assert res.status_code == 400
+            assert "not allowed" in res.json()["detail"]
+            assert api_client.get(url).json() == []
+        finally:
+            api_client.delete(f"{BASE_URL}/api/vehicles/{vehicle_id}")
+
+    def test_vehicle_timeline_unknown_vehicle(self, api_client):
+        """Test the timeline of a missing vehicle is a 404"""
+        res = api_client.get(f"{BASE_URL}/api/vehicles/VEH-MISSING/timeline")
+        assert res.status_code == 404
+
 
 @pytest.fixture
 def api_client():
@@ -21,14 +21,22 @@ import {
   Calendar,
   Target,
   Car,
+  HardDrive,
 } from "lucide-react";
 
+const formatBytes = (bytes) => {
+  if (bytes >= 1024 * 1024 * 1024) return `${(bytes / (1024 * 1024 * 1024)).toFixed(1)} GB`;
+  if (bytes >= 1024 * 1024) return `${(bytes / (1024 * 1024)).toFixed(1)} MB`;
+  return `${(bytes / 1024).toFixed(1)} KB`;
+};
+
 const OtherSettings = () => {
   const { user } = useAuth();
   const navigate = useNavigate();
   const [settings, setSettings] = useState(null);
   const [loading, setLoading] = useState(true);
   const [saving, setSaving] = useState(false);
+  const [storage, setStorage] = useState(null);
   const [newItems, setNewItems] = useState({
     branch_types: "",
     branches: "",
@@ -49,6 +57,7 @@ const OtherSettings = () => {
       return;
     }
     fetchSettings();
+    fetchStorage();
   }, [user, navigate]);
 
   const fetchSettings = async () => {
@@ -62,6 +71,15 @@ const OtherSettings = () => {
     }
   };
 
+  const fetchStorage = async () => {
+    try {
+      const response = await axios.get(`${API}/documents/storage-report`, { withCredentials: true });
+      setStorage(response.data);
+    } catch (error) {
+      console.error("Failed to load document storage report", error);
+    }
+  };
+
   const handleAddItem = async (field) => {
     const value = newItems[field].trim();
     if (!value) return;
@@ -233,6 +251,43 @@ const OtherSettings = () => {
             </CardContent>
           </Card>
         ))}
+
+        {/* Document Storage */}
+        {storage && (
+          <Card className="border border-gray-200 rounded-sm shadow-none" data-testid="document-storage-report">
+            <CardHeader className="border-b border-gray-100 pb-4">
+              <div className="flex items-center gap-3">
+                <div className="w-10 h-10 bg-gray-100 rounded-sm flex items-center justify-center">
+                  <HardDrive className="w-5 h-5" strokeWidth={1.5} />
+                </div>
+                <div>
+                  <CardTitle className="font-heading font-bold text-lg tracking-tight uppercase">
+                    Document Storage
+                  </CardTitle>
+                  <p className="text-xs text-gray-500">Identical uploads are stored once</p>
+                </div>
+              </div>
+            </CardHeader>
+            <CardContent className="p-6 grid grid-cols-2 md:grid-cols-4 gap-4">
+              <div>
+                <Label className="text-xs text-gray-500 uppercase tracking-wider">Documents</Label>
+                <p className="text-sm font-mono mt-1">{storage.documents}</p>
+              </div>
+              <div>
+                <Label className="text-xs text-gray-500 uppercase tracking-wider">Stored Files</Label>
+                <p className="text-sm font-mono mt-1">{storage.blobs}</p>
+              </div>
+              <div>
+                <Label className="text-xs text-gray-500 uppercase tracking-wider">Space Used</Label>
+                <p className="text-sm font-mono mt-1">{formatBytes(storage.stored_bytes)}</p>
+              </div>
+              <div>
+                <Label className="text-xs text-gray-500 uppercase tracking-wider">Space Saved</Label>
+                <p className="text-sm font-mono mt-1">{formatBytes(storage.saved_bytes)} ({storage.saved_percent}%)</p>
+              </div>
+            </CardContent>
+          </Card>
+        )}
       </div>
     </div>
   );
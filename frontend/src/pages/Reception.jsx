@@ -44,6 +44,8 @@ export default function Reception() {
   // Register state
   const [entries, setEntries] = useState([]);
   const [loading, setLoading] = useState(true);
+  const [loadingMore, setLoadingMore] = useState(false);
+  const [nextCursor, setNextCursor] = useState(null);
   const [branches, setBranches] = useState([]);
   const [filters, setFilters] = useState({ branch: "", date_filter: "today", source: "", status: "", date_from: "", date_to: "" });
 
@@ -93,23 +95,43 @@ export default function Reception() {
     rc_attached: false, rc_not_collected: false, rc_reason: "",
   });
 
+  // Query params for the current filters
+  const entryParams = useCallback(() => {
+    const params = new URLSearchParams();
+    if (filters.branch) params.set("branch", filters.branch);
+    if (filters.date_filter) params.set("date_filter", filters.date_filter);
+    if (filters.source) params.set("source", filters.source);
+    if (filters.status) params.set("status", filters.status);
+    if (filters.date_filter === "custom") {
+      if (filters.date_from) params.set("date_from", filters.date_from);
+      if (filters.date_to) params.set("date_to", filters.date_to);
+    }
+    return params;
+  }, [filters]);
+
   const fetchEntries = useCallback(async () => {
     setLoading(true);
     try {
-      const params = new URLSearchParams();
-      if (filters.branch) params.set("branch", filters.branch);
-      if (filters.date_filter) params.set("date_filter", filters.date_filter);
-      if (filters.source) params.set("source", filters.source);
-      if (filters.status) params.set("status", filters.status);
-      if (filters.date_filter === "custom") {
-        if (filters.date_from) params.set("date_from", filters.date_from);
-        if (filters.date_to) params.set("date_to", filters.date_to);
-      }
-      const res = await axios.get(`${API}/reception?${params.toString()}`, { withCredentials: true });
+      const res = await axios.get(`${API}/reception?${entryParams().toString()}`, { withCredentials: true });
       setEntries(res.data);
+      setNextCursor(res.headers["x-next-cursor"] || null);
     } catch { toast.error("Failed to load reception entries"); }
     setLoading(false);
-  }, [filters]);
+  }, [entryParams]);
+
+  // Fetch the next page and append it
+  const loadMore = async () => {
+    if (!nextCursor) return;
+    setLoadingMore(true);
+    try {
+      const params = entryParams();
+      params.set("cursor", nextCursor);
+      const res = await axios.get(`${API}/reception?${params.toString()}`, { withCredentials: true });
+      setEntries(prev => [...prev, ...res.data]);
+      setNextCursor(res.headers["x-next-cursor"] || null);
+    } catch { toast.error("Failed to load reception entries"); }
+    setLoadingMore(false);
+  };
 
   const fetchBranches = useCallback(async () => {
     try {
@@ -487,6 +509,13 @@ export default function Reception() {
             ))}
           </TableBody>
         </Table>
+        {!loading && nextCursor && (
+          <div className="flex justify-center border-t border-gray-100 p-3">
+            <Button variant="outline" className="rounded-sm" onClick={loadMore} disabled={loadingMore} data-testid="load-more-btn">
+              {loadingMore ? "Loading..." : `Load more (${entries.length} loaded)`}
+            </Button>
+          </div>
+        )}
       </Card>
 
       {/* ========== 3-STEP WIZARD MODAL ========== */}
@@ -43,6 +43,11 @@ const VehicleProfile = ({ brand = "renault" }) => {
   const [uploading, setUploading] = useState(false);
   const fileInputRef = useRef(null);
 
+  // Service history state
+  const [timeline, setTimeline] = useState(null);
+  const [timelineCursor, setTimelineCursor] = useState(null);
+  const [timelineError, setTimelineError] = useState(false);
+
   const isRenault = brand === "renault";
 
   useEffect(() => {
@@ -73,6 +78,27 @@ const VehicleProfile = ({ brand = "renault" }) => {
     if (vehicleId) fetchDocuments();
   }, [vehicleId]);
 
+  // Fetch the service history on first open of the tab
+  const loadTimeline = async (cursor = null) => {
+    setTimelineError(false);
+    try {
+      const res = await axios.get(`${API}/vehicles/${vehicleId}/timeline`, {
+        params: cursor ? { cursor } : {},
+        withCredentials: true,
+      });
+      setTimeline(prev => (cursor ? [...(prev || []), ...res.data] : res.data));
+      setTimelineCursor(res.headers["x-next-cursor"] || null);
+    } catch (e) {
+      setTimelineError(true);
+      toast.error("Failed to load service history");
+    }
+  };
+
+  useEffect(() => {
+    if (activeTab === "history" && timeline === null && vehicleId) loadTimeline();
+    // eslint-disable-next-line react-hooks/exhaustive-deps
+  }, [activeTab, vehicleId]);
+
   const handleBack = () => {
     navigate(isRenault ? "/vehicles/renault" : "/vehicles/other-brands");
   };
@@ -159,8 +185,8 @@ const VehicleProfile = ({ brand = "renault" }) => {
 
   // Determine which tabs to show
   const tabs = isRenault
-    ? ["vehicle", "customer", "insurance", "dates", "documents", "dealer"]
-    : ["vehicle", "customer", "insurance", "dates", "documents"];
+    ? ["vehicle", "customer", "insurance", "dates", "documents", "history", "dealer"]
+    : ["vehicle", "customer", "insurance", "dates", "documents", "history"];
 
   return (
     <div className="space-y-6" data-testid="vehicle-profile">
@@ -199,6 +225,7 @@ const VehicleProfile = ({ brand = "renault" }) => {
               insurance: "Insurance",
               dates: "Dates & Programs",
               documents: "Documents",
+              history: "Service History",
               dealer: "Dealer"
             };
             return (
@@ -438,6 +465,69 @@ const VehicleProfile = ({ brand = "renault" }) => {
           </div>
         )}
 
+        {/* Service History — appointments, check-ins and documents */}
+        {activeTab === "history" && (
+          <div className="mt-6">
+            <Card className="border border-gray-200 rounded-sm shadow-none">
+              <CardContent className="p-6">
+                <h3 className="text-xs font-bold uppercase tracking-wider text-gray-400 mb-6">Service History</h3>
+                {timeline === null && timelineError ? (
+                  <div className="text-center py-12">
+                    <p className="text-sm text-red-600 mb-3">Could not load service history</p>
+                    <Button variant="outline" className="rounded-sm" onClick={() => loadTimeline()} data-testid="timeline-retry">
+                      Retry
+                    </Button>
+                  </div>
+                ) : timeline === null ? (
+                  <p className="text-sm text-gray-500">Loading...</p>
+                ) : timeline.length === 0 ? (
+                  <p className="text-sm text-gray-500 text-center py-12">No service history yet</p>
+                ) : (
+                  <div className="space-y-3">
+                    {timeline.map((event) => (
+                      <div
+                        key={`${event.kind}-${event.ref_id}`}
+                        className="flex items-start gap-4 p-3 border border-gray-200 rounded-sm"
+                        data-testid={`timeline-${event.ref_id}`}
+                      >
+                        <span className="text-xs font-mono text-gray-500 w-36 shrink-0">{event.at.replace("T", " ")}</span>
+                        <div className="text-sm">
+                          {event.kind === "appointment" && (
+                            <>
+                              <p className="font-medium">Appointment {event.data.booking_id} • {event.data.appointment_status}</p>
+                              <p className="text-xs text-gray-500">
+                                {event.data.service_type || "—"} • {event.data.branch || "—"}
+                                {event.chain.length > 1 && ` • Rescheduled from ${event.chain.slice(0, -1).map(a => a.appointment_date).join(", ")}`}
+                              </p>
+                            </>
+                          )}
+                          {event.kind === "reception" && (
+                            <>
+                              <p className="font-medium">Reception check-in • {event.data.status}</p>
+                              <p className="text-xs text-gray-500">{event.data.source || "—"} • {event.data.branch || "—"}</p>
+                            </>
+                          )}
+                          {event.kind === "document" && (
+                            <>
+                              <p className="font-medium">Document uploaded • {event.data.file_name}</p>
+                              <p className="text-xs text-gray-500">{event.data.document_type}</p>
+                            </>
+                          )}
+                        </div>
+                      </div>
+                    ))}
+                    {timelineCursor && (
+                      <Button variant="outline" className="rounded-sm w-full" onClick={() => loadTimeline(timelineCursor)} data-testid="timeline-load-more">
+                        Load more
+                      </Button>
+                    )}
+                  </div>
+                )}
+              </CardContent>
+            </Card>
+          </div>
+        )}
+
         {/* TAB 6 — Dealer (Renault only) */}
         {isRenault && activeTab === "dealer" && (
           <div className="mt-6">
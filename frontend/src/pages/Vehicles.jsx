@@ -20,6 +20,9 @@ const Vehicles = () => {
   const navigate = useNavigate();
   const [vehicles, setVehicles] = useState([]);
   const [loading, setLoading] = useState(true);
+  const [loadingMore, setLoadingMore] = useState(false);
+  const [nextCursor, setNextCursor] = useState(null);
+  const [total, setTotal] = useState(null);
   const [masterModels, setMasterModels] = useState([]);
   
   // Filters
@@ -36,26 +39,52 @@ const Vehicles = () => {
     }
   }, []);
 
+  // Query params for the current filters
+  const vehicleParams = useCallback(() => {
+    const params = new URLSearchParams();
+    params.append("brand", "renault");
+    if (modelFilter === "invalid") {
+      params.append("model_valid", "false");
+    } else if (modelFilter && modelFilter !== "all") {
+      params.append("model", modelFilter);
+    }
+    if (searchQuery.trim()) {
+      params.append("search", searchQuery.trim());
+    }
+    return params;
+  }, [modelFilter, searchQuery]);
+
   // Fetch vehicles
   const fetchVehicles = useCallback(async () => {
     setLoading(true);
     try {
-      const params = new URLSearchParams();
-      params.append("brand", "renault");
-      if (modelFilter && modelFilter !== "all") {
-        params.append("model", modelFilter);
-      }
-      if (searchQuery.trim()) {
-        params.append("search", searchQuery.trim());
-      }
-      const res = await axios.get(`${API}/vehicles?${params.toString()}`, { withCredentials: true });
+      const res = await axios.get(`${API}/vehicles?${vehicleParams().toString()}`, { withCredentials: true });
       setVehicles(res.data);
+      setNextCursor(res.headers["x-next-cursor"] || null);
+      setTotal(res.headers["x-total-count"] ? Number(res.headers["x-total-count"]) : null);
     } catch (e) {
       toast.error("Failed to fetch vehicles");
     } finally {
       setLoading(false);
     }
-  }, [modelFilter, searchQuery]);
+  }, [vehicleParams]);
+
+  // Fetch the next page and append it
+  const loadMore = async () => {
+    if (!nextCursor) return;
+    setLoadingMore(true);
+    try {
+      const params = vehicleParams();
+      params.append("cursor", nextCursor);
+      const res = await axios.get(`${API}/vehicles?${params.toString()}`, { withCredentials: true });
+      setVehicles(prev => [...prev, ...res.data]);
+      setNextCursor(res.headers["x-next-cursor"] || null);
+    } catch (e) {
+      toast.error("Failed to fetch vehicles");
+    } finally {
+      setLoadingMore(false);
+    }
+  };
 
   useEffect(() => {
     fetchMasterModels();
@@ -87,7 +116,9 @@ const Vehicles = () => {
             <h1 className="font-heading font-black text-3xl md:text-4xl tracking-tighter uppercase">
               Renault
             </h1>
-            <p className="text-sm text-gray-500 mt-1">Manage Renault vehicles</p>
+            <p className="text-sm text-gray-500 mt-1">
+              Manage Renault vehicles{total !== null && ` · ${total} total`}
+            </p>
           </div>
         </div>
         <div className="flex items-center gap-2">
@@ -128,6 +159,7 @@ const Vehicles = () => {
                 </SelectTrigger>
                 <SelectContent>
                   <SelectItem value="all">All Models</SelectItem>
+                  <SelectItem value="invalid">Not in master list</SelectItem>
                   {masterModels.map(m => (
                     <SelectItem key={m} value={m}>{m}</SelectItem>
                   ))}
@@ -195,6 +227,13 @@ const Vehicles = () => {
             )}
           </TableBody>
         </Table>
+        {!loading && nextCursor && (
+          <div className="flex justify-center border-t border-gray-100 p-3">
+            <Button variant="outline" className="rounded-sm" onClick={loadMore} disabled={loadingMore} data-testid="load-more-btn">
+              {loadingMore ? "Loading..." : `Load more (${vehicles.length}${total !== null ? ` of ${total}` : ""})`}
+            </Button>
+          </div>
+        )}
       </Card>
     </div>
   );
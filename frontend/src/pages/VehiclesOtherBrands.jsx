@@ -17,27 +17,54 @@ const VehiclesOtherBrands = () => {
   const navigate = useNavigate();
   const [vehicles, setVehicles] = useState([]);
   const [loading, setLoading] = useState(true);
+  const [loadingMore, setLoadingMore] = useState(false);
+  const [nextCursor, setNextCursor] = useState(null);
+  const [total, setTotal] = useState(null);
   
   // Filters
   const [searchQuery, setSearchQuery] = useState("");
 
+  // Query params for the current filters
+  const vehicleParams = useCallback(() => {
+    const params = new URLSearchParams();
+    params.append("brand", "other");
+    if (searchQuery.trim()) {
+      params.append("search", searchQuery.trim());
+    }
+    return params;
+  }, [searchQuery]);
+
   // Fetch vehicles (only "other" brand)
   const fetchVehicles = useCallback(async () => {
     setLoading(true);
     try {
-      const params = new URLSearchParams();
-      params.append("brand", "other");
-      if (searchQuery.trim()) {
-        params.append("search", searchQuery.trim());
-      }
-      const res = await axios.get(`${API}/vehicles?${params.toString()}`, { withCredentials: true });
+      const res = await axios.get(`${API}/vehicles?${vehicleParams().toString()}`, { withCredentials: true });
       setVehicles(res.data);
+      setNextCursor(res.headers["x-next-cursor"] || null);
+      setTotal(res.headers["x-total-count"] ? Number(res.headers["x-total-count"]) : null);
     } catch (e) {
       toast.error("Failed to fetch vehicles");
     } finally {
       setLoading(false);
     }
-  }, [searchQuery]);
+  }, [vehicleParams]);
+
+  // Fetch the next page and append it
+  const loadMore = async () => {
+    if (!nextCursor) return;
+    setLoadingMore(true);
+    try {
+      const params = vehicleParams();
+      params.append("cursor", nextCursor);
+      const res = await axios.get(`${API}/vehicles?${params.toString()}`, { withCredentials: true });
+      setVehicles(prev => [...prev, ...res.data]);
+      setNextCursor(res.headers["x-next-cursor"] || null);
+    } catch (e) {
+      toast.error("Failed to fetch vehicles");
+    } finally {
+      setLoadingMore(false);
+    }
+  };
 
   useEffect(() => {
     fetchVehicles();
@@ -65,7 +92,9 @@ const VehiclesOtherBrands = () => {
             <h1 className="font-heading font-black text-3xl md:text-4xl tracking-tighter uppercase">
               Other Brands
             </h1>
-            <p className="text-sm text-gray-500 mt-1">Manage non-Renault vehicles</p>
+            <p className="text-sm text-gray-500 mt-1">
+              Manage non-Renault vehicles{total !== null && ` · ${total} total`}
+            </p>
           </div>
         </div>
         <div className="flex items-center gap-2">
@@ -157,6 +186,13 @@ const VehiclesOtherBrands = () => {
             )}
           </TableBody>
         </Table>
+        {!loading && nextCursor && (
+          <div className="flex justify-center border-t border-gray-100 p-3">
+            <Button variant="outline" className="rounded-sm" onClick={loadMore} disabled={loadingMore} data-testid="load-more-btn">
+              {loadingMore ? "Loading..." : `Load more (${vehicles.length}${total !== null ? ` of ${total}` : ""})`}
+            </Button>
+          </div>
+        )}
       </Card>
     </div>
   );